@@ -0,0 +1,218 @@
+"""
+Order-level distribution statistics computed with NumPy.
+
+The revenue, cost and quantity columns of every order in a period are loaded
+into arrays with a single query, and all statistics are computed over those
+arrays at once rather than by looping over ORM objects.
+"""
+import numpy as np
+from sqlalchemy import func, select
+from models import db, Order, Customer, Recipe
+from report_helpers import cached_report, filter_order_dates
+
+# Percentiles reported for margins and per-cookie costs
+DISTRIBUTION_PERCENTILES = (10, 25, 50, 75, 90)
+
+# Days in the trailing window of the rolling means
+ROLLING_WINDOW_DAYS = 7
+
+
+def order_columns_select(start_date=None, end_date=None):
+    """
+    Build the select behind the order arrays: one row per order. Custom
+    orders, and orders whose recipe has been deleted, have recipe_id 0 and
+    recipe_name 'Custom'.
+
+    Args:
+        start_date (date): Optional start of the range
+        end_date (date): Optional end of the range (exclusive)
+
+    Returns:
+        Select: sale_date, revenue, ingredient_cost, packaging_cost, cookies,
+            recipe_id, recipe_name and customer_type columns
+    """
+    query = select(
+        func.date(Order.order_date).label('sale_date'),
+        Order.sale_price_total_cents.label('revenue'),
+        Order.ingredient_cost_cents.label('ingredient_cost'),
+        Order.packaging_cost_cents.label('packaging_cost'),
+        Order.quantity_baked.label('cookies'),
+        func.coalesce(Recipe.id, 0).label('recipe_id'),
+        func.coalesce(Recipe.name, 'Custom').label('recipe_name'),
+        func.coalesce(Customer.customer_type, '').label('customer_type')
+    ).outerjoin(Customer, Customer.id == Order.customer_id) \
+     .outerjoin(Recipe, Recipe.id == Order.recipe_id) \
+     .where(Order.order_date.isnot(None))
+
+    return filter_order_dates(query, start_date, end_date).order_by(Order.order_date, Order.id)
+
+
+def load_order_arrays(start_date=None, end_date=None):
+    """
+    Load the order columns of a period into NumPy arrays.
+
+    Args:
+        start_date (date): Optional start of the range
+        end_date (date): Optional end of the range (exclusive)
+
+    Returns:
+        dict: One array per column of order_columns_select, amounts in cents,
+            sale_date as datetime64[D]
+    """
+    # Plain column rows, so run on the connection and skip ORM result loading
+    rows = db.session.connection().execute(order_columns_select(start_date, end_date)).all()
+    columns = list(zip(*rows)) or [()] * 8
+
+    return {
+        'sale_date': np.array(columns[0], dtype='datetime64[D]'),
+        'revenue': np.array(columns[1], dtype=np.int64),
+        'ingredient_cost': np.array(columns[2], dtype=np.int64),
+        'packaging_cost': np.array(columns[3], dtype=np.int64),
+        'cookies': np.array(columns[4], dtype=np.int64),
+        'recipe_id': np.array(columns[5], dtype=np.int64),
+        'recipe_name': np.array(columns[6], dtype=object),
+        'customer_type': np.array(columns[7], dtype=object)
+    }
+
+
+def _describe(values):
+    """Summary statistics of an array, or None if it is empty."""
+    if values.size == 0:
+        return None
+    return {
+        'mean': float(values.mean()),
+        'std': float(values.std()),
+        'min': float(values.min()),
+        'max': float(values.max()),
+        'percentiles': [float(value) for value in np.percentile(values, DISTRIBUTION_PERCENTILES)]
+    }
+
+
+def _ratio(numerator, denominator, scale=1):
+    """Element-wise numerator / denominator * scale, NaN where the denominator is 0."""
+    result = np.full(numerator.shape, np.nan)
+    np.divide(numerator * scale, denominator, out=result, where=denominator != 0)
+    return result
+
+
+def _rolling_means(arrays, profit, window=ROLLING_WINDOW_DAYS):
+    """Trailing means of daily revenue and profit, and the margin over each window."""
+    if arrays['sale_date'].size == 0:
+        return {'window': window, 'labels': [], 'revenue': [], 'profit': [], 'margin': []}
+
+    first_day = arrays['sale_date'].min()
+    day_index = (arrays['sale_date'] - first_day).astype(np.int64)
+    day_count = int(day_index.max()) + 1
+
+    def trailing_sums(values):
+        daily = np.bincount(day_index, weights=values, minlength=day_count)
+        totals = np.concatenate(([0.0], np.cumsum(daily)))
+        starts = np.maximum(np.arange(1, day_count + 1) - window, 0)
+        return totals[1:] - totals[starts]
+
+    # The first days average over as many days as there are so far
+    days_in_window = np.minimum(np.arange(1, day_count + 1), window)
+    revenue = trailing_sums(arrays['revenue'])
+    profit = trailing_sums(profit)
+    margin = _ratio(profit, revenue, 100)
+
+    return {
+        'window': window,
+        'labels': [str(day) for day in first_day + np.arange(day_count)],
+        'revenue': (revenue / days_in_window).round(2).tolist(),
+        'profit': (profit / days_in_window).round(2).tolist(),
+        'margin': [None if np.isnan(value) else round(float(value), 2) for value in margin]
+    }
+
+
+def _breakdown(keys, labels, arrays, total_cost, profit, margin):
+    """Per-group totals, average order margin and per-cookie cost."""
+    if keys.size == 0:
+        return []
+
+    unique_keys, first_index, group = np.unique(keys, return_index=True, return_inverse=True)
+    group_count = unique_keys.size
+
+    def sums(values):
+        return np.bincount(group, weights=values, minlength=group_count)
+
+    order_count = np.bincount(group, minlength=group_count)
+    revenue = sums(arrays['revenue'])
+    cost = sums(total_cost)
+    group_profit = sums(profit)
+    cookies = sums(arrays['cookies'])
+
+    # Orders without revenue have no margin and are left out of the average
+    has_margin = ~np.isnan(margin)
+    margin_count = np.bincount(group[has_margin], minlength=group_count)
+    margin_sum = np.bincount(group[has_margin], weights=margin[has_margin], minlength=group_count)
+    average_margin = _ratio(margin_sum, margin_count)
+    cost_per_cookie = _ratio(cost, cookies)
+
+    breakdown = [
+        {
+            'key': unique_keys[i].item(),
+            'name': labels[first_index[i]],
+            'order_count': int(order_count[i]),
+            'revenue': int(revenue[i]),
+            'total_cost': int(cost[i]),
+            'profit': int(group_profit[i]),
+            'cookies': int(cookies[i]),
+            'margin': None if np.isnan(average_margin[i]) else round(float(average_margin[i]), 2),
+            'cost_per_cookie': None if np.isnan(cost_per_cookie[i]) else round(float(cost_per_cookie[i]), 2)
+        }
+        for i in range(group_count)
+    ]
+    return sorted(breakdown, key=lambda row: row['revenue'], reverse=True)
+
+
+def compute_distribution(arrays):
+    """
+    Compute distribution statistics over loaded order arrays.
+
+    Margins are in percent of revenue; costs are in cents.
+
+    Args:
+        arrays (dict): Order arrays, see load_order_arrays
+
+    Returns:
+        dict: order_count, percentiles, margin and cost_per_cookie summaries
+            (None when there is nothing to summarise), rolling means and
+            breakdowns by recipe and by customer type
+    """
+    total_cost = arrays['ingredient_cost'] + arrays['packaging_cost']
+    profit = arrays['revenue'] - total_cost
+    margin = _ratio(profit, arrays['revenue'], 100)
+    cost_per_cookie = _ratio(total_cost, arrays['cookies'])
+
+    customer_types = np.where(arrays['customer_type'] == '', 'No customer', arrays['customer_type'])
+
+    return {
+        'order_count': int(arrays['revenue'].size),
+        'percentiles': list(DISTRIBUTION_PERCENTILES),
+        'margin': _describe(margin[~np.isnan(margin)]),
+        'cost_per_cookie': _describe(cost_per_cookie[~np.isnan(cost_per_cookie)]),
+        'rolling': _rolling_means(arrays, profit),
+        'by_recipe': _breakdown(arrays['recipe_id'], arrays['recipe_name'], arrays, total_cost, profit, margin),
+        'by_customer_type': _breakdown(
+            arrays['customer_type'].astype(str), customer_types, arrays, total_cost, profit, margin
+        )
+    }
+
+
+def get_distribution(start_date=None, end_date=None):
+    """
+    Get the cached distribution statistics for a report range.
+
+    Args:
+        start_date (date): Optional start of the range
+        end_date (date): Optional end of the range (exclusive)
+
+    Returns:
+        dict: See compute_distribution
+    """
+    return cached_report(
+        'distribution',
+        {'start': start_date, 'end': end_date},
+        lambda: compute_distribution(load_order_arrays(start_date, end_date))
+    )
@@ -11,6 +11,20 @@ from datetime import timedelta
 scheduler = APScheduler()
 
 
+def is_serving():
+    """
+    Check whether the app is being created to serve requests.
+    
+    True under gunicorn, `flask run` or a direct run of this module; False
+    for other CLI commands such as `flask db upgrade` or `flask init-db`.
+    
+    Returns:
+        bool: True if serving requests
+    """
+    ctx = click.get_current_context(silent=True)
+    return ctx is None or ctx.info_name == 'run'
+
+
 def create_app(config_name=None):
     """
     Create and configure the Flask application.
@@ -40,18 +54,23 @@ def create_app(config_name=None):
     db.init_app(app)
     Migrate(app, db)
     
-    # Initialize and configure APScheduler
-    scheduler.init_app(app)
-    scheduler.start()
-    
-    # Register scheduled jobs
-    from scheduled_jobs import register_jobs
-    register_jobs(scheduler, app)
+    # Initialize and configure APScheduler, only in processes serving requests
+    if app.config.get('SCHEDULER_ENABLED', True) and is_serving():
+        scheduler.init_app(app)
+        scheduler.start()
+        
+        # Register scheduled jobs
+        from scheduled_jobs import register_jobs
+        register_jobs(scheduler, app)
     
     # Register blueprints
     from views import register_blueprints
     register_blueprints(app)
     
+    # Drop in-process caches made stale by writes in other workers
+    from coherence_helpers import check_cache_coherence
+    app.before_request(check_cache_coherence)
+    
     # Serve static files
     @app.route('/static/<path:filename>')
     def static_files(filename):
@@ -80,6 +99,67 @@ def create_app(config_name=None):
         upgrade()
         click.echo('Database schema initialized successfully.')
     
+    # Add CLI command for rebuilding the materialized current price table
+    @app.cli.command('rebuild-prices')
+    def rebuild_prices_command():
+        """Rebuild current item prices from the purchase history."""
+        from cost_helpers import rebuild_current_prices
+        count = rebuild_current_prices()
+        click.echo(f'Rebuilt current prices for {count} items.')
+    
+    # Add CLI command for recomputing persisted order cost totals
+    @app.cli.command('refresh-order-totals')
+    def refresh_order_totals_command():
+        """Recompute stored order cost totals from their snapshot lines."""
+        from models import Order
+        from cost_helpers import refresh_order_totals
+        from cache_helpers import invalidate_session_caches
+        order_ids = [order_id for order_id, in db.session.query(Order.id)]
+        refresh_order_totals(order_ids)
+        invalidate_session_caches(db.session, [Order])
+        db.session.commit()
+        click.echo(f'Refreshed cost totals for {len(order_ids)} orders.')
+    
+    # Add CLI command for rebuilding the daily sales rollup
+    @app.cli.command('rebuild-rollup')
+    def rebuild_rollup_command():
+        """Rebuild the daily sales rollup from the order history."""
+        from rollup_helpers import rebuild_sales_rollup
+        count = rebuild_sales_rollup()
+        click.echo(f'Rebuilt {count} daily sales rollup rows.')
+    
+    # Add CLI command for exporting orders or cost lines to Parquet
+    @app.cli.command('export-parquet')
+    @click.argument('dataset', type=click.Choice(['orders', 'cost-lines']))
+    @click.argument('path', type=click.Path(dir_okay=False, writable=True))
+    @click.option('--period', default='all', help='all, month, 3months, 6months or year')
+    @click.option('--start', type=click.DateTime(['%Y-%m-%d']), help='First day (overrides --period)')
+    @click.option('--end', type=click.DateTime(['%Y-%m-%d']), help='Day after the last day (overrides --period)')
+    def export_parquet_command(dataset, path, period, start, end):
+        """Export orders or cost lines as a Parquet file."""
+        from export_helpers import write_parquet
+        from report_helpers import get_report_window
+        if start or end:
+            start_date = start.date() if start else None
+            end_date = end.date() if end else None
+        else:
+            start_date, end_date = get_report_window(period)
+        count = write_parquet(dataset, path, start_date, end_date)
+        click.echo(f'Wrote {count} {dataset} rows to {path}.')
+    
+    # Add CLI command for reconciling running inventory balances with the ledger
+    @app.cli.command('reconcile-stock')
+    def reconcile_stock_command():
+        """Rebuild inventory balances from purchases and order usage."""
+        from stock_helpers import reconcile_inventory_balances
+        drift = reconcile_inventory_balances()
+        for item in drift:
+            click.echo(
+                f"Drift: {item['item_type']} {item['item_id']} - balance {item['balance']}, "
+                f"ledger {item['ledger']}"
+            )
+        click.echo(f'Inventory balances rebuilt ({len(drift)} items had drifted).')
+    
     return app
 
 
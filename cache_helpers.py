@@ -0,0 +1,217 @@
+"""
+In-process caching utilities for Cookie Manager.
+"""
+import threading
+from collections import OrderedDict
+from itertools import chain
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+# Marker for "not in cache", so None can be cached as a real value
+MISSING = object()
+
+# (invalidate, predicate) pairs added by register_session_invalidation
+_session_invalidations = []
+
+# Hooks added by register_before_commit, run in order
+_before_commit_hooks = []
+
+
+class LRUCache:
+    """
+    Thread-safe, size-bounded LRU cache with hit/miss counters.
+
+    Every invalidation bumps a generation counter. A reader that takes the
+    generation before loading a value and passes it to set() cannot put back
+    a value that was invalidated while it was loading.
+    """
+
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.generation = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """
+        Look up a key, marking it as most recently used.
+
+        Args:
+            key: Cache key
+
+        Returns:
+            The cached value, or MISSING if the key is not cached
+        """
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key]
+            self.misses += 1
+            return MISSING
+
+    def set(self, key, value, generation=None):
+        """
+        Store a value, evicting the least recently used entries if full.
+
+        Args:
+            key: Cache key
+            value: Value to store
+            generation (int): Optional generation the value was loaded under.
+                The value is dropped if the cache was invalidated since.
+
+        Returns:
+            bool: True if the value was stored
+        """
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return False
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+            return True
+
+    def invalidate(self, key):
+        """Remove a single key if present."""
+        with self._lock:
+            self._data.pop(key, None)
+            self.generation += 1
+
+    def invalidate_all(self):
+        """Remove all entries, keeping the hit/miss counters."""
+        with self._lock:
+            self._data.clear()
+            self.generation += 1
+
+    def clear(self):
+        """Remove all entries and reset the counters."""
+        with self._lock:
+            self._data.clear()
+            self.generation += 1
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        """
+        Get cache statistics.
+
+        Returns:
+            dict: Dict with size, maxsize, hits, misses and hit_rate
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._data),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': (self.hits / lookups) if lookups else 0
+            }
+
+    def __len__(self):
+        return len(self._data)
+
+
+def register_session_invalidation(invalidate, predicate):
+    """
+    Invalidate a cache whenever a session writes a model it is built from.
+
+    invalidate runs as soon as a flush or bulk statement writes a model for
+    which predicate is true, and again when that transaction commits or rolls
+    back, so a value read and cached between the write and the end of the
+    transaction is not left behind.
+
+    Args:
+        invalidate (callable): Called with no arguments, e.g. an LRUCache's invalidate_all
+        predicate (callable): Takes a model class; True if the cache reads it
+    """
+    _session_invalidations.append((invalidate, predicate))
+
+
+def register_before_commit(hook):
+    """
+    Run hook(session) just before every commit, once pending changes are flushed.
+
+    All hooks share a single flush, so each sees every ORM write of the
+    transaction. Can be used as a decorator.
+
+    Args:
+        hook (callable): Called with the committing session
+
+    Returns:
+        callable: The hook
+    """
+    _before_commit_hooks.append(hook)
+    return hook
+
+
+def invalidate_session_caches(session, models):
+    """
+    Invalidate caches for a write made with Core statements.
+
+    Core statements don't fire the flush hooks, so code that rewrites tables
+    with them calls this before committing. Matching invalidations run now
+    and again when the transaction ends, and the transaction counts as
+    having invalidated caches even if no local cache reads the models.
+
+    Args:
+        session (Session): Session the write was made in
+        models (iterable): Model classes whose tables were written
+    """
+    _invalidate_for_models(session, set(models))
+    session.info['caches_rewritten'] = True
+
+
+def session_invalidated_caches(session):
+    """Check whether the session's open transaction has invalidated any cache."""
+    return bool(session.info.get('invalidated_caches') or session.info.get('caches_rewritten'))
+
+
+def _invalidate_for_models(session, models):
+    invalidated = session.info.setdefault('invalidated_caches', [])
+    for invalidate, predicate in _session_invalidations:
+        if any(predicate(model) for model in models):
+            invalidate()
+            if invalidate not in invalidated:
+                invalidated.append(invalidate)
+
+
+@event.listens_for(Session, 'after_flush')
+def _on_session_flush(session, flush_context):
+    models = {type(obj) for obj in chain(session.new, session.dirty, session.deleted)}
+    if models:
+        _invalidate_for_models(session, models)
+
+
+@event.listens_for(Session, 'after_bulk_update')
+def _on_bulk_update(update_context):
+    _invalidate_for_models(update_context.session, {update_context.mapper.class_})
+
+
+@event.listens_for(Session, 'after_bulk_delete')
+def _on_bulk_delete(delete_context):
+    _invalidate_for_models(delete_context.session, {delete_context.mapper.class_})
+
+
+@event.listens_for(Session, 'before_commit')
+def _on_before_commit(session):
+    session.flush()
+    for hook in _before_commit_hooks:
+        hook(session)
+
+
+@event.listens_for(Session, 'after_commit')
+def _on_session_commit(session):
+    session.info.pop('caches_rewritten', None)
+    for invalidate in session.info.pop('invalidated_caches', ()):
+        invalidate()
+
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _on_session_rollback(session, previous_transaction):
+    session.info.pop('caches_rewritten', None)
+    for invalidate in session.info.pop('invalidated_caches', ()):
+        invalidate()
@@ -0,0 +1,114 @@
+"""
+Cache coherence between application processes.
+
+Gunicorn runs several workers, each with its own in-memory caches. Every
+commit that writes data also bumps the single cache_version row, in the same
+transaction. At the start of each request a worker compares that row with the
+last version it saw and drops its caches if another process has written since.
+"""
+import threading
+from flask import has_request_context, request
+from sqlalchemy import event, insert, select, update
+from sqlalchemy.orm import Session
+from models import db, CacheVersion
+from cache_helpers import register_before_commit, session_invalidated_caches
+from cost_helpers import price_cache
+from recipe_helpers import recipe_cost_cache
+from report_helpers import bump_data_version
+
+CACHE_VERSION_ID = 1
+
+# Endpoints that never read the caches, so the per-request check is skipped
+UNCACHED_ENDPOINTS = {'static', 'static_files', 'dashboard.events'}
+
+# Last cache version this process has caught up with
+_seen_version = None
+_seen_version_lock = threading.Lock()
+
+
+def read_cache_version(session=None):
+    """
+    Read the shared cache version.
+
+    Args:
+        session (Session): Session to run in. Defaults to db.session.
+
+    Returns:
+        int: Current version, 0 if no write has been recorded yet
+    """
+    session = session or db.session
+    version = session.execute(
+        select(CacheVersion.version).where(CacheVersion.id == CACHE_VERSION_ID)
+    ).scalar()
+    return version or 0
+
+
+def bump_cache_version(session=None):
+    """
+    Increment the shared cache version in the current transaction.
+
+    Args:
+        session (Session): Session to run in. Defaults to db.session.
+
+    Returns:
+        int: The new version
+    """
+    session = session or db.session
+    table = CacheVersion.__table__
+    result = session.execute(
+        update(table).where(table.c.id == CACHE_VERSION_ID).values(version=table.c.version + 1)
+    )
+    if result.rowcount == 0:
+        session.execute(insert(table).values(id=CACHE_VERSION_ID, version=1))
+    return read_cache_version(session)
+
+
+def clear_local_caches():
+    """Drop every in-memory cache held by this process."""
+    price_cache.invalidate_all()
+    recipe_cost_cache.invalidate_all()
+    bump_data_version()
+
+
+def check_cache_coherence():
+    """
+    Drop this process's caches if another process has written since the last check.
+
+    Registered to run at the start of every request, so it returns nothing.
+    Requests for UNCACHED_ENDPOINTS skip the check.
+    """
+    global _seen_version
+    if has_request_context() and request.endpoint in UNCACHED_ENDPOINTS:
+        return
+
+    version = read_cache_version()
+    with _seen_version_lock:
+        stale = _seen_version is not None and version != _seen_version
+        _seen_version = version
+    if stale:
+        clear_local_caches()
+
+
+# Version bump hooks. A transaction that invalidated any local cache bumps the
+# version row just before it commits.
+
+@register_before_commit
+def _bump_on_commit(session):
+    if session_invalidated_caches(session):
+        session.info['cache_version'] = bump_cache_version(session)
+
+
+@event.listens_for(Session, 'after_commit')
+def _on_session_commit(session):
+    global _seen_version
+    version = session.info.pop('cache_version', None)
+    if version is not None:
+        # This process already invalidated its own caches for the write
+        with _seen_version_lock:
+            if _seen_version is not None and version == _seen_version + 1:
+                _seen_version = version
+
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _on_session_rollback(session, previous_transaction):
+    session.info.pop('cache_version', None)
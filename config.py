@@ -12,7 +12,24 @@ class Config:
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     UPLOAD_FOLDER = Path(basedir) / 'static' / 'img'
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max upload
-    
+    SCHEDULER_ENABLED = True  # Run background jobs (low stock checks, etc.)
+    PRICE_CACHE_ENABLED = True  # Cache latest unit costs in memory
+    RECIPE_COST_CACHE_ENABLED = True  # Cache recipe costings in memory
+    REPORT_CACHE_ENABLED = True  # Cache report aggregates in memory
+    # Seconds browsers may reuse each dashboard panel before fetching it again
+    DASHBOARD_PANEL_TTLS = {
+        'kpis': 60,
+        'charts': 300,
+        'low-stock': 30,
+        'recent-orders': 15
+    }
+    # Dashboard event streams: most open per worker process, seconds between
+    # checks for events from other workers, and seconds before a stream is
+    # closed for the browser to reconnect
+    DASHBOARD_EVENTS_MAX_STREAMS = 8
+    DASHBOARD_EVENTS_POLL_SECONDS = 5
+    DASHBOARD_EVENTS_STREAM_SECONDS = 300
+
 
 class DevelopmentConfig(Config):
     """Development configuration settings."""
@@ -24,6 +41,10 @@ class TestingConfig(Config):
     TESTING = True
     SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
     WTF_CSRF_ENABLED = False
+    SCHEDULER_ENABLED = False
+    PRICE_CACHE_ENABLED = False
+    RECIPE_COST_CACHE_ENABLED = False
+    REPORT_CACHE_ENABLED = False
 
 
 class ProductionConfig(Config):
@@ -1,39 +1,375 @@
-from sqlalchemy import func
-from models import db, Purchase, Ingredient, Packaging, OrderIngredient, OrderPackaging
+from bisect import bisect_right
+from collections import defaultdict
+from datetime import datetime
+from itertools import chain
+from flask import current_app
+from sqlalchemy import and_, delete, event, func, insert, inspect, select, update
+from sqlalchemy.orm import Session
+from models import db, Purchase, Ingredient, Packaging, Order, OrderIngredient, OrderPackaging, CurrentItemPrice
+from cache_helpers import LRUCache, MISSING, invalidate_session_caches, register_session_invalidation
 
 
-def get_latest_unit_cost(item_type, item_id):
+# Item models keyed by the item_type values used on Purchase
+ITEM_MODELS = {
+    'ingredient': Ingredient,
+    'packaging': Packaging
+}
+
+
+# Process-wide cache of latest unit costs keyed by (item_type, item_id).
+# Entries are dropped by the ORM write hooks at the bottom of this module.
+PRICE_CACHE_SIZE = 2048
+price_cache = LRUCache(maxsize=PRICE_CACHE_SIZE)
+
+
+def price_cache_enabled():
+    """Check whether the latest-price cache is enabled for the current app."""
+    return current_app.config.get('PRICE_CACHE_ENABLED', True)
+
+
+def get_latest_unit_costs(item_type, item_ids, as_of=None, price_history=None):
+    """
+    Get the latest unit costs for many ingredient or packaging items at once.
+    
+    Prices are served from the process-wide price cache when enabled; any
+    remaining items are resolved from the database in one batch. With as_of,
+    prices are resolved as they stood on that date instead.
+    
+    Args:
+        item_type (str): Either 'ingredient' or 'packaging'
+        item_ids (iterable): IDs of the items
+        as_of (date): Optional date to price at. Defaults to current prices.
+        price_history (PriceHistory): Optional preloaded history to use for
+            as_of lookups. Loaded for just these items if not given.
+        
+    Returns:
+        dict: Maps item ID to its latest unit cost in millicents. Items with
+            no purchase and no default price are omitted.
+            (Note: 1 cent = 1000 millicents)
+    """
+    item_ids = {item_id for item_id in item_ids if item_id is not None}
+    if not item_ids:
+        return {}
+    
+    if as_of is not None:
+        if price_history is None:
+            price_history = PriceHistory.load(item_type, item_ids)
+        return price_history.unit_costs(item_type, item_ids, as_of)
+    
+    if not price_cache_enabled():
+        return _query_latest_unit_costs(item_type, item_ids)
+    
+    # Taken before the lookups, so prices invalidated mid-query aren't cached
+    generation = price_cache.generation
+    costs = {}
+    uncached_ids = set()
+    for item_id in item_ids:
+        cost = price_cache.get((item_type, item_id))
+        if cost is MISSING:
+            uncached_ids.add(item_id)
+        elif cost is not None:
+            costs[item_id] = cost
+    
+    if uncached_ids:
+        resolved = _query_latest_unit_costs(item_type, uncached_ids)
+        for item_id in uncached_ids:
+            # Cache "no price" as None too, so unpriced items don't re-query
+            price_cache.set((item_type, item_id), resolved.get(item_id), generation)
+        costs.update(resolved)
+    
+    return costs
+
+
+def _query_latest_unit_costs(item_type, item_ids):
+    """
+    Resolve latest unit costs from the database.
+    
+    Reads the materialized current_item_prices table joined to the item, so
+    the item's default price can be used as a fallback in the same query.
+    
+    Args:
+        item_type (str): Either 'ingredient' or 'packaging'
+        item_ids (set): IDs of the items
+        
+    Returns:
+        dict: Maps item ID to its latest unit cost in millicents
+    """
+    model = ITEM_MODELS.get(item_type)
+    if model is None:
+        return {}
+    
+    rows = db.session.query(
+        model.id,
+        CurrentItemPrice.unit_cost_cents,
+        model.default_price_per_unit_cents
+    ).outerjoin(CurrentItemPrice, and_(
+        CurrentItemPrice.item_type == item_type,
+        CurrentItemPrice.item_id == model.id
+    )).filter(model.id.in_(item_ids)).all()
+    
+    costs = {}
+    for item_id, unit_cost_millicents, default_price_cents in rows:
+        if unit_cost_millicents:
+            costs[item_id] = unit_cost_millicents
+        elif default_price_cents:
+            # Convert default price to millicents
+            costs[item_id] = default_price_cents * 1000
+    
+    return costs
+
+
+def get_latest_cost_entries(item_type):
+    """
+    Get latest cost entries for every item of one type.
+    
+    Args:
+        item_type (str): Either 'ingredient' or 'packaging'
+        
+    Returns:
+        list: Dicts with item, latest_purchase, unit_cost_cents and
+            last_purchase_date, ordered by item name
+    """
+    model = ITEM_MODELS[item_type]
+    
+    # Join each item to its materialized current price (zero-cost adjustments never appear there)
+    rows = db.session.query(model, CurrentItemPrice).outerjoin(CurrentItemPrice, and_(
+        CurrentItemPrice.item_type == item_type,
+        CurrentItemPrice.item_id == model.id
+    )).order_by(model.name).all()
+    
+    return [{
+        'item': item,
+        'latest_purchase': current_price,
+        'unit_cost_cents': current_price.unit_cost_cents if current_price else item.default_price_per_unit_cents,
+        'last_purchase_date': current_price.purchase_date if current_price else None
+    } for item, current_price in rows]
+
+
+def _latest_purchase_select(item_type=None, item_ids=None):
+    """
+    Build a select of the latest non-zero purchase per item.
+    
+    Args:
+        item_type (str): Optional item type to restrict to
+        item_ids (iterable): Optional item IDs to restrict to
+        
+    Returns:
+        Select: Rows of item_type, item_id, unit_cost_cents, purchase_id, purchase_date
+    """
+    # Zero-cost purchases are inventory adjustments and never set a price
+    conditions = [Purchase.unit_cost_cents > 0, Purchase.item_type.isnot(None)]
+    if item_type is not None:
+        conditions.append(Purchase.item_type == item_type)
+    if item_ids is not None:
+        conditions.append(Purchase.item_id.in_(item_ids))
+    
+    ranked = select(
+        Purchase.item_type,
+        Purchase.item_id,
+        Purchase.unit_cost_cents,
+        Purchase.id.label('purchase_id'),
+        Purchase.purchase_date,
+        func.row_number().over(
+            partition_by=(Purchase.item_type, Purchase.item_id),
+            order_by=(Purchase.purchase_date.desc(), Purchase.id.desc())
+        ).label('rank')
+    ).where(*conditions).subquery()
+    
+    return select(
+        ranked.c.item_type,
+        ranked.c.item_id,
+        ranked.c.unit_cost_cents,
+        ranked.c.purchase_id,
+        ranked.c.purchase_date
+    ).where(ranked.c.rank == 1)
+
+
+CURRENT_PRICE_COLUMNS = ['item_type', 'item_id', 'unit_cost_cents', 'purchase_id', 'purchase_date']
+
+
+def refresh_current_prices(keys, session=None):
+    """
+    Recompute current_item_prices rows for the given items.
+    
+    Args:
+        keys (iterable): (item_type, item_id) tuples to refresh
+        session (Session): Session to run in. Defaults to db.session.
+        
+    Returns:
+        None
+    """
+    session = session or db.session
+    table = CurrentItemPrice.__table__
+    
+    ids_by_type = defaultdict(set)
+    for item_type, item_id in keys:
+        if item_type is not None and item_id is not None:
+            ids_by_type[item_type].add(item_id)
+    
+    for item_type, item_ids in ids_by_type.items():
+        session.execute(delete(table).where(
+            table.c.item_type == item_type,
+            table.c.item_id.in_(item_ids)
+        ))
+        session.execute(insert(table).from_select(
+            CURRENT_PRICE_COLUMNS,
+            _latest_purchase_select(item_type, item_ids)
+        ))
+
+
+def rebuild_current_prices():
+    """
+    Rebuild the whole current_item_prices table from purchase history.
+    
+    Returns:
+        int: Number of items with a current price
+    """
+    table = CurrentItemPrice.__table__
+    db.session.execute(delete(table))
+    db.session.execute(insert(table).from_select(CURRENT_PRICE_COLUMNS, _latest_purchase_select()))
+    invalidate_session_caches(db.session, [CurrentItemPrice])
+    db.session.commit()
+    
+    return db.session.query(func.count()).select_from(table).scalar()
+
+
+class PriceHistory:
+    """
+    In-memory index of every non-zero purchase price, for as-of lookups.
+    
+    Prices are loaded once and kept sorted by purchase date per item, so
+    each point-in-time lookup is a bisect rather than a query. Load one
+    history up front to price many orders at their own dates.
+    """
+    
+    def __init__(self, purchases, default_prices):
+        """
+        Build the index.
+        
+        Args:
+            purchases (iterable): (item_type, item_id, purchase_date, unit_cost_cents)
+                rows sorted by item, then purchase date, then purchase ID
+            default_prices (dict): Maps (item_type, item_id) to default price in cents
+        """
+        self._dates = defaultdict(list)
+        self._costs = defaultdict(list)
+        for item_type, item_id, purchase_date, unit_cost_cents in purchases:
+            self._dates[(item_type, item_id)].append(purchase_date)
+            self._costs[(item_type, item_id)].append(unit_cost_cents)
+        self._default_prices = default_prices
+    
+    @classmethod
+    def load(cls, item_type=None, item_ids=None):
+        """
+        Load price history from the database.
+        
+        Args:
+            item_type (str): Optional item type to restrict to
+            item_ids (iterable): Optional item IDs to restrict to (needs item_type)
+            
+        Returns:
+            PriceHistory: Index over the matching purchases
+        """
+        # Zero-cost purchases are inventory adjustments and never set a price
+        query = db.session.query(
+            Purchase.item_type,
+            Purchase.item_id,
+            Purchase.purchase_date,
+            Purchase.unit_cost_cents
+        ).filter(Purchase.unit_cost_cents > 0, Purchase.purchase_date.isnot(None))
+        if item_type is not None:
+            query = query.filter(Purchase.item_type == item_type)
+        if item_ids is not None:
+            query = query.filter(Purchase.item_id.in_(set(item_ids)))
+        purchases = query.order_by(
+            Purchase.item_type, Purchase.item_id, Purchase.purchase_date, Purchase.id
+        ).all()
+        
+        default_prices = {}
+        for model_type, model in ITEM_MODELS.items():
+            if item_type is not None and model_type != item_type:
+                continue
+            defaults = db.session.query(model.id, model.default_price_per_unit_cents).filter(
+                model.default_price_per_unit_cents.isnot(None),
+                model.default_price_per_unit_cents != 0
+            )
+            if item_ids is not None:
+                defaults = defaults.filter(model.id.in_(set(item_ids)))
+            for item_id, default_price_cents in defaults:
+                default_prices[(model_type, item_id)] = default_price_cents
+        
+        return cls(purchases, default_prices)
+    
+    def unit_cost(self, item_type, item_id, as_of):
+        """
+        Get an item's unit cost as of a date.
+        
+        Args:
+            item_type (str): Either 'ingredient' or 'packaging'
+            item_id (int): ID of the item
+            as_of (date): Date to price at. Purchases on this date count.
+            
+        Returns:
+            int: Unit cost in millicents, or None if no price data exists
+        """
+        if isinstance(as_of, datetime):
+            as_of = as_of.date()
+        
+        key = (item_type, item_id)
+        position = bisect_right(self._dates.get(key, []), as_of)
+        if position:
+            return self._costs[key][position - 1]
+        
+        # No purchase yet on that date, use default price from item
+        default_price_cents = self._default_prices.get(key)
+        if default_price_cents:
+            # Convert default price to millicents
+            return default_price_cents * 1000
+        return None
+    
+    def unit_costs(self, item_type, item_ids, as_of):
+        """
+        Get unit costs for many items as of a date.
+        
+        Returns:
+            dict: Maps item ID to unit cost in millicents, omitting unpriced items
+        """
+        costs = {}
+        for item_id in item_ids:
+            cost = self.unit_cost(item_type, item_id, as_of)
+            if cost is not None:
+                costs[item_id] = cost
+        return costs
+
+
+def get_latest_unit_cost(item_type, item_id, as_of=None):
     """
     Get the latest unit cost for an ingredient or packaging item.
     
     Args:
         item_type (str): Either 'ingredient' or 'packaging'
         item_id (int): ID of the item
+        as_of (date): Optional date to price at. Defaults to current prices.
         
     Returns:
         int: Latest unit cost in millicents, or None if no purchase exists
             (Note: 1 cent = 1000 millicents)
     """
-    # Filter out zero-cost purchases (like inventory adjustments)
-    latest_purchase = Purchase.query.filter_by(
-        item_type=item_type,
-        item_id=item_id
-    ).filter(Purchase.unit_cost_cents > 0).order_by(Purchase.purchase_date.desc()).first()
-    
-    # If no non-zero cost purchase found, use default price from item
-    if not latest_purchase:
-        if item_type == 'ingredient':
-            item = Ingredient.query.get(item_id)
-            if item and item.default_price_per_unit_cents:
-                # Convert default price to millicents
-                return item.default_price_per_unit_cents * 1000
-        elif item_type == 'packaging':
-            item = Packaging.query.get(item_id)
-            if item and item.default_price_per_unit_cents:
-                # Convert default price to millicents
-                return item.default_price_per_unit_cents * 1000
+    return get_latest_unit_costs(item_type, [item_id], as_of=as_of).get(item_id)
+
+
+def millicents_to_cents(unit_cost_millicents, amount):
+    """
+    Convert a unit cost in millicents times an amount to whole cents.
     
-    return latest_purchase.unit_cost_cents if latest_purchase else None
+    Args:
+        unit_cost_millicents (int): Unit cost in millicents
+        amount (float): Amount or quantity used
+        
+    Returns:
+        int: Cost in cents, rounded half up
+    """
+    return int((unit_cost_millicents * amount) / 1000 + 0.5)
 
 
 def calculate_ingredient_cost(ingredient_id, amount):
@@ -51,8 +387,7 @@ def calculate_ingredient_cost(ingredient_id, amount):
     if unit_cost_millicents is None:
         return None
     
-    # Calculate cost in millicents, then convert back to cents
-    return int((unit_cost_millicents * amount) / 1000)
+    return millicents_to_cents(unit_cost_millicents, amount)
 
 
 def calculate_packaging_cost(packaging_id, quantity):
@@ -70,36 +405,63 @@ def calculate_packaging_cost(packaging_id, quantity):
     if unit_cost_millicents is None:
         return None
     
-    # Calculate cost in millicents, then convert back to cents
-    return int((unit_cost_millicents * quantity) / 1000)
+    return millicents_to_cents(unit_cost_millicents, quantity)
 
 
-def calculate_order_cost_preview(ingredients, packaging):
+def price_order_lines(ingredients, packaging, as_of=None, price_history=None):
     """
-    Calculate a preview of order costs based on current prices.
+    Price every ingredient and packaging line of an order in one batch.
     
     Args:
         ingredients (list): List of dicts with 'id' and 'amount' keys
         packaging (list): List of dicts with 'id' and 'quantity' keys
+        as_of (date): Optional date to price at. Defaults to current prices.
+        price_history (PriceHistory): Optional preloaded history for as_of pricing
         
     Returns:
-        dict: Dict with ingredient_cost_cents, packaging_cost_cents, total_cost_cents
+        tuple: Two lists of (item_id, amount, cost_cents) tuples - ingredient
+            lines and packaging lines. cost_cents is None when no price exists.
     """
-    ingredient_cost_cents = 0
-    packaging_cost_cents = 0
+    ingredient_prices = get_latest_unit_costs(
+        'ingredient', [item['id'] for item in ingredients], as_of=as_of, price_history=price_history
+    )
+    packaging_prices = get_latest_unit_costs(
+        'packaging', [item['id'] for item in packaging], as_of=as_of, price_history=price_history
+    )
+    
+    def price_lines(lines, prices, amount_key):
+        priced = []
+        for item in lines:
+            unit_cost_millicents = prices.get(item['id'])
+            cost = None
+            if unit_cost_millicents is not None:
+                cost = millicents_to_cents(unit_cost_millicents, item[amount_key])
+            priced.append((item['id'], item[amount_key], cost))
+        return priced
     
-    # Calculate ingredient costs
-    for item in ingredients:
-        cost = calculate_ingredient_cost(item['id'], item['amount'])
-        if cost:
-            ingredient_cost_cents += cost
+    return (
+        price_lines(ingredients, ingredient_prices, 'amount'),
+        price_lines(packaging, packaging_prices, 'quantity')
+    )
+
+
+def calculate_order_cost_preview(ingredients, packaging, as_of=None, price_history=None):
+    """
+    Calculate a preview of order costs based on current prices.
     
-    # Calculate packaging costs
-    for item in packaging:
-        cost = calculate_packaging_cost(item['id'], item['quantity'])
-        if cost:
-            packaging_cost_cents += cost
+    Args:
+        ingredients (list): List of dicts with 'id' and 'amount' keys
+        packaging (list): List of dicts with 'id' and 'quantity' keys
+        as_of (date): Optional date to price at instead of today
+        price_history (PriceHistory): Optional preloaded history for as_of pricing
+        
+    Returns:
+        dict: Dict with ingredient_cost_cents, packaging_cost_cents, total_cost_cents
+    """
+    ingredient_lines, packaging_lines = price_order_lines(ingredients, packaging, as_of, price_history)
     
+    ingredient_cost_cents = sum(cost for _, _, cost in ingredient_lines if cost)
+    packaging_cost_cents = sum(cost for _, _, cost in packaging_lines if cost)
     total_cost_cents = ingredient_cost_cents + packaging_cost_cents
     
     return {
@@ -109,129 +471,160 @@ def calculate_order_cost_preview(ingredients, packaging):
     }
 
 
-def snapshot_order_costs(order, ingredients, packaging):
+def snapshot_order_costs(order, ingredients, packaging, as_of=None, price_history=None):
     """
     Create cost snapshots for an order's ingredients and packaging.
     
+    All lines are priced in one batch and written with a single executemany
+    insert per table inside the caller's transaction. The caller commits.
+    
     Args:
         order (Order): Order object
         ingredients (list): List of dicts with 'id' and 'amount' keys
         packaging (list): List of dicts with 'id' and 'quantity' keys
+        as_of (date): Optional date to price at, e.g. a backdated order's
+            order_date. Defaults to current prices.
+        price_history (PriceHistory): Optional preloaded history for as_of pricing
         
     Returns:
         None
     """
-    # Create ingredient snapshots
-    for item in ingredients:
-        ingredient_id = item['id']
-        amount = item['amount']
-        cost = calculate_ingredient_cost(ingredient_id, amount)
-        
-        if cost is None:
-            # Default to 0 if no cost data
-            cost = 0
-        
-        order_ingredient = OrderIngredient(
-            order_id=order.id,
-            ingredient_id=ingredient_id,
-            amount_used=amount,
-            cost_at_time_of_use_cents=cost
-        )
-        db.session.add(order_ingredient)
-    
-    # Create packaging snapshots
-    for item in packaging:
-        packaging_id = item['id']
-        quantity = item['quantity']
-        cost = calculate_packaging_cost(packaging_id, quantity)
-        
-        if cost is None:
-            # Default to 0 if no cost data
-            cost = 0
-        
-        order_packaging = OrderPackaging(
-            order_id=order.id,
-            packaging_id=packaging_id,
-            quantity_used=quantity,
-            cost_at_time_of_use_cents=cost
-        )
-        db.session.add(order_packaging)
+    from stock_helpers import apply_stock_deltas
     
-    db.session.commit()
+    if order.id is None:
+        db.session.flush()  # Get order ID without committing
+    
+    ingredient_lines, packaging_lines = price_order_lines(ingredients, packaging, as_of, price_history)
+    
+    # Ingredient and packaging snapshots (default to 0 if no cost data)
+    ingredient_rows = [{
+        'order_id': order.id,
+        'ingredient_id': ingredient_id,
+        'amount_used': amount,
+        'cost_at_time_of_use_cents': cost or 0
+    } for ingredient_id, amount, cost in ingredient_lines]
+    packaging_rows = [{
+        'order_id': order.id,
+        'packaging_id': packaging_id,
+        'quantity_used': quantity,
+        'cost_at_time_of_use_cents': cost or 0
+    } for packaging_id, quantity, cost in packaging_lines]
+    
+    if ingredient_rows:
+        db.session.execute(insert(OrderIngredient.__table__), ingredient_rows)
+    if packaging_rows:
+        db.session.execute(insert(OrderPackaging.__table__), packaging_rows)
+    
+    # Core inserts bypass the flush hooks, so record the stock used here
+    deltas = {}
+    for item_type, lines in (('ingredient', ingredient_lines), ('packaging', packaging_lines)):
+        for item_id, amount, _ in lines:
+            deltas[(item_type, item_id)] = deltas.get((item_type, item_id), 0) - amount
+    apply_stock_deltas(deltas)
+    
+    refresh_order_totals([order.id])
+    
+    # The order's line collections and totals were loaded before the insert
+    db.session.expire(order, ['ingredients', 'packaging'] + ORDER_TOTAL_ATTRIBUTES)
 
 
-def get_low_stock_items():
+# Persisted cost total attributes on Order, refreshed from its snapshot lines
+ORDER_TOTAL_ATTRIBUTES = ['_ingredient_cost_cents', '_packaging_cost_cents', '_total_cost_cents', '_profit_cents']
+
+
+def refresh_order_totals(order_ids, session=None):
     """
-    Get items that are below their low stock threshold.
+    Recompute the persisted cost totals of orders from their snapshot lines.
     
+    Args:
+        order_ids (iterable): IDs of the orders to refresh
+        session (Session): Session to run in. Defaults to db.session.
+        
     Returns:
-        tuple: Two lists - low stock ingredients and low stock packaging
+        None
     """
-    from sqlalchemy import func
-    from models import Purchase, OrderIngredient, OrderPackaging, Ingredient, Packaging
+    session = session or db.session
+    order_ids = {order_id for order_id in order_ids if order_id is not None}
+    if not order_ids:
+        return
     
-    # Calculate current stock levels for ingredients
-    low_stock_ingredients = []
+    orders = Order.__table__
+    order_ingredients = OrderIngredient.__table__
+    order_packaging = OrderPackaging.__table__
     
-    # For each ingredient
-    for ingredient in Ingredient.query.all():
-        # Skip if no threshold is set
-        if not ingredient.low_stock_threshold or ingredient.low_stock_threshold <= 0:
-            continue
-            
-        # Total purchased
-        total_purchased = db.session.query(func.sum(Purchase.quantity)).filter(
-            Purchase.item_type == 'ingredient',
-            Purchase.item_id == ingredient.id
-        ).scalar() or 0
-        
-        # Total used in orders
-        total_used = db.session.query(func.sum(OrderIngredient.amount_used)).filter(
-            OrderIngredient.ingredient_id == ingredient.id
-        ).scalar() or 0
-        
-        # Current stock level
-        current_stock = total_purchased - total_used
-        
-        # Check if below threshold
-        if current_stock <= ingredient.low_stock_threshold:
-            low_stock_ingredients.append({
-                'item': ingredient,
-                'current_stock': current_stock,
-                'threshold': ingredient.low_stock_threshold,
-                'unit': ingredient.default_unit
-            })
-    
-    # Calculate current stock levels for packaging
-    low_stock_packaging = []
-    
-    # For each packaging item
-    for packaging in Packaging.query.all():
-        # Skip if no threshold is set
-        if not packaging.low_stock_threshold or packaging.low_stock_threshold <= 0:
-            continue
-            
-        # Total purchased
-        total_purchased = db.session.query(func.sum(Purchase.quantity)).filter(
-            Purchase.item_type == 'packaging',
-            Purchase.item_id == packaging.id
-        ).scalar() or 0
-        
-        # Total used in orders
-        total_used = db.session.query(func.sum(OrderPackaging.quantity_used)).filter(
-            OrderPackaging.packaging_id == packaging.id
-        ).scalar() or 0
-        
-        # Current stock level
-        current_stock = total_purchased - total_used
-        
-        # Check if below threshold
-        if current_stock <= packaging.low_stock_threshold:
-            low_stock_packaging.append({
-                'item': packaging,
-                'current_stock': current_stock,
-                'threshold': packaging.low_stock_threshold,
-                'unit': packaging.default_unit
-            })
-    
-    return low_stock_ingredients, low_stock_packaging
+    ingredient_cost = select(
+        func.coalesce(func.sum(order_ingredients.c.cost_at_time_of_use_cents), 0)
+    ).where(order_ingredients.c.order_id == orders.c.id).scalar_subquery()
+    packaging_cost = select(
+        func.coalesce(func.sum(order_packaging.c.cost_at_time_of_use_cents), 0)
+    ).where(order_packaging.c.order_id == orders.c.id).scalar_subquery()
+    
+    session.execute(update(orders).where(orders.c.id.in_(order_ids)).values(
+        ingredient_cost_cents=ingredient_cost,
+        packaging_cost_cents=packaging_cost,
+        total_cost_cents=ingredient_cost + packaging_cost,
+        profit_cents=orders.c.sale_price_total_cents - ingredient_cost - packaging_cost
+    ))
+
+
+# Write hooks. Purchase writes refresh current_item_prices and order line
+# writes refresh the stored order totals within the same flush.
+
+def _purchase_price_keys(purchase):
+    """Get the (item_type, item_id) keys affected by a purchase write, including old values."""
+    state = inspect(purchase)
+    keys = {(purchase.item_type, purchase.item_id)}
+    
+    type_history = state.attrs.item_type.history
+    id_history = state.attrs.item_id.history
+    if type_history.deleted or id_history.deleted:
+        old_type = type_history.deleted[0] if type_history.deleted else purchase.item_type
+        old_id = id_history.deleted[0] if id_history.deleted else purchase.item_id
+        keys.add((old_type, old_id))
+    
+    return keys
+
+
+@event.listens_for(Session, 'after_flush')
+def _on_session_flush(session, flush_context):
+    # Keep current_item_prices in step with purchase writes in the same transaction
+    keys = set()
+    for obj in chain(session.new, session.dirty, session.deleted):
+        if isinstance(obj, Purchase):
+            keys |= _purchase_price_keys(obj)
+    if keys:
+        refresh_current_prices(keys, session)
+
+
+@event.listens_for(Session, 'after_flush')
+def _on_order_lines_flush(session, flush_context):
+    # Collect orders whose lines or sale price changed; refreshed after the flush
+    order_ids = set()
+    for obj in chain(session.new, session.dirty, session.deleted):
+        if isinstance(obj, (OrderIngredient, OrderPackaging)):
+            order_ids.add(obj.order_id)
+            order_ids.update(inspect(obj).attrs.order_id.history.deleted)
+        elif isinstance(obj, Order) and obj not in session.deleted:
+            if obj in session.new or inspect(obj).attrs.sale_price_total_cents.history.has_changes():
+                order_ids.add(obj.id)
+    if order_ids:
+        session.info.setdefault('stale_order_totals', set()).update(order_ids)
+
+
+@event.listens_for(Session, 'after_flush_postexec')
+def _on_order_lines_flush_postexec(session, flush_context):
+    order_ids = session.info.pop('stale_order_totals', None)
+    if not order_ids:
+        return
+    
+    refresh_order_totals(order_ids, session)
+    for obj in list(session.identity_map.values()):
+        if isinstance(obj, Order) and obj.id in order_ids:
+            session.expire(obj, ORDER_TOTAL_ATTRIBUTES)
+
+
+# Purchases, item defaults and current prices all feed the latest unit costs
+register_session_invalidation(
+    price_cache.invalidate_all,
+    lambda model: model in (Purchase, Ingredient, Packaging, CurrentItemPrice)
+)
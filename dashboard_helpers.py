@@ -0,0 +1,178 @@
+from datetime import date, datetime, timedelta
+from sqlalchemy import case, func, select
+from sqlalchemy.orm import joinedload
+from models import db, Customer, Recipe, Order, Ingredient, Packaging, DailySalesRollup
+from report_helpers import cached_report
+
+# Days in each of the two periods compared on the dashboard
+DASHBOARD_PERIOD_DAYS = 30
+
+# Orders listed under recent orders
+RECENT_ORDER_COUNT = 5
+
+# Months shown in the dashboard revenue chart, and recipes in the top cookies chart
+CHART_MONTHS = 6
+TOP_COOKIE_COUNT = 5
+
+# Models counted on the dashboard, by stat name
+DASHBOARD_COUNT_MODELS = {
+    'customer_count': Customer,
+    'recipe_count': Recipe,
+    'order_count': Order,
+    'ingredient_count': Ingredient,
+    'packaging_count': Packaging
+}
+
+# Rollup columns summed for each period, by metric name
+PERIOD_METRICS = {
+    'revenue': DailySalesRollup.revenue_cents,
+    'ingredient_cost': DailySalesRollup.ingredient_cost_cents,
+    'packaging_cost': DailySalesRollup.packaging_cost_cents,
+    'cookies_baked': DailySalesRollup.cookies_baked,
+    'order_count': DailySalesRollup.order_count
+}
+
+
+def get_dashboard_windows(today=None, days=DASHBOARD_PERIOD_DAYS):
+    """
+    Get the current and previous periods compared on the dashboard.
+
+    Args:
+        today (date): Optional reference date. Defaults to today.
+        days (int): Length of each period
+
+    Returns:
+        tuple: (previous_start, current_start, end) where the previous period
+            is [previous_start, current_start) and the current one is
+            [current_start, end)
+    """
+    today = today or datetime.now().date()
+    current_start = today - timedelta(days=days)
+    return current_start - timedelta(days=days), current_start, today + timedelta(days=1)
+
+
+def _dashboard_summary_select(previous_start, current_start, end):
+    """
+    Build the single statement behind the dashboard figures.
+
+    Both periods are summed in one pass over the rollup rows of the two
+    periods, each metric split with CASE WHEN on the day. The entity counts
+    ride along as scalar subqueries.
+    """
+    in_current = DailySalesRollup.sale_date >= current_start
+
+    columns = []
+    for name, column in PERIOD_METRICS.items():
+        columns.append(func.coalesce(func.sum(case((in_current, column), else_=0)), 0).label(f'current_{name}'))
+        columns.append(func.coalesce(func.sum(case((in_current, 0), else_=column)), 0).label(f'previous_{name}'))
+    for name, model in DASHBOARD_COUNT_MODELS.items():
+        columns.append(select(func.count()).select_from(model).scalar_subquery().label(name))
+
+    return select(*columns).where(
+        DailySalesRollup.sale_date >= previous_start, DailySalesRollup.sale_date < end
+    )
+
+
+def _period_totals(row, prefix):
+    totals = {name: row._mapping[f'{prefix}_{name}'] for name in PERIOD_METRICS}
+    totals['total_cost'] = totals['ingredient_cost'] + totals['packaging_cost']
+    totals['profit'] = totals['revenue'] - totals['total_cost']
+    return totals
+
+
+def get_dashboard_summary(today=None):
+    """
+    Get the entity counts and the current and previous period totals.
+
+    Everything comes from one statement, cached on the data version.
+
+    Args:
+        today (date): Optional reference date. Defaults to today.
+
+    Returns:
+        dict: counts (see DASHBOARD_COUNT_MODELS), plus current and previous
+            dicts with revenue, ingredient_cost, packaging_cost, total_cost,
+            profit (in cents), cookies_baked and order_count
+    """
+    previous_start, current_start, end = get_dashboard_windows(today)
+
+    def compute():
+        row = db.session.execute(_dashboard_summary_select(previous_start, current_start, end)).one()
+        return {
+            'counts': {name: row._mapping[name] for name in DASHBOARD_COUNT_MODELS},
+            'current': _period_totals(row, 'current'),
+            'previous': _period_totals(row, 'previous')
+        }
+
+    return cached_report('dashboard', {'start': previous_start, 'end': end}, compute)
+
+
+def get_recent_orders(limit=RECENT_ORDER_COUNT):
+    """
+    Get the latest orders with their customer and recipe loaded in the same query.
+
+    Args:
+        limit (int): Number of orders
+
+    Returns:
+        list: Order objects, newest first
+    """
+    return Order.query.options(
+        joinedload(Order.customer), joinedload(Order.recipe)
+    ).order_by(Order.order_date.desc()).limit(limit).all()
+
+
+def _month_start(day, months_back=0):
+    """First day of the month months_back months before day's month."""
+    year, month = divmod(day.year * 12 + day.month - 1 - months_back, 12)
+    return date(year, month + 1, 1)
+
+
+def get_dashboard_charts(today=None):
+    """
+    Get the data behind the dashboard charts, cached on the data version.
+
+    Args:
+        today (date): Optional reference date. Defaults to today.
+
+    Returns:
+        dict: months (labels as YYYY-MM, oldest first) with revenue and
+            profit per month, and top_cookies with the recipes that baked the
+            most cookies over those months (custom orders as 'Custom')
+    """
+    today = today or datetime.now().date()
+    start_date = _month_start(today, CHART_MONTHS - 1)
+    end_date = today + timedelta(days=1)
+
+    def compute():
+        rollup = DailySalesRollup
+        in_range = (rollup.sale_date >= start_date, rollup.sale_date < end_date)
+        month = func.strftime('%Y-%m', rollup.sale_date)
+        monthly = {
+            row.month: row for row in db.session.execute(
+                select(
+                    month.label('month'),
+                    func.sum(rollup.revenue_cents).label('revenue'),
+                    func.sum(rollup.ingredient_cost_cents + rollup.packaging_cost_cents).label('total_cost')
+                ).where(*in_range).group_by(month)
+            )
+        }
+
+        cookies = func.sum(rollup.cookies_baked)
+        top_cookies = db.session.execute(
+            select(func.coalesce(Recipe.name, 'Custom').label('name'), cookies.label('cookies'))
+            .outerjoin(Recipe, Recipe.id == rollup.recipe_id)
+            .where(*in_range).group_by(rollup.recipe_id).order_by(cookies.desc()).limit(TOP_COOKIE_COUNT)
+        ).all()
+
+        # Every month gets a point, even without sales
+        labels = [_month_start(today, back).strftime('%Y-%m') for back in range(CHART_MONTHS - 1, -1, -1)]
+        rows = [monthly.get(label) for label in labels]
+        return {
+            'months': labels,
+            'revenue': [row.revenue if row else 0 for row in rows],
+            'profit': [row.revenue - row.total_cost if row else 0 for row in rows],
+            'top_cookies': [{'name': row.name, 'cookies': row.cookies} for row in top_cookies]
+        }
+
+    return cached_report('dashboard-charts', {'start': start_date, 'end': end_date}, compute)
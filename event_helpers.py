@@ -0,0 +1,278 @@
+"""
+Dashboard events pushed to open dashboards over server-sent events.
+
+Write hooks turn each committed change into small deltas: new orders, the
+change in revenue and order count per day, and items crossing their low stock
+threshold. The events are inserted in the same transaction as the change, so
+every worker process can stream them from the dashboard_events table in ID
+order. Commits in this process also wake the local streams at once; events
+written by other processes are picked up on the next poll.
+"""
+import json
+import threading
+from datetime import datetime, timedelta
+from sqlalchemy import and_, delete, event, func, insert, inspect, select
+from sqlalchemy.orm import Session
+from models import db, Customer, Recipe, Order, InventoryBalance, DashboardEvent
+from cost_helpers import ITEM_MODELS
+from cache_helpers import register_before_commit
+
+# Events sent to a stream per query
+EVENT_BATCH_SIZE = 100
+
+# Events older than this are pruned; clients away longer reload the dashboard
+EVENT_RETENTION = timedelta(days=1)
+
+# Bumped by every commit in this process that wrote events
+_events_generation = 0
+_events_changed = threading.Condition()
+
+# Streams open in this process
+_open_streams = 0
+_open_streams_lock = threading.Lock()
+
+
+def open_event_stream(limit):
+    """
+    Reserve one of this process's stream slots.
+
+    Args:
+        limit (int): Most streams allowed open at once
+
+    Returns:
+        bool: True if a slot was reserved; release it with close_event_stream
+    """
+    global _open_streams
+    with _open_streams_lock:
+        if _open_streams >= limit:
+            return False
+        _open_streams += 1
+        return True
+
+
+def close_event_stream():
+    """Release a stream slot reserved by open_event_stream."""
+    global _open_streams
+    with _open_streams_lock:
+        _open_streams = max(_open_streams - 1, 0)
+
+
+def get_events_generation():
+    """Get the counter bumped whenever this process commits events."""
+    with _events_changed:
+        return _events_generation
+
+
+def wait_for_events(generation, timeout):
+    """
+    Block until this process commits events after generation, or timeout.
+
+    Args:
+        generation (int): Generation the caller has already read up to
+        timeout (float): Most seconds to wait
+
+    Returns:
+        int: The current generation
+    """
+    with _events_changed:
+        _events_changed.wait_for(lambda: _events_generation != generation, timeout)
+        return _events_generation
+
+
+def get_last_event_id():
+    """Get the ID of the newest event, 0 if there are none."""
+    return db.session.execute(select(func.max(DashboardEvent.id))).scalar() or 0
+
+
+def get_events_after(last_id, limit=EVENT_BATCH_SIZE):
+    """
+    Get the events written after an event ID.
+
+    Args:
+        last_id (int): ID of the last event already seen
+        limit (int): Most events to return
+
+    Returns:
+        list: Dicts with id, kind and data (the decoded payload), oldest first
+    """
+    rows = db.session.execute(
+        select(DashboardEvent.id, DashboardEvent.kind, DashboardEvent.payload)
+        .where(DashboardEvent.id > last_id).order_by(DashboardEvent.id).limit(limit)
+    ).all()
+    return [{'id': row.id, 'kind': row.kind, 'data': json.loads(row.payload)} for row in rows]
+
+
+def format_sse(event_id=None, kind=None, data=None, comment=None):
+    """
+    Format one server-sent events message.
+
+    Args:
+        event_id (int): Optional ID clients resume from
+        kind (str): Optional event name
+        data: Optional JSON-serialisable data
+        comment (str): Optional comment, ignored by clients (keeps idle streams open)
+
+    Returns:
+        str: The message, terminated by a blank line
+    """
+    lines = []
+    if comment is not None:
+        lines.append(f': {comment}')
+    if event_id is not None:
+        lines.append(f'id: {event_id}')
+    if kind is not None:
+        lines.append(f'event: {kind}')
+    if data is not None:
+        lines.append(f'data: {json.dumps(data, separators=(",", ":"))}')
+    return '\n'.join(lines) + '\n\n'
+
+
+def prune_dashboard_events(older_than=EVENT_RETENTION):
+    """
+    Delete events no open stream should still need.
+
+    Args:
+        older_than (timedelta): Age beyond which events are deleted
+
+    Returns:
+        int: Number of events deleted
+    """
+    table = DashboardEvent.__table__
+    result = db.session.execute(delete(table).where(table.c.created_at < datetime.utcnow() - older_than))
+    db.session.commit()
+    return result.rowcount
+
+
+# Event capture. Flushes record the revenue and order count each day gains or
+# loses and the new order IDs; stock_helpers records the net stock movement per
+# item. Just before commit these become event rows.
+
+def _add_day_delta(session, order_date, revenue, orders):
+    if order_date is None:
+        return
+    deltas = session.info.setdefault('event_day_deltas', {})
+    day = order_date.date()
+    day_revenue, day_orders = deltas.get(day, (0, 0))
+    deltas[day] = (day_revenue + (revenue or 0), day_orders + orders)
+
+
+def _changes_sales(obj):
+    state = inspect(obj).attrs
+    return state.order_date.history.has_changes() or state.sale_price_total_cents.history.has_changes()
+
+
+@event.listens_for(Session, 'before_flush')
+def _on_before_flush(session, flush_context, instances):
+    # Take back what deleted and changed orders counted for while the rows
+    # still hold it; the old values may not be loaded on the objects
+    order_ids = {obj.id for obj in session.deleted if isinstance(obj, Order)}
+    order_ids.update(obj.id for obj in session.dirty if isinstance(obj, Order) and _changes_sales(obj))
+    order_ids.discard(None)
+    if not order_ids:
+        return
+
+    for order_date, revenue in session.execute(
+        select(Order.order_date, Order.sale_price_total_cents).where(Order.id.in_(order_ids))
+    ):
+        _add_day_delta(session, order_date, -revenue, -1)
+
+
+@event.listens_for(Session, 'after_flush')
+def _on_after_flush(session, flush_context):
+    for obj in session.new:
+        if isinstance(obj, Order):
+            session.info.setdefault('event_order_ids', set()).add(obj.id)
+            _add_day_delta(session, obj.order_date, obj.sale_price_total_cents, 1)
+    for obj in session.dirty:
+        if isinstance(obj, Order) and obj not in session.deleted and _changes_sales(obj):
+            _add_day_delta(session, obj.order_date, obj.sale_price_total_cents, 1)
+
+
+def _order_events(session, order_ids):
+    rows = session.execute(
+        select(
+            Order.id, Order.order_date, Order.sale_price_total_cents, Order.quantity_ordered,
+            Customer.name.label('customer_name'), Recipe.name.label('recipe_name')
+        ).outerjoin(Customer, Customer.id == Order.customer_id)
+         .outerjoin(Recipe, Recipe.id == Order.recipe_id)
+         .where(Order.id.in_(order_ids)).order_by(Order.id)
+    )
+    return [('order', {
+        'id': row.id,
+        'order_date': row.order_date.isoformat() if row.order_date else None,
+        'sale_price_total_cents': row.sale_price_total_cents,
+        'quantity_ordered': row.quantity_ordered,
+        'customer': row.customer_name,
+        'recipe': row.recipe_name or 'Custom'
+    }) for row in rows]
+
+
+def _low_stock_events(session, moved):
+    events = []
+    for item_type, model in ITEM_MODELS.items():
+        item_ids = {item_id for (moved_type, item_id), delta in moved.items() if moved_type == item_type and delta}
+        if not item_ids:
+            continue
+
+        rows = session.execute(
+            select(
+                model.id, model.name, model.default_unit, model.low_stock_threshold,
+                func.coalesce(InventoryBalance.quantity, 0).label('quantity')
+            ).outerjoin(InventoryBalance, and_(
+                InventoryBalance.item_type == item_type,
+                InventoryBalance.item_id == model.id
+            )).where(model.id.in_(item_ids), model.low_stock_threshold > 0).order_by(model.id)
+        )
+        for row in rows:
+            # Same rule as get_low_stock_items: at or below the threshold is low
+            was_low = row.quantity - moved[(item_type, row.id)] <= row.low_stock_threshold
+            is_low = row.quantity <= row.low_stock_threshold
+            if was_low != is_low:
+                events.append(('low-stock', {
+                    'item_type': item_type,
+                    'item_id': row.id,
+                    'name': row.name,
+                    'current_stock': row.quantity,
+                    'threshold': row.low_stock_threshold,
+                    'unit': row.default_unit,
+                    'low': is_low
+                }))
+    return events
+
+
+@register_before_commit
+def _write_events(session):
+    order_ids = session.info.pop('event_order_ids', set())
+    day_deltas = session.info.pop('event_day_deltas', {})
+    moved = session.info.pop('stock_moved', {})
+
+    events = _order_events(session, order_ids) if order_ids else []
+    events.extend(
+        ('revenue', {'date': day.isoformat(), 'revenue_cents': revenue, 'order_count': orders})
+        for day, (revenue, orders) in sorted(day_deltas.items()) if revenue or orders
+    )
+    if moved:
+        events.extend(_low_stock_events(session, moved))
+    if not events:
+        return
+
+    now = datetime.utcnow()
+    session.execute(insert(DashboardEvent.__table__), [
+        {'created_at': now, 'kind': kind, 'payload': json.dumps(data)} for kind, data in events
+    ])
+    session.info['events_written'] = True
+
+
+@event.listens_for(Session, 'after_commit')
+def _on_session_commit(session):
+    global _events_generation
+    if session.info.pop('events_written', False):
+        with _events_changed:
+            _events_generation += 1
+            _events_changed.notify_all()
+
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _on_session_rollback(session, previous_transaction):
+    for key in ('event_order_ids', 'event_day_deltas', 'stock_moved', 'events_written'):
+        session.info.pop(key, None)
@@ -0,0 +1,156 @@
+"""
+Columnar (Parquet) exports of orders and cost lines.
+"""
+import pyarrow as pa
+import pyarrow.parquet as pq
+from sqlalchemy import literal, select, union_all
+from models import db, Order, OrderIngredient, OrderPackaging, Customer, Recipe, Ingredient, Packaging
+from report_helpers import filter_order_dates
+
+# Rows per record batch, fetched from the cursor one batch at a time
+PARQUET_BATCH_SIZE = 5000
+
+# Column names and Arrow types of each dataset, in query column order
+PARQUET_COLUMNS = {
+    'orders': [
+        ('order_id', 'int64'),
+        ('order_date', 'timestamp'),
+        ('customer_id', 'int64'),
+        ('customer_name', 'string'),
+        ('customer_type', 'string'),
+        ('recipe_id', 'int64'),
+        ('recipe_name', 'string'),
+        ('quantity_ordered', 'int64'),
+        ('quantity_baked', 'int64'),
+        ('sale_price_total_cents', 'int64'),
+        ('ingredient_cost_cents', 'int64'),
+        ('packaging_cost_cents', 'int64'),
+        ('total_cost_cents', 'int64'),
+        ('profit_cents', 'int64')
+    ],
+    'cost-lines': [
+        ('order_id', 'int64'),
+        ('order_date', 'timestamp'),
+        ('item_type', 'string'),
+        ('item_id', 'int64'),
+        ('item_name', 'string'),
+        ('unit', 'string'),
+        ('amount_used', 'float64'),
+        ('cost_cents', 'int64')
+    ]
+}
+
+
+def _arrow_type(name):
+    if name == 'timestamp':
+        return pa.timestamp('us')
+    return getattr(pa, name)()
+
+
+def orders_export_select(start_date=None, end_date=None):
+    """
+    Build the select behind the orders export: one row per order, amounts in cents.
+
+    Args:
+        start_date (date): Optional start of the range
+        end_date (date): Optional end of the range (exclusive)
+
+    Returns:
+        Select: Rows matching PARQUET_COLUMNS['orders']
+    """
+    query = select(
+        Order.id,
+        Order.order_date,
+        Order.customer_id,
+        Customer.name,
+        Customer.customer_type,
+        Order.recipe_id,
+        Recipe.name,
+        Order.quantity_ordered,
+        Order.quantity_baked,
+        Order.sale_price_total_cents,
+        Order.ingredient_cost_cents,
+        Order.packaging_cost_cents,
+        Order.total_cost_cents,
+        Order.profit_cents
+    ).outerjoin(Customer, Customer.id == Order.customer_id) \
+     .outerjoin(Recipe, Recipe.id == Order.recipe_id)
+
+    return filter_order_dates(query, start_date, end_date).order_by(Order.order_date, Order.id)
+
+
+def cost_lines_export_select(start_date=None, end_date=None):
+    """
+    Build the select behind the cost lines export: one row per ingredient or
+    packaging line of each order.
+
+    Args:
+        start_date (date): Optional start of the range
+        end_date (date): Optional end of the range (exclusive)
+
+    Returns:
+        Select: Rows matching PARQUET_COLUMNS['cost-lines']
+    """
+    ingredient_lines = filter_order_dates(select(
+        OrderIngredient.order_id.label('order_id'),
+        Order.order_date,
+        literal('ingredient').label('item_type'),
+        OrderIngredient.ingredient_id.label('item_id'),
+        Ingredient.name,
+        Ingredient.default_unit,
+        OrderIngredient.amount_used,
+        OrderIngredient.cost_at_time_of_use_cents
+    ).join(Order, Order.id == OrderIngredient.order_id)
+     .join(Ingredient, Ingredient.id == OrderIngredient.ingredient_id), start_date, end_date)
+
+    packaging_lines = filter_order_dates(select(
+        OrderPackaging.order_id.label('order_id'),
+        Order.order_date,
+        literal('packaging').label('item_type'),
+        OrderPackaging.packaging_id.label('item_id'),
+        Packaging.name,
+        Packaging.default_unit,
+        OrderPackaging.quantity_used,
+        OrderPackaging.cost_at_time_of_use_cents
+    ).join(Order, Order.id == OrderPackaging.order_id)
+     .join(Packaging, Packaging.id == OrderPackaging.packaging_id), start_date, end_date)
+
+    lines = union_all(ingredient_lines, packaging_lines).subquery()
+    return select(lines).order_by(lines.c.order_id, lines.c.item_type, lines.c.item_id)
+
+
+def write_parquet(dataset, sink, start_date=None, end_date=None):
+    """
+    Write an export dataset as a Parquet file.
+
+    Rows are read from the cursor and written one record batch at a time, so
+    memory use does not grow with the number of orders.
+
+    Args:
+        dataset (str): 'orders' or 'cost-lines'
+        sink: Path or binary file object to write to
+        start_date (date): Optional start of the range
+        end_date (date): Optional end of the range (exclusive)
+
+    Returns:
+        int: Number of rows written
+    """
+    if dataset == 'orders':
+        query = orders_export_select(start_date, end_date)
+    else:
+        query = cost_lines_export_select(start_date, end_date)
+
+    schema = pa.schema([(name, _arrow_type(type_name)) for name, type_name in PARQUET_COLUMNS[dataset]])
+    result = db.session.execute(query.execution_options(yield_per=PARQUET_BATCH_SIZE))
+
+    row_count = 0
+    with pq.ParquetWriter(sink, schema) as writer:
+        for rows in result.partitions():
+            columns = list(zip(*rows))
+            writer.write_batch(pa.RecordBatch.from_arrays(
+                [pa.array(column, type=field.type) for column, field in zip(columns, schema)],
+                schema=schema
+            ))
+            row_count += len(rows)
+
+    return row_count
@@ -1,6 +1,7 @@
 from datetime import datetime
 from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy.sql import func
+from sqlalchemy.ext.hybrid import hybrid_property
+from sqlalchemy.sql import case, func
 
 db = SQLAlchemy()
 
@@ -101,6 +102,12 @@ class RecipeIngredient(db.Model):
 class Purchase(db.Model):
     """Model for ingredient and packaging purchases."""
     __tablename__ = 'purchases'
+    __table_args__ = (
+        # Latest price per item: seek by item, newest date first, price read from the index
+        db.Index('ix_purchases_item_date', 'item_type', 'item_id', 'purchase_date', 'unit_cost_cents'),
+        # Stock totals per item without touching the table
+        db.Index('ix_purchases_item_quantity', 'item_type', 'item_id', 'quantity'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     purchase_date = db.Column(db.Date, default=datetime.utcnow().date)
@@ -122,14 +129,83 @@ class Purchase(db.Model):
             self.unit_cost_cents = int((self.total_cost_cents / self.quantity) * 1000)
 
 
+class CurrentItemPrice(db.Model):
+    """Latest non-zero purchase price per item, maintained from purchases."""
+    __tablename__ = 'current_item_prices'
+    
+    item_type = db.Column(db.String(10), db.CheckConstraint("item_type IN ('ingredient', 'packaging')"), primary_key=True)
+    item_id = db.Column(db.Integer, primary_key=True)
+    unit_cost_cents = db.Column(db.Integer, nullable=False)  # Stored as millicents, like Purchase.unit_cost_cents
+    purchase_id = db.Column(db.Integer, db.ForeignKey('purchases.id', ondelete='CASCADE'), nullable=False)
+    purchase_date = db.Column(db.Date)
+    
+    def __repr__(self):
+        return f'<CurrentItemPrice {self.item_type}:{self.item_id}>'
+
+
+class InventoryBalance(db.Model):
+    """Running stock level per item, maintained from purchases and order usage."""
+    __tablename__ = 'inventory_balances'
+    
+    item_type = db.Column(db.String(10), db.CheckConstraint("item_type IN ('ingredient', 'packaging')"), primary_key=True)
+    item_id = db.Column(db.Integer, primary_key=True)
+    quantity = db.Column(db.Float, nullable=False, default=0)  # in the item's default unit
+    
+    def __repr__(self):
+        return f'<InventoryBalance {self.item_type}:{self.item_id} = {self.quantity}>'
+
+
+class DailySalesRollup(db.Model):
+    """Sales totals per day, customer type and recipe, maintained from orders."""
+    __tablename__ = 'daily_sales_rollup'
+    
+    sale_date = db.Column(db.Date, primary_key=True)
+    customer_type = db.Column(db.String(10), primary_key=True, default='')  # '' for orders without a customer
+    recipe_id = db.Column(db.Integer, primary_key=True, default=0)  # 0 for custom orders
+    revenue_cents = db.Column(db.Integer, nullable=False, default=0)
+    ingredient_cost_cents = db.Column(db.Integer, nullable=False, default=0)
+    packaging_cost_cents = db.Column(db.Integer, nullable=False, default=0)
+    cookies_baked = db.Column(db.Integer, nullable=False, default=0)
+    order_count = db.Column(db.Integer, nullable=False, default=0)
+    
+    def __repr__(self):
+        return f'<DailySalesRollup {self.sale_date} {self.customer_type or "-"}:{self.recipe_id}>'
+
+
+class CacheVersion(db.Model):
+    """Single-row counter bumped by every committed write, shared by all workers."""
+    __tablename__ = 'cache_version'
+    
+    id = db.Column(db.Integer, primary_key=True)  # always 1
+    version = db.Column(db.Integer, nullable=False, default=0)
+    
+    def __repr__(self):
+        return f'<CacheVersion {self.version}>'
+
+
+class DashboardEvent(db.Model):
+    """Change pushed to open dashboards, written in the transaction that made it."""
+    __tablename__ = 'dashboard_events'
+    # Never reuse IDs of pruned events; clients resume from the last ID they saw
+    __table_args__ = {'sqlite_autoincrement': True}
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)  # stream position
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
+    kind = db.Column(db.String(20), nullable=False)  # 'order', 'revenue' or 'low-stock'
+    payload = db.Column(db.Text, nullable=False)  # JSON
+
+    def __repr__(self):
+        return f'<DashboardEvent {self.id} {self.kind}>'
+
+
 class Order(db.Model):
     """Model for cookie orders."""
     __tablename__ = 'orders'
     
     id = db.Column(db.Integer, primary_key=True)
-    customer_id = db.Column(db.Integer, db.ForeignKey('customers.id'))
-    recipe_id = db.Column(db.Integer, db.ForeignKey('recipes.id'))  # optional template
-    order_date = db.Column(db.DateTime, default=datetime.utcnow)
+    customer_id = db.Column(db.Integer, db.ForeignKey('customers.id'), index=True)
+    recipe_id = db.Column(db.Integer, db.ForeignKey('recipes.id'), index=True)  # optional template
+    order_date = db.Column(db.DateTime, default=datetime.utcnow, index=True)
     cookie_size = db.Column(db.String(10), db.CheckConstraint("cookie_size IN ('mini', 'regular', 'large')"))
     dough_weight_g = db.Column(db.Float, nullable=False)
     quantity_ordered = db.Column(db.Integer, nullable=False)
@@ -138,6 +214,14 @@ class Order(db.Model):
     sale_price_total_cents = db.Column(db.Integer, nullable=False)
     notes = db.Column(db.Text)
     
+    # Cost totals summed from the order's cost snapshots, kept up to date by
+    # cost_helpers.refresh_order_totals after each flush. Read them through the
+    # properties below, which sum the lines in Python until the order is flushed.
+    _ingredient_cost_cents = db.Column('ingredient_cost_cents', db.Integer, nullable=False, default=0, server_default='0')
+    _packaging_cost_cents = db.Column('packaging_cost_cents', db.Integer, nullable=False, default=0, server_default='0')
+    _total_cost_cents = db.Column('total_cost_cents', db.Integer, nullable=False, default=0, server_default='0')
+    _profit_cents = db.Column('profit_cents', db.Integer, nullable=False, default=0, server_default='0')
+    
     # Relationships
     customer = db.relationship('Customer', back_populates='orders')
     recipe = db.relationship('Recipe', back_populates='orders')
@@ -148,37 +232,72 @@ class Order(db.Model):
     def __repr__(self):
         return f'<Order {self.id} - {self.customer.name if self.customer else "Unknown"}>'
     
-    @property
+    @hybrid_property
     def ingredient_cost_cents(self):
-        """Calculate total ingredient cost for this order."""
-        return sum(oi.cost_at_time_of_use_cents for oi in self.ingredients)
+        """Total ingredient cost for this order, summed from its lines until it is flushed."""
+        if self._ingredient_cost_cents is None:
+            return sum(oi.cost_at_time_of_use_cents for oi in self.ingredients)
+        return self._ingredient_cost_cents
     
-    @property
+    @ingredient_cost_cents.expression
+    def ingredient_cost_cents(cls):
+        return cls._ingredient_cost_cents
+    
+    @hybrid_property
     def packaging_cost_cents(self):
-        """Calculate total packaging cost for this order."""
-        return sum(op.cost_at_time_of_use_cents for op in self.packaging)
+        """Total packaging cost for this order, summed from its lines until it is flushed."""
+        if self._packaging_cost_cents is None:
+            return sum(op.cost_at_time_of_use_cents for op in self.packaging)
+        return self._packaging_cost_cents
+    
+    @packaging_cost_cents.expression
+    def packaging_cost_cents(cls):
+        return cls._packaging_cost_cents
     
-    @property
+    @hybrid_property
     def total_cost_cents(self):
-        """Calculate total cost for this order."""
-        return self.ingredient_cost_cents + self.packaging_cost_cents
+        """Total cost for this order."""
+        if self._total_cost_cents is None:
+            return self.ingredient_cost_cents + self.packaging_cost_cents
+        return self._total_cost_cents
     
-    @property
+    @total_cost_cents.expression
+    def total_cost_cents(cls):
+        return cls._total_cost_cents
+    
+    @hybrid_property
     def profit_cents(self):
-        """Calculate profit for this order."""
-        return self.sale_price_total_cents - self.total_cost_cents
+        """Profit for this order."""
+        if self._profit_cents is None:
+            return self.sale_price_total_cents - self.total_cost_cents
+        return self._profit_cents
+    
+    @profit_cents.expression
+    def profit_cents(cls):
+        return cls._profit_cents
     
-    @property
+    @hybrid_property
     def profit_margin(self):
-        """Calculate profit margin percentage for this order."""
+        """Profit margin percentage for this order."""
         if self.sale_price_total_cents == 0:
             return 0
         return (self.profit_cents / self.sale_price_total_cents) * 100
+    
+    @profit_margin.expression
+    def profit_margin(cls):
+        return case(
+            (cls.sale_price_total_cents == 0, 0),
+            else_=cls._profit_cents * 100.0 / cls.sale_price_total_cents
+        )
 
 
 class OrderIngredient(db.Model):
     """Model for ingredients used in an order with cost snapshot."""
     __tablename__ = 'order_ingredients'
+    __table_args__ = (
+        # Usage totals per ingredient (the primary key leads with order_id)
+        db.Index('ix_order_ingredients_ingredient_amount', 'ingredient_id', 'amount_used'),
+    )
     
     order_id = db.Column(db.Integer, db.ForeignKey('orders.id', ondelete='CASCADE'), primary_key=True)
     ingredient_id = db.Column(db.Integer, db.ForeignKey('ingredients.id'), primary_key=True)
@@ -196,6 +315,10 @@ class OrderIngredient(db.Model):
 class OrderPackaging(db.Model):
     """Model for packaging used in an order with cost snapshot."""
     __tablename__ = 'order_packaging'
+    __table_args__ = (
+        # Usage totals per packaging item (the primary key leads with order_id)
+        db.Index('ix_order_packaging_packaging_quantity', 'packaging_id', 'quantity_used'),
+    )
     
     order_id = db.Column(db.Integer, db.ForeignKey('orders.id', ondelete='CASCADE'), primary_key=True)
     packaging_id = db.Column(db.Integer, db.ForeignKey('packaging.id'), primary_key=True)
@@ -0,0 +1,100 @@
+from datetime import datetime
+from sqlalchemy import select, tuple_
+from models import db, Customer, Recipe, Order
+from report_helpers import filter_order_dates
+
+# Orders listed per page
+ORDER_PAGE_SIZE = 50
+
+
+def format_order_key(key):
+    """Encode an (order_date, id) page key for a query string."""
+    if key is None:
+        return None
+    order_date, order_id = key
+    return f"{order_date.isoformat()}_{order_id}"
+
+
+def parse_order_key(value):
+    """Decode an (order_date, id) page key from a query string, ignoring malformed values."""
+    if not value:
+        return None
+    try:
+        order_date, order_id = value.rsplit('_', 1)
+        return datetime.fromisoformat(order_date), int(order_id)
+    except ValueError:
+        return None
+
+
+def order_list_select(customer_id=None, recipe_id=None, start_date=None, end_date=None):
+    """
+    Build the select behind the orders list: one row per order with its
+    customer and recipe names and stored cost totals, newest first.
+
+    Args:
+        customer_id (int): Optional customer to restrict to
+        recipe_id (int): Optional recipe to restrict to; 0 for custom orders
+        start_date (date): Optional start of the range
+        end_date (date): Optional end of the range (exclusive)
+
+    Returns:
+        Select: Order columns plus customer_name and recipe_name
+    """
+    query = select(
+        Order.id,
+        Order.order_date,
+        Customer.name.label('customer_name'),
+        Recipe.name.label('recipe_name'),
+        Order.quantity_baked,
+        Order.sale_price_total_cents,
+        Order.total_cost_cents,
+        Order.profit_cents
+    ).outerjoin(Customer, Customer.id == Order.customer_id) \
+     .outerjoin(Recipe, Recipe.id == Order.recipe_id)
+
+    if customer_id is not None:
+        query = query.where(Order.customer_id == customer_id)
+    if recipe_id == 0:
+        query = query.where(Order.recipe_id.is_(None))
+    elif recipe_id is not None:
+        query = query.where(Order.recipe_id == recipe_id)
+
+    query = filter_order_dates(query, start_date, end_date)
+    return query.order_by(Order.order_date.desc(), Order.id.desc())
+
+
+def get_order_page(customer_id=None, recipe_id=None, start_date=None, end_date=None, after=None,
+                   limit=ORDER_PAGE_SIZE):
+    """
+    Get one page of the orders list, newest first.
+
+    Pages are keyed on (order_date, id) rather than an offset, so each page
+    costs the same however far back it is. Costs are the totals stored on
+    each order, so no order lines are loaded.
+
+    Args:
+        customer_id (int): Optional customer to restrict to
+        recipe_id (int): Optional recipe to restrict to; 0 for custom orders
+        start_date (date): Optional start of the range
+        end_date (date): Optional end of the range (exclusive)
+        after (tuple): Optional (order_date, id) of the last row of the previous page
+        limit (int): Maximum rows per page
+
+    Returns:
+        tuple: (rows, next_key) where rows are result rows of
+            order_list_select and next_key is the (order_date, id) to pass
+            as after for the next page, or None on the last page
+    """
+    query = order_list_select(customer_id, recipe_id, start_date, end_date)
+    if after:
+        query = query.where(tuple_(Order.order_date, Order.id) < tuple_(*after))
+
+    # Fetch one extra row to tell whether another page follows
+    rows = db.session.execute(query.limit(limit + 1)).all()
+
+    next_key = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_key = (rows[-1].order_date, rows[-1].id)
+
+    return rows, next_key
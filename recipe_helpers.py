@@ -0,0 +1,128 @@
+from flask import current_app
+from sqlalchemy.orm import selectinload
+from models import db, Recipe, RecipeIngredient, Ingredient, Purchase, CurrentItemPrice
+from cost_helpers import get_latest_unit_costs, millicents_to_cents
+from cache_helpers import LRUCache, MISSING, register_session_invalidation
+
+# Cached costings keyed by recipe ID. Cleared through the session invalidation
+# registered at the bottom of this module when recipes or prices change.
+RECIPE_COST_CACHE_SIZE = 512
+recipe_cost_cache = LRUCache(maxsize=RECIPE_COST_CACHE_SIZE)
+
+
+def recipe_cost_cache_enabled():
+    """Check whether recipe costings are cached for the current app."""
+    return current_app.config.get('RECIPE_COST_CACHE_ENABLED', True)
+
+
+def _cost_recipes(recipes):
+    """
+    Compute costings for recipes, pricing all their ingredients in one batch.
+
+    Args:
+        recipes (list): Recipe objects with ingredients loaded
+
+    Returns:
+        dict: Maps recipe ID to its costing dict
+    """
+    ingredient_ids = {ri.ingredient_id for recipe in recipes for ri in recipe.ingredients}
+    prices = get_latest_unit_costs('ingredient', ingredient_ids)
+
+    costings = {}
+    for recipe in recipes:
+        batch_cost_cents = 0
+        unpriced_ingredient_ids = []
+        for ri in recipe.ingredients:
+            unit_cost_millicents = prices.get(ri.ingredient_id)
+            if unit_cost_millicents is None:
+                unpriced_ingredient_ids.append(ri.ingredient_id)
+                continue
+            batch_cost_cents += millicents_to_cents(unit_cost_millicents, ri.quantity)
+
+        # Batch dough weight comes from the recipe's per-cookie weight and yield
+        batch_dough_weight_g = None
+        if recipe.yield_cookies and recipe.dough_weight_per_cookie_g:
+            batch_dough_weight_g = recipe.dough_weight_per_cookie_g * recipe.yield_cookies
+
+        costings[recipe.id] = {
+            'recipe_id': recipe.id,
+            'name': recipe.name,
+            'batch_cost_cents': batch_cost_cents,
+            'batch_dough_weight_g': batch_dough_weight_g,
+            'cost_per_gram_millicents': (
+                round(batch_cost_cents * 1000 / batch_dough_weight_g) if batch_dough_weight_g else None
+            ),
+            'yield_cookies': recipe.yield_cookies,
+            'cost_per_cookie_cents': (
+                round(batch_cost_cents / recipe.yield_cookies) if recipe.yield_cookies else None
+            ),
+            'unpriced_ingredient_ids': unpriced_ingredient_ids
+        }
+
+    return costings
+
+
+def get_recipe_costs(recipe_ids=None):
+    """
+    Get costings for many recipes.
+
+    Each costing holds the batch cost, cost per gram of dough and cost per
+    cookie at current prices. Cached costings are reused when enabled; the
+    rest are computed together.
+
+    Args:
+        recipe_ids (iterable): Optional recipe IDs. Defaults to all recipes.
+
+    Returns:
+        dict: Maps recipe ID to a dict with recipe_id, name, batch_cost_cents,
+            batch_dough_weight_g, cost_per_gram_millicents, yield_cookies,
+            cost_per_cookie_cents and unpriced_ingredient_ids
+    """
+    if recipe_ids is None:
+        recipe_ids = [recipe_id for recipe_id, in db.session.query(Recipe.id)]
+    recipe_ids = set(recipe_ids)
+
+    use_cache = recipe_cost_cache_enabled()
+    # Taken before the lookups, so costings invalidated mid-query aren't cached
+    generation = recipe_cost_cache.generation
+    costings = {}
+    uncached_ids = set()
+    for recipe_id in recipe_ids:
+        costing = recipe_cost_cache.get(recipe_id) if use_cache else MISSING
+        if costing is MISSING:
+            uncached_ids.add(recipe_id)
+        else:
+            costings[recipe_id] = costing
+
+    if uncached_ids:
+        recipes = Recipe.query.options(
+            selectinload(Recipe.ingredients)
+        ).filter(Recipe.id.in_(uncached_ids)).all()
+        computed = _cost_recipes(recipes)
+        if use_cache:
+            for recipe_id, costing in computed.items():
+                recipe_cost_cache.set(recipe_id, costing, generation)
+        costings.update(computed)
+
+    return costings
+
+
+def get_recipe_cost(recipe_id):
+    """
+    Get the costing for a single recipe.
+
+    Args:
+        recipe_id (int): ID of the recipe
+
+    Returns:
+        dict: Costing dict as returned by get_recipe_costs, or None if the
+            recipe does not exist
+    """
+    return get_recipe_costs([recipe_id]).get(recipe_id)
+
+
+# Costings read recipes, their ingredient lists and ingredient prices
+register_session_invalidation(
+    recipe_cost_cache.invalidate_all,
+    lambda model: model in (Recipe, RecipeIngredient, Ingredient, Purchase, CurrentItemPrice)
+)
@@ -0,0 +1,619 @@
+import csv
+import io
+import threading
+from datetime import date, datetime, timedelta
+from flask import current_app
+from sqlalchemy import desc, func, literal, null, select, tuple_, union_all
+from models import db, Order, OrderIngredient, OrderPackaging, Ingredient, Packaging, Customer, Recipe, Purchase, DailySalesRollup
+from cache_helpers import LRUCache, MISSING, register_session_invalidation
+from rollup_helpers import get_first_sale_date
+
+# SQLite strftime formats for each trend bucket
+TREND_BUCKETS = {
+    'month': '%Y-%m',
+    'week': '%Y-%W',
+    'day': '%Y-%m-%d'
+}
+
+# Orders shown per page of the profit report
+PROFIT_PAGE_SIZE = 50
+
+# Report periods computed ahead of time by the scheduler
+REPORT_WARM_PERIODS = ('all', 'year', 'month', '3months', '6months')
+
+# Default trend bucket per period; other periods are bucketed by week
+TREND_PERIOD_BUCKETS = {
+    'year': 'month',
+    'month': 'day',
+    'all': 'month'
+}
+
+# Report results keyed by (endpoint, normalized args, data version). The data
+# version is bumped by the session invalidation at the bottom of this module, so
+# entries computed before a write are never read again and age out of the LRU.
+REPORT_CACHE_SIZE = 256
+report_cache = LRUCache(maxsize=REPORT_CACHE_SIZE)
+
+_data_version = 0
+_data_version_lock = threading.Lock()
+
+
+def report_cache_enabled():
+    """Check whether report caches are enabled for the current app."""
+    return current_app.config.get('REPORT_CACHE_ENABLED', True)
+
+
+def get_report_window(period, today=None):
+    """
+    Get the order date range for a report period.
+
+    Args:
+        period (str): 'month', '3months', '6months', 'year', or anything else for all time
+        today (date): Optional reference date. Defaults to today.
+
+    Returns:
+        tuple: Half-open (start_date, end_date) range, both None for all time
+    """
+    if period not in ('month', '3months', '6months', 'year'):
+        return None, None
+
+    today = today or datetime.now().date()
+    end_date = today + timedelta(days=1)  # Include today
+
+    if period == 'month':
+        start_date = today.replace(day=1)
+    elif period == '3months':
+        start_date = (today - timedelta(days=90))
+    elif period == '6months':
+        start_date = (today - timedelta(days=180))
+    else:
+        start_date = today.replace(month=1, day=1)
+
+    return start_date, end_date
+
+
+def parse_report_dates(start, end):
+    """
+    Parse the start and end of a custom report range.
+
+    Args:
+        start (str): Optional first day, as YYYY-MM-DD
+        end (str): Optional day after the last day, as YYYY-MM-DD
+
+    Returns:
+        tuple: Half-open (start_date, end_date) range; either may be None
+
+    Raises:
+        ValueError: If a date is malformed or the range is empty
+    """
+    start_date = date.fromisoformat(start) if start else None
+    end_date = date.fromisoformat(end) if end else None
+    if start_date and end_date and start_date >= end_date:
+        raise ValueError('start must be before end')
+    return start_date, end_date
+
+
+# Entries in each top list of the reports index
+TOP_LIST_SIZE = 5
+
+
+def _report_summary_select():
+    """
+    Build the single statement behind the reports index.
+
+    Three CTEs -- all-time totals and top recipes from the daily sales
+    rollup, top customers from the orders -- are combined with UNION ALL into
+    rows tagged by kind.
+    """
+    rollup = DailySalesRollup
+    totals = select(
+        func.coalesce(func.sum(rollup.order_count), 0).label('order_count'),
+        func.coalesce(func.sum(rollup.revenue_cents), 0).label('revenue'),
+        func.coalesce(func.sum(rollup.ingredient_cost_cents), 0).label('ingredient_cost'),
+        func.coalesce(func.sum(rollup.packaging_cost_cents), 0).label('packaging_cost'),
+        func.coalesce(func.sum(rollup.cookies_baked), 0).label('cookies')
+    ).cte('totals')
+
+    customer_revenue = func.sum(Order.sale_price_total_cents)
+    top_customers = select(
+        Customer.name.label('name'),
+        func.count(Order.id).label('order_count'),
+        customer_revenue.label('revenue')
+    ).join(Order, Order.customer_id == Customer.id) \
+     .group_by(Customer.id).order_by(customer_revenue.desc()).limit(TOP_LIST_SIZE) \
+     .cte('top_customers')
+
+    # Custom orders are kept in the rollup under recipe_id 0
+    recipe_orders = func.sum(rollup.order_count)
+    top_recipes = select(
+        func.coalesce(Recipe.name, 'Custom').label('name'),
+        recipe_orders.label('order_count')
+    ).outerjoin(Recipe, Recipe.id == rollup.recipe_id) \
+     .group_by(rollup.recipe_id).order_by(recipe_orders.desc()).limit(TOP_LIST_SIZE) \
+     .cte('top_recipes')
+
+    return union_all(
+        select(
+            literal('totals').label('kind'), literal(None).label('name'), totals.c.order_count,
+            totals.c.revenue, totals.c.ingredient_cost, totals.c.packaging_cost, totals.c.cookies
+        ),
+        select(
+            literal('customer'), top_customers.c.name, top_customers.c.order_count,
+            top_customers.c.revenue, null(), null(), null()
+        ),
+        select(
+            literal('recipe'), top_recipes.c.name, top_recipes.c.order_count,
+            null(), null(), null(), null()
+        )
+    )
+
+
+def _query_report_summary():
+    rows = db.session.execute(_report_summary_select()).all()
+    totals = next(row for row in rows if row.kind == 'totals')
+
+    total_cost_cents = totals.ingredient_cost + totals.packaging_cost
+    total_profit_cents = totals.revenue - total_cost_cents
+
+    # Calculate profit margin percentage
+    profit_margin = 0
+    if totals.revenue > 0:
+        profit_margin = (total_profit_cents / totals.revenue) * 100
+
+    # UNION ALL does not keep each part's order, so sort the lists here
+    top_customers = sorted(
+        (row for row in rows if row.kind == 'customer'), key=lambda row: row.revenue, reverse=True
+    )
+    top_recipes = sorted(
+        (row for row in rows if row.kind == 'recipe'), key=lambda row: row.order_count, reverse=True
+    )
+
+    return {
+        'orders_count': totals.order_count,
+        'total_revenue_cents': totals.revenue,
+        'total_cost_cents': total_cost_cents,
+        'total_profit_cents': total_profit_cents,
+        'profit_margin': profit_margin,
+        'total_cookies': totals.cookies,
+        'top_customers': top_customers,
+        'top_recipes': top_recipes
+    }
+
+
+def get_report_summary():
+    """
+    Get the all-time summary metrics and top lists for the reports index.
+
+    Everything comes from one statement, cached on the data version.
+
+    Returns:
+        dict: orders_count, total_revenue_cents, total_cost_cents,
+            total_profit_cents, profit_margin, total_cookies, top_customers
+            (name, order_count, revenue) and top_recipes (name, order_count),
+            where custom orders count as a recipe named 'Custom'
+    """
+    return cached_report('index', {}, _query_report_summary)
+
+
+def filter_order_dates(query, start_date, end_date):
+    """
+    Restrict a query joined to orders to a half-open [start_date, end_date) range.
+
+    Either bound may be None to leave that side open. Both are plain
+    comparisons on order_date, so they run as a range scan of its index.
+    """
+    if start_date is not None:
+        query = query.where(Order.order_date >= start_date)
+    if end_date is not None:
+        query = query.where(Order.order_date < end_date)
+    return query
+
+
+def get_item_usage_select(item_type, start_date=None, end_date=None):
+    """
+    Build a select of per-item usage and cost over a date range.
+
+    Args:
+        item_type (str): 'ingredient' or 'packaging'
+        start_date (date): Optional start of the range
+        end_date (date): Optional end of the range (exclusive)
+
+    Returns:
+        Select: Rows of (id, name, default_unit, amount_used or quantity_used,
+            total_cost), most expensive first
+    """
+    if item_type == 'ingredient':
+        model, line, item_id, amount = Ingredient, OrderIngredient, OrderIngredient.ingredient_id, OrderIngredient.amount_used
+        amount_label = 'amount_used'
+    else:
+        model, line, item_id, amount = Packaging, OrderPackaging, OrderPackaging.packaging_id, OrderPackaging.quantity_used
+        amount_label = 'quantity_used'
+
+    query = select(
+        model.id,
+        model.name,
+        model.default_unit,
+        func.sum(amount).label(amount_label),
+        func.sum(line.cost_at_time_of_use_cents).label('total_cost')
+    ).join(line, item_id == model.id).join(Order, Order.id == line.order_id)
+
+    query = filter_order_dates(query, start_date, end_date)
+    return query.group_by(model.id).order_by(desc('total_cost'))
+
+
+def get_profit_totals(start_date=None, end_date=None):
+    """
+    Get revenue and cost totals for orders in a date range.
+
+    Args:
+        start_date (date): Optional start of the range
+        end_date (date): Optional end of the range (exclusive)
+
+    Returns:
+        dict: order_count, revenue, ingredient_cost, packaging_cost, total_cost,
+            profit (all in cents) and profit_margin (percent)
+    """
+    row = db.session.execute(filter_order_dates(select(
+        func.count(Order.id).label('order_count'),
+        func.coalesce(func.sum(Order.sale_price_total_cents), 0).label('revenue'),
+        func.coalesce(func.sum(Order.ingredient_cost_cents), 0).label('ingredient_cost'),
+        func.coalesce(func.sum(Order.packaging_cost_cents), 0).label('packaging_cost')
+    ), start_date, end_date)).one()
+
+    total_cost = row.ingredient_cost + row.packaging_cost
+    profit = row.revenue - total_cost
+    return {
+        'order_count': row.order_count,
+        'revenue': row.revenue,
+        'ingredient_cost': row.ingredient_cost,
+        'packaging_cost': row.packaging_cost,
+        'total_cost': total_cost,
+        'profit': profit,
+        'profit_margin': (profit / row.revenue) * 100 if row.revenue > 0 else 0
+    }
+
+
+def get_profit_page(start_date=None, end_date=None, after=None, limit=PROFIT_PAGE_SIZE):
+    """
+    Get one page of per-order profit rows, newest first.
+
+    Pages are keyed on (order_date, id) rather than an offset, so each page
+    costs the same however far back it is.
+
+    Args:
+        start_date (date): Optional start of the range
+        end_date (date): Optional end of the range (exclusive)
+        after (tuple): Optional (order_date, id) of the last row of the previous page
+        limit (int): Maximum rows per page
+
+    Returns:
+        tuple: (rows, next_key) where rows is a list of dicts and next_key is
+            the (order_date, id) to pass as after for the next page, or None
+            on the last page
+    """
+    query = select(
+        Order.id,
+        Order.order_date,
+        Customer.name.label('customer_name'),
+        Customer.customer_type,
+        Recipe.name.label('recipe_name'),
+        Order.quantity_baked,
+        Order.sale_price_total_cents,
+        Order.ingredient_cost_cents,
+        Order.packaging_cost_cents,
+        Order.total_cost_cents,
+        Order.profit_cents
+    ).outerjoin(Customer, Customer.id == Order.customer_id) \
+     .outerjoin(Recipe, Recipe.id == Order.recipe_id)
+
+    query = filter_order_dates(query, start_date, end_date)
+    if after:
+        query = query.where(tuple_(Order.order_date, Order.id) < tuple_(*after))
+
+    # Fetch one extra row to tell whether another page follows
+    results = db.session.execute(
+        query.order_by(Order.order_date.desc(), Order.id.desc()).limit(limit + 1)
+    ).all()
+
+    rows = []
+    for row in results[:limit]:
+        rows.append({
+            'id': row.id,
+            'date': row.order_date,
+            'customer': {'name': row.customer_name, 'customer_type': row.customer_type} if row.customer_name else None,
+            'recipe': row.recipe_name or 'Custom',
+            'quantity': row.quantity_baked,
+            'revenue_cents': row.sale_price_total_cents,
+            'ingredient_cost_cents': row.ingredient_cost_cents,
+            'packaging_cost_cents': row.packaging_cost_cents,
+            'total_cost_cents': row.total_cost_cents,
+            'profit_cents': row.profit_cents,
+            'profit_margin': (
+                (row.profit_cents / row.sale_price_total_cents) * 100 if row.sale_price_total_cents > 0 else 0
+            )
+        })
+
+    next_key = None
+    if len(results) > limit:
+        next_key = (rows[-1]['date'], rows[-1]['id'])
+    return rows, next_key
+
+
+def get_profit_report(start_date=None, end_date=None, after=None):
+    """
+    Get the cached totals and one page of orders for the profit report.
+
+    Args:
+        start_date (date): Optional start of the range
+        end_date (date): Optional end of the range (exclusive)
+        after (tuple): Optional page key, see get_profit_page
+
+    Returns:
+        tuple: (totals, rows, next_key) as returned by get_profit_totals and
+            get_profit_page
+    """
+    def compute():
+        return (get_profit_totals(start_date, end_date),) + get_profit_page(start_date, end_date, after=after)
+
+    return cached_report('profit', {'start': start_date, 'end': end_date, 'after': after}, compute)
+
+
+def get_inventory_report(start_date=None, end_date=None):
+    """
+    Get cached ingredient and packaging usage for the inventory report.
+
+    Args:
+        start_date (date): Optional start of the range
+        end_date (date): Optional end of the range (exclusive)
+
+    Returns:
+        tuple: (ingredients, packaging) lists of rows from get_item_usage_select
+    """
+    def compute():
+        return (
+            db.session.execute(get_item_usage_select('ingredient', start_date, end_date)).all(),
+            db.session.execute(get_item_usage_select('packaging', start_date, end_date)).all()
+        )
+
+    return cached_report('inventory', {'start': start_date, 'end': end_date}, compute)
+
+
+def warm_report_caches(periods=REPORT_WARM_PERIODS):
+    """
+    Compute and cache the reports index and the standard profit, inventory
+    and trend report variants.
+
+    Args:
+        periods (iterable): Periods to warm. Defaults to REPORT_WARM_PERIODS.
+
+    Returns:
+        int: Number of report variants warmed
+    """
+    get_report_summary()
+    count = 1
+    for period in periods:
+        start_date, end_date = get_report_window(period)
+        get_profit_report(start_date, end_date)
+        get_inventory_report(start_date, end_date)
+        get_trend_data(period)
+        count += 3
+    return count
+
+
+def iter_csv(rows):
+    """
+    Encode rows as CSV text one line at a time, for streaming responses.
+
+    Args:
+        rows (iterable): Lists of cell values
+
+    Yields:
+        str: One CSV line per row
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow(row)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate(0)
+
+
+def get_data_version():
+    """Get the current report data version."""
+    return _data_version
+
+
+def bump_data_version():
+    """
+    Mark all cached report results as stale.
+
+    Returns:
+        int: The new data version
+    """
+    global _data_version
+    with _data_version_lock:
+        _data_version += 1
+        return _data_version
+
+
+def cached_report(endpoint, args, compute):
+    """
+    Get a report result from the cache, computing and storing it on a miss.
+
+    Args:
+        endpoint (str): Name of the report
+        args (dict): Normalized arguments the result depends on, with defaults
+            filled in so equivalent requests share an entry
+        compute (callable): Computes the result when it is not cached
+
+    Returns:
+        The cached or freshly computed result
+    """
+    if not report_cache_enabled():
+        return compute()
+
+    key = (endpoint, tuple(sorted(args.items())), get_data_version())
+    result = report_cache.get(key)
+    if result is MISSING:
+        result = compute()
+        report_cache.set(key, result)
+    return result
+
+
+def get_report_cache_stats():
+    """
+    Get report cache statistics.
+
+    Returns:
+        dict: LRU stats (size, maxsize, hits, misses, hit_rate) plus the
+            current data_version
+    """
+    return dict(report_cache.stats(), data_version=get_data_version())
+
+
+def get_trend_window(period, today=None, start_date=None, end_date=None):
+    """
+    Get the date range and default bucket for a trend period.
+
+    Args:
+        period (str): 'month', 'year', 'all', '6months', or anything else
+            (e.g. 'quarter' or '3months') for the last 90 days
+        today (date): Optional reference date. Defaults to today.
+        start_date (date): Optional start of a custom range, used instead of
+            the period. Defaults to the first sale.
+        end_date (date): Optional end of a custom range (exclusive). Defaults
+            to tomorrow.
+
+    Returns:
+        tuple: (start_date, end_date, bucket) where end_date is exclusive
+    """
+    today = today or datetime.now().date()
+    if start_date or end_date:
+        start_date = start_date or get_first_sale_date() or today
+        end_date = end_date or today + timedelta(days=1)
+        days = (end_date - start_date).days
+        if days <= 62:
+            bucket = 'day'
+        elif days <= 366:
+            bucket = 'week'
+        else:
+            bucket = 'month'
+        return start_date, end_date, bucket
+
+    if period == 'year':
+        start_date = today.replace(month=1, day=1)
+    elif period == 'month':
+        start_date = today.replace(day=1)
+    elif period == 'all':
+        # Use the date of the first order
+        first_sale_date = get_first_sale_date()
+        if first_sale_date:
+            start_date = first_sale_date
+        else:
+            start_date = today.replace(month=1, day=1)
+    elif period == '6months':
+        start_date = today - timedelta(days=180)
+    else:
+        start_date = today - timedelta(days=90)
+
+    bucket = TREND_PERIOD_BUCKETS.get(period, 'week')
+    return start_date, today + timedelta(days=1), bucket
+
+
+def _query_trend_rows(start_date, end_date, bucket):
+    bucket_key = func.strftime(TREND_BUCKETS[bucket], DailySalesRollup.sale_date).label('period')
+
+    # Read the daily rollup rather than the orders: at most a few hundred
+    # rows per period, whatever the order volume
+    rows = db.session.execute(
+        select(
+            bucket_key,
+            func.sum(DailySalesRollup.revenue_cents).label('revenue'),
+            func.sum(DailySalesRollup.ingredient_cost_cents).label('ingredient_cost'),
+            func.sum(DailySalesRollup.packaging_cost_cents).label('packaging_cost'),
+            func.sum(DailySalesRollup.cookies_baked).label('cookies'),
+            func.sum(DailySalesRollup.order_count).label('order_count')
+        ).where(
+            DailySalesRollup.sale_date >= start_date, DailySalesRollup.sale_date < end_date
+        ).group_by(bucket_key).order_by(bucket_key)
+    )
+
+    trend_rows = []
+    for row in rows:
+        revenue = row.revenue or 0
+        total_cost = (row.ingredient_cost or 0) + (row.packaging_cost or 0)
+        trend_rows.append({
+            'period': row.period,
+            'revenue': revenue,
+            'ingredient_cost': row.ingredient_cost or 0,
+            'packaging_cost': row.packaging_cost or 0,
+            'total_cost': total_cost,
+            'profit': revenue - total_cost,
+            'cookies': row.cookies or 0,
+            'order_count': row.order_count
+        })
+    return trend_rows
+
+
+def get_trend_data(period, bucket=None, start_date=None, end_date=None):
+    """
+    Get revenue, cost, profit and cookie totals per time bucket.
+
+    All metrics come from a single grouped query over the daily sales
+    rollup, cached per (period, range, bucket) for the current day.
+
+    Args:
+        period (str): Trend period, see get_trend_window
+        bucket (str): Optional bucket from TREND_BUCKETS. Defaults to the
+            period's own bucket.
+        start_date (date): Optional start of a custom range
+        end_date (date): Optional end of a custom range (exclusive)
+
+    Returns:
+        tuple: (rows, bucket) where rows is a list of dicts with period, revenue,
+            ingredient_cost, packaging_cost, total_cost, profit, cookies and
+            order_count, in cents and ordered by period
+    """
+    today = datetime.now().date()
+    window_start, window_end, default_bucket = get_trend_window(period, today, start_date, end_date)
+    if bucket not in TREND_BUCKETS:
+        bucket = default_bucket
+
+    rows = cached_report(
+        'trends',
+        {'start': window_start, 'end': window_end, 'bucket': bucket},
+        lambda: _query_trend_rows(window_start, window_end, bucket)
+    )
+    return rows, bucket
+
+
+def format_trend_period(period_key, bucket, short=False):
+    """
+    Format a trend bucket key for display.
+
+    Args:
+        period_key (str): Bucket key as returned by get_trend_data
+        bucket (str): Bucket the key belongs to
+        short (bool): Drop the year from daily labels, for chart axes
+
+    Returns:
+        str: Display label, e.g. 'Mar 2024', 'Week 09, 2024' or 'Mar 05, 2024'
+    """
+    if bucket == 'month':
+        return datetime.strptime(period_key, '%Y-%m').strftime('%b %Y')
+    if bucket == 'week':
+        year, week = period_key.split('-')
+        return f"Week {week}, {year}"
+    return datetime.strptime(period_key, '%Y-%m-%d').strftime('%b %d' if short else '%b %d, %Y')
+
+
+# Any write to data a report reads bumps the version on flush, and again once
+# the transaction ends, since the snapshot lines and the rollup are written
+# with Core statements just before commit.
+
+REPORT_MODELS = (
+    Order, OrderIngredient, OrderPackaging, Purchase, Customer, Recipe, Ingredient, Packaging, DailySalesRollup
+)
+
+register_session_invalidation(bump_data_version, lambda model: issubclass(model, REPORT_MODELS))
@@ -0,0 +1,150 @@
+from datetime import timedelta
+from sqlalchemy import delete, event, func, insert, inspect, select
+from sqlalchemy.orm import Session
+from models import db, Customer, Order, OrderIngredient, OrderPackaging, DailySalesRollup
+from cache_helpers import invalidate_session_caches, register_before_commit
+
+ROLLUP_COLUMNS = [
+    'sale_date', 'customer_type', 'recipe_id', 'revenue_cents', 'ingredient_cost_cents',
+    'packaging_cost_cents', 'cookies_baked', 'order_count'
+]
+
+
+def _rollup_select(dates=None):
+    """Aggregate orders into rollup rows, optionally only for some days."""
+    sale_date = func.date(Order.order_date)
+    customer_type = func.coalesce(Customer.customer_type, '')
+    recipe_id = func.coalesce(Order.recipe_id, 0)
+
+    query = select(
+        sale_date,
+        customer_type,
+        recipe_id,
+        func.sum(Order.sale_price_total_cents),
+        func.sum(Order.ingredient_cost_cents),
+        func.sum(Order.packaging_cost_cents),
+        func.sum(Order.quantity_baked),
+        func.count(Order.id)
+    ).outerjoin(Customer, Customer.id == Order.customer_id).where(Order.order_date.isnot(None))
+
+    if dates is not None:
+        # The range lets SQLite seek on the order_date index
+        query = query.where(
+            Order.order_date >= min(dates),
+            Order.order_date < max(dates) + timedelta(days=1),
+            sale_date.in_(dates)
+        )
+
+    return query.group_by(sale_date, customer_type, recipe_id)
+
+
+def refresh_sales_rollup(dates, session=None):
+    """
+    Recompute the rollup rows for some days from their orders.
+
+    Args:
+        dates (iterable): Days to recompute
+        session (Session): Session to run in. Defaults to db.session.
+
+    Returns:
+        None
+    """
+    session = session or db.session
+    dates = set(dates)
+    if not dates:
+        return
+
+    table = DailySalesRollup.__table__
+    session.execute(delete(table).where(table.c.sale_date.in_(dates)))
+    session.execute(insert(table).from_select(ROLLUP_COLUMNS, _rollup_select(dates)))
+
+
+def rebuild_sales_rollup():
+    """
+    Rebuild the whole daily sales rollup from the order history.
+
+    Returns:
+        int: Number of rollup rows written
+    """
+    table = DailySalesRollup.__table__
+    db.session.execute(delete(table))
+    db.session.execute(insert(table).from_select(ROLLUP_COLUMNS, _rollup_select()))
+    invalidate_session_caches(db.session, [DailySalesRollup])
+    db.session.commit()
+
+    return db.session.query(func.count()).select_from(table).scalar()
+
+
+def get_first_sale_date():
+    """Get the day of the earliest order, or None if there are no orders."""
+    return db.session.query(func.min(DailySalesRollup.sale_date)).scalar()
+
+
+# Incremental maintenance. Flushes record which days (or which orders and
+# customers, resolved to days later) were touched; the rollup for those days is
+# recomputed just before commit, once the snapshot lines and order totals that
+# are written outside the flush are in place.
+
+def _order_day(value):
+    return value.date() if value is not None else None
+
+
+@event.listens_for(Session, 'before_flush')
+def _on_before_flush(session, flush_context, instances):
+    # Take the stored day of deleted orders and of orders changing day while
+    # the rows still hold it; the old value may not be loaded on the object
+    order_ids = {obj.id for obj in session.deleted if isinstance(obj, Order)}
+    order_ids.update(
+        obj.id for obj in session.dirty
+        if isinstance(obj, Order) and inspect(obj).attrs.order_date.history.has_changes()
+    )
+    order_ids.discard(None)
+    if not order_ids:
+        return
+
+    order_dates = session.execute(select(Order.order_date).where(Order.id.in_(order_ids))).scalars()
+    days = {_order_day(value) for value in order_dates}
+    days.discard(None)
+    session.info.setdefault('rollup_days', set()).update(days)
+
+
+@event.listens_for(Session, 'after_flush')
+def _on_after_flush(session, flush_context):
+    order_ids, customer_ids = set(), set()
+    for obj in (*session.new, *session.dirty):
+        if isinstance(obj, Order):
+            order_ids.add(obj.id)
+        elif isinstance(obj, Customer) and inspect(obj).attrs.customer_type.history.has_changes():
+            customer_ids.add(obj.id)
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(obj, (OrderIngredient, OrderPackaging)):
+            order_ids.add(obj.order_id)
+
+    order_ids.discard(None)
+    if order_ids:
+        session.info.setdefault('rollup_order_ids', set()).update(order_ids)
+    if customer_ids:
+        session.info.setdefault('rollup_customer_ids', set()).update(customer_ids)
+
+
+@register_before_commit
+def _refresh_on_commit(session):
+    days = session.info.pop('rollup_days', set())
+    order_ids = session.info.pop('rollup_order_ids', set())
+    customer_ids = session.info.pop('rollup_customer_ids', set())
+    if order_ids or customer_ids:
+        order_dates = session.execute(
+            select(Order.order_date).where(
+                Order.id.in_(order_ids) | Order.customer_id.in_(customer_ids)
+            )
+        ).scalars()
+        days.update(_order_day(value) for value in order_dates)
+        days.discard(None)
+
+    refresh_sales_rollup(days, session)
+
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _on_session_rollback(session, previous_transaction):
+    for key in ('rollup_days', 'rollup_order_ids', 'rollup_customer_ids'):
+        session.info.pop(key, None)
@@ -1,12 +1,26 @@
 """
 Scheduled jobs for Cookie Manager application.
 """
-from cost_helpers import get_low_stock_items
+import threading
+from sqlalchemy.exc import OperationalError
+from stock_helpers import get_low_stock_items
+from coherence_helpers import check_cache_coherence, read_cache_version
+from report_helpers import warm_report_caches
+from event_helpers import prune_dashboard_events
 from flask import current_app
 
 # Store Flask app instance
 flask_app = None
 
+# How often to look for data changes, and how long writes must have stopped
+# before the standard reports are recomputed
+REPORT_WARM_INTERVAL_SECONDS = 30
+
+# Cache version seen on the last check and the one the reports were last
+# computed for
+_report_warm_state = {'seen': None, 'warmed': None}
+_report_warm_lock = threading.Lock()
+
 def check_low_stock():
     """
     Check for low stock items and log them.
@@ -35,6 +49,76 @@ def check_low_stock():
                     f"(Threshold: {item['threshold']} {item['unit']})"
                 )
 
+def warm_reports():
+    """
+    Recompute the standard report variants into this process's report cache.
+    """
+    global flask_app
+    if not flask_app or not flask_app.config.get('REPORT_CACHE_ENABLED', True):
+        return 0
+    
+    with flask_app.app_context():
+        try:
+            # Catch up with writes from other processes so the reports are cached
+            # under the data version requests will look them up with
+            check_cache_coherence()
+            version = read_cache_version()
+            count = warm_report_caches()
+        except OperationalError as e:
+            # Most likely a database that hasn't been migrated yet
+            flask_app.logger.info(f"Skipped warming reports: {e.orig}")
+            return 0
+        with _report_warm_lock:
+            _report_warm_state['seen'] = version
+            _report_warm_state['warmed'] = version
+    
+    flask_app.logger.info(f"Warmed {count} report variants at data version {version}")
+    return count
+
+def warm_reports_if_changed():
+    """
+    Recompute the standard reports once data has changed and writes have settled.
+    
+    The shared cache version is compared on every run. A change only marks
+    the reports stale; they are recomputed on the first run that finds the
+    version unchanged since the previous one, so a burst of writes leads to
+    a single recompute.
+    """
+    global flask_app
+    if not flask_app or not flask_app.config.get('REPORT_CACHE_ENABLED', True):
+        return False
+    
+    with flask_app.app_context():
+        try:
+            version = read_cache_version()
+        except OperationalError as e:
+            flask_app.logger.info(f"Skipped checking for report changes: {e.orig}")
+            return False
+    
+    with _report_warm_lock:
+        settled = version == _report_warm_state['seen']
+        _report_warm_state['seen'] = version
+        if not settled or version == _report_warm_state['warmed']:
+            return False
+    
+    warm_reports()
+    return True
+
+def prune_events():
+    """
+    Delete dashboard events too old for any open stream to still need.
+    """
+    global flask_app
+    if not flask_app:
+        return 0
+    
+    with flask_app.app_context():
+        deleted = prune_dashboard_events()
+    
+    if deleted:
+        flask_app.logger.info(f"Pruned {deleted} dashboard events")
+    return deleted
+
 def register_jobs(scheduler, app):
     """
     Register all scheduled jobs.
@@ -62,3 +146,27 @@ def register_jobs(scheduler, app):
         trigger='interval',
         minutes=10
     )
+    
+    # Compute the standard reports once at startup, then again whenever
+    # data changes
+    scheduler.add_job(
+        id='warm_reports_startup',
+        func=warm_reports,
+        trigger='date'
+    )
+    scheduler.add_job(
+        id='warm_reports_if_changed',
+        func=warm_reports_if_changed,
+        trigger='interval',
+        seconds=REPORT_WARM_INTERVAL_SECONDS,
+        max_instances=1,
+        coalesce=True
+    )
+    
+    # Drop old dashboard events every hour
+    scheduler.add_job(
+        id='prune_dashboard_events',
+        func=prune_events,
+        trigger='interval',
+        hours=1
+    )
@@ -0,0 +1,244 @@
+from sqlalchemy import and_, delete, event, func, insert, inspect, update
+from sqlalchemy.orm import Session
+from models import db, Purchase, OrderIngredient, OrderPackaging, InventoryBalance
+from cost_helpers import ITEM_MODELS
+from cache_helpers import invalidate_session_caches
+
+# Usage ledger columns per item type: (item ID column, amount column)
+USAGE_COLUMNS = {
+    'ingredient': (OrderIngredient.ingredient_id, OrderIngredient.amount_used),
+    'packaging': (OrderPackaging.packaging_id, OrderPackaging.quantity_used)
+}
+
+# Ledger rows that move stock: model -> (item type, item ID attribute, quantity attribute, sign).
+# An item type of None means the row carries its own item_type.
+STOCK_MOVEMENTS = {
+    Purchase: (None, 'item_id', 'quantity', 1),
+    OrderIngredient: ('ingredient', 'ingredient_id', 'amount_used', -1),
+    OrderPackaging: ('packaging', 'packaging_id', 'quantity_used', -1)
+}
+
+# Balances within this tolerance of the ledger are not reported as drift
+DRIFT_TOLERANCE = 1e-6
+
+
+def _stock_query(item_type):
+    """
+    Build a query of every item of one type with its current stock level.
+
+    Stock levels are read from the running inventory_balances table, so
+    each item costs a single primary key lookup.
+
+    Args:
+        item_type (str): Either 'ingredient' or 'packaging'
+
+    Returns:
+        Query: Rows of (item, current_stock)
+    """
+    model = ITEM_MODELS[item_type]
+    current_stock = func.coalesce(InventoryBalance.quantity, 0).label('current_stock')
+
+    return db.session.query(model, current_stock).outerjoin(InventoryBalance, and_(
+        InventoryBalance.item_type == item_type,
+        InventoryBalance.item_id == model.id
+    ))
+
+
+def get_stock_levels(item_type):
+    """
+    Get current stock levels for all items of one type.
+
+    Args:
+        item_type (str): Either 'ingredient' or 'packaging'
+
+    Returns:
+        list: (item, current_stock) tuples ordered by item name
+    """
+    model = ITEM_MODELS[item_type]
+    return _stock_query(item_type).order_by(model.name).all()
+
+
+def get_stock_map(item_type, item_ids=None):
+    """
+    Get current stock levels keyed by item ID.
+
+    Args:
+        item_type (str): Either 'ingredient' or 'packaging'
+        item_ids (iterable): Optional IDs to restrict to
+
+    Returns:
+        dict: Maps item ID to current stock level
+    """
+    model = ITEM_MODELS[item_type]
+    query = _stock_query(item_type)
+    if item_ids is not None:
+        query = query.filter(model.id.in_(set(item_ids)))
+    return {item.id: current_stock for item, current_stock in query.all()}
+
+
+def get_low_stock_items():
+    """
+    Get items that are below their low stock threshold.
+
+    Returns:
+        tuple: Two lists - low stock ingredients and low stock packaging
+    """
+    low_stock = {}
+
+    for item_type, model in ITEM_MODELS.items():
+        # Skip items with no threshold set
+        rows = _stock_query(item_type).filter(
+            model.low_stock_threshold > 0
+        ).order_by(model.name).all()
+
+        low_stock[item_type] = [{
+            'item': item,
+            'current_stock': current_stock,
+            'threshold': item.low_stock_threshold,
+            'unit': item.default_unit
+        } for item, current_stock in rows if current_stock <= item.low_stock_threshold]
+
+    return low_stock['ingredient'], low_stock['packaging']
+
+
+def get_ledger_stock_levels():
+    """
+    Compute stock levels from the full purchase and usage history.
+
+    Purchases and usage are each aggregated per item in grouped queries.
+
+    Returns:
+        dict: Maps (item_type, item_id) to purchased minus used
+    """
+    levels = {}
+
+    # Total purchased per item (includes inventory adjustments)
+    purchased = db.session.query(
+        Purchase.item_type,
+        Purchase.item_id,
+        func.sum(Purchase.quantity)
+    ).filter(Purchase.item_type.isnot(None)).group_by(Purchase.item_type, Purchase.item_id).all()
+    for item_type, item_id, total in purchased:
+        levels[(item_type, item_id)] = total or 0
+
+    # Total used in orders per item
+    for item_type, (usage_item_id, usage_amount) in USAGE_COLUMNS.items():
+        used = db.session.query(usage_item_id, func.sum(usage_amount)).group_by(usage_item_id).all()
+        for item_id, total in used:
+            key = (item_type, item_id)
+            levels[key] = levels.get(key, 0) - (total or 0)
+
+    return levels
+
+
+def apply_stock_deltas(deltas, session=None):
+    """
+    Add stock movements to the running inventory balances.
+
+    Args:
+        deltas (dict): Maps (item_type, item_id) to the change in stock
+        session (Session): Session to run in. Defaults to db.session.
+
+    Returns:
+        None
+    """
+    session = session or db.session
+    table = InventoryBalance.__table__
+    # Net movement per item in this transaction, checked for low stock crossings before commit
+    moved = session.info.setdefault('stock_moved', {})
+
+    for (item_type, item_id), delta in deltas.items():
+        if item_type is None or item_id is None or not delta:
+            continue
+        moved[(item_type, item_id)] = moved.get((item_type, item_id), 0) + delta
+
+        result = session.execute(update(table).where(
+            table.c.item_type == item_type,
+            table.c.item_id == item_id
+        ).values(quantity=table.c.quantity + delta))
+
+        if result.rowcount == 0:
+            session.execute(insert(table).values(item_type=item_type, item_id=item_id, quantity=delta))
+
+
+def reconcile_inventory_balances():
+    """
+    Rebuild inventory balances from the ledger and report any drift.
+
+    Returns:
+        list: Dicts with item_type, item_id, balance and ledger for every
+            item whose stored balance differed from the ledger
+    """
+    ledger = get_ledger_stock_levels()
+    balances = {
+        (row.item_type, row.item_id): row.quantity
+        for row in db.session.query(InventoryBalance.item_type, InventoryBalance.item_id, InventoryBalance.quantity)
+    }
+
+    drift = []
+    for key in sorted(set(ledger) | set(balances)):
+        balance = balances.get(key, 0)
+        expected = ledger.get(key, 0)
+        if abs(balance - expected) > DRIFT_TOLERANCE:
+            drift.append({
+                'item_type': key[0],
+                'item_id': key[1],
+                'balance': balance,
+                'ledger': expected
+            })
+
+    table = InventoryBalance.__table__
+    db.session.execute(delete(table))
+    if ledger:
+        db.session.execute(insert(table), [
+            {'item_type': item_type, 'item_id': item_id, 'quantity': quantity}
+            for (item_type, item_id), quantity in ledger.items()
+        ])
+    invalidate_session_caches(db.session, [InventoryBalance])
+    db.session.commit()
+
+    return drift
+
+
+# Inventory balance maintenance. Every flushed purchase or order line is
+# turned into a stock delta and applied in the same transaction.
+
+def _old_value(obj, attr):
+    """Get an attribute's value as of the last load, before pending changes."""
+    history = inspect(obj).attrs[attr].history
+    if history.deleted:
+        return history.deleted[0]
+    if history.unchanged:
+        return history.unchanged[0]
+    return getattr(obj, attr)
+
+
+def _stock_movement(obj, value=getattr):
+    """Get the ((item_type, item_id), delta) a ledger row contributes."""
+    item_type, id_attr, quantity_attr, sign = STOCK_MOVEMENTS[type(obj)]
+    if item_type is None:
+        item_type = value(obj, 'item_type')
+    return (item_type, value(obj, id_attr)), sign * (value(obj, quantity_attr) or 0)
+
+
+@event.listens_for(Session, 'after_flush')
+def _on_session_flush(session, flush_context):
+    deltas = {}
+
+    def add(movement, direction):
+        key, delta = movement
+        deltas[key] = deltas.get(key, 0) + direction * delta
+
+    for obj in session.new:
+        if type(obj) in STOCK_MOVEMENTS:
+            add(_stock_movement(obj), 1)
+    for obj in session.deleted:
+        if type(obj) in STOCK_MOVEMENTS:
+            add(_stock_movement(obj, _old_value), -1)
+    for obj in session.dirty:
+        if type(obj) in STOCK_MOVEMENTS and obj not in session.deleted:
+            add(_stock_movement(obj, _old_value), -1)
+            add(_stock_movement(obj), 1)
+
+    if deltas:
+        apply_stock_deltas(deltas, session)
@@ -0,0 +1,58 @@
+import pytest
+from sqlalchemy import event
+from app import create_app
+from models import db, Customer, Recipe, Ingredient, Order
+from cost_helpers import snapshot_order_costs
+
+
+@pytest.fixture
+def app():
+    """Create and configure a Flask app for testing."""
+    app = create_app('testing')
+
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.drop_all()
+
+
+@pytest.fixture
+def client(app):
+    """A test client for the app."""
+    return app.test_client()
+
+
+@pytest.fixture
+def shop(app):
+    """Create a priced ingredient with a low stock threshold, two recipes and two customers."""
+    flour = Ingredient(name='Flour', default_unit='g', default_price_per_unit_cents=2, low_stock_threshold=100)
+    shortbread = Recipe(name='Shortbread', dough_weight_per_cookie_g=40)
+    ginger = Recipe(name='Ginger Snap', dough_weight_per_cookie_g=30)
+    alice = Customer(name='Alice', customer_type='friend')
+    store = Customer(name='Corner Store', customer_type='store')
+    db.session.add_all([flour, shortbread, ginger, alice, store])
+    db.session.commit()
+    return {'flour': flour.id, 'shortbread': shortbread.id, 'ginger': ginger.id, 'alice': alice.id, 'store': store.id}
+
+
+def place_order(shop, order_date, customer_id=None, recipe_id=None, sale_price=2000, flour_g=250):
+    """Create and commit an order using flour_g of the shop's flour, the way the order wizard does."""
+    order = Order(order_date=order_date, customer_id=customer_id, recipe_id=recipe_id, dough_weight_g=flour_g,
+                  quantity_ordered=10, quantity_baked=10, sale_price_total_cents=sale_price)
+    db.session.add(order)
+    db.session.flush()
+    snapshot_order_costs(order, [{'id': shop['flour'], 'amount': flour_g}], [])
+    db.session.commit()
+    return order
+
+
+def count_statements(func):
+    """Call func and return the number of SQL statements it ran."""
+    statements = []
+    listener = lambda *args: statements.append(args[2])
+    event.listen(db.engine, 'before_cursor_execute', listener)
+    try:
+        func()
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', listener)
+    return len(statements)
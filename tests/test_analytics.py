@@ -0,0 +1,95 @@
+import pytest
+from datetime import datetime, timedelta
+from sqlalchemy import delete
+from models import db, Customer, Recipe, Ingredient, Packaging, Order, OrderIngredient, OrderPackaging
+from report_helpers import get_report_window
+from analytics_helpers import get_distribution
+
+
+@pytest.fixture
+def orders(app):
+    """Create orders over three days for a recipe, custom orders and two customer types."""
+    recipe = Recipe(name='Chocolate Chip', dough_weight_per_cookie_g=40)
+    store = Customer(name='Corner Store', customer_type='store')
+    friend = Customer(name='Bob', customer_type='friend')
+    flour = Ingredient(name='Flour', default_unit='g')
+    box = Packaging(name='Box', default_unit='pcs')
+    db.session.add_all([recipe, store, friend, flour, box])
+    db.session.flush()
+
+    today = datetime.now().replace(hour=12, minute=0, second=0, microsecond=0)
+    for days_ago, recipe_id, customer_id, sale_price, ingredient_cost, packaging_cost, cookies in (
+        (2, recipe.id, store.id, 4000, 1500, 500, 20),
+        (2, recipe.id, friend.id, 2000, 1200, 300, 10),
+        (1, None, store.id, 3000, 900, 300, 12),
+        (0, recipe.id, None, 0, 400, 0, 0)
+    ):
+        order = Order(order_date=today - timedelta(days=days_ago), recipe_id=recipe_id, customer_id=customer_id,
+                      dough_weight_g=500, quantity_ordered=cookies, quantity_baked=cookies,
+                      sale_price_total_cents=sale_price)
+        db.session.add(order)
+        db.session.flush()
+        db.session.add_all([
+            OrderIngredient(order_id=order.id, ingredient_id=flour.id, amount_used=500,
+                            cost_at_time_of_use_cents=ingredient_cost),
+            OrderPackaging(order_id=order.id, packaging_id=box.id, quantity_used=1,
+                           cost_at_time_of_use_cents=packaging_cost)
+        ])
+    db.session.commit()
+
+
+def test_distribution(app, orders):
+    """Test the distribution statistics against values worked out by hand."""
+    stats = get_distribution(*get_report_window('3months'))
+    assert stats['order_count'] == 4
+
+    # Margins 50%, 25% and 60%; the order without revenue has none
+    assert stats['margin']['mean'] == pytest.approx(45)
+    assert stats['margin']['min'] == 25
+    assert stats['margin']['max'] == 60
+    assert stats['margin']['percentiles'][2] == 50
+
+    # Per-cookie costs 100, 150 and 100 cents; the order without cookies has none
+    assert stats['cost_per_cookie']['mean'] == pytest.approx(350 / 3)
+    assert stats['cost_per_cookie']['percentiles'][2] == 100
+
+    rolling = stats['rolling']
+    assert len(rolling['labels']) == 3
+    assert rolling['revenue'] == [6000, 4500, 3000]
+    assert rolling['profit'] == [2500, 2150, 1300]
+    assert rolling['margin'] == [41.67, 47.78, 43.33]
+
+    by_recipe = {row['name']: row for row in stats['by_recipe']}
+    assert by_recipe['Chocolate Chip']['order_count'] == 3
+    assert by_recipe['Chocolate Chip']['revenue'] == 6000
+    assert by_recipe['Chocolate Chip']['profit'] == 2100
+    assert by_recipe['Chocolate Chip']['margin'] == 37.5
+    assert by_recipe['Custom']['cost_per_cookie'] == 100
+
+    by_type = {row['name']: row for row in stats['by_customer_type']}
+    assert by_type['store']['revenue'] == 7000
+    assert by_type['store']['margin'] == 55
+    assert by_type['No customer']['margin'] is None
+    assert [row['name'] for row in stats['by_customer_type']][0] == 'store'
+
+
+def test_distribution_endpoints(client, orders):
+    """Test the distribution page and JSON API."""
+
+    response = client.get('/reports/distribution?period=all')
+    assert response.status_code == 200
+    assert b'Chocolate Chip' in response.data
+
+    data = client.get('/reports/api/distribution?period=all').get_json()
+    assert data['period'] == 'all'
+    assert data['order_count'] == 4
+    assert len(data['by_customer_type']) == 3
+
+
+def test_distribution_deleted_recipe(app, orders):
+    """Test that orders whose recipe row is gone are counted as custom orders."""
+    db.session.execute(delete(Recipe.__table__))
+    db.session.commit()
+
+    stats = get_distribution(*get_report_window('3months'))
+    assert [(row['key'], row['name'], row['order_count']) for row in stats['by_recipe']] == [(0, 'Custom', 4)]
@@ -0,0 +1,82 @@
+from sqlalchemy import update
+from models import db, CacheVersion, Customer
+from cost_helpers import price_cache
+from coherence_helpers import bump_cache_version, check_cache_coherence, read_cache_version
+from report_helpers import get_data_version
+from conftest import count_statements
+
+
+def other_worker_writes():
+    """Bump the shared version the way a commit in another process would."""
+    table = CacheVersion.__table__
+    db.session.execute(update(table).values(version=table.c.version + 1))
+    db.session.commit()
+
+
+def test_commits_bump_cache_version(app):
+    """Test that committed writes bump the shared version and reads do not."""
+    assert read_cache_version() == 0
+
+    db.session.add(Customer(name='Alice', customer_type='friend'))
+    db.session.commit()
+    assert read_cache_version() == 1
+
+    Customer.query.all()
+    db.session.commit()
+    assert read_cache_version() == 1
+
+    # Rolled back writes leave it alone
+    db.session.add(Customer(name='Bob', customer_type='friend'))
+    db.session.flush()
+    db.session.rollback()
+    assert read_cache_version() == 1
+
+    assert bump_cache_version() == 2
+
+
+def test_other_worker_write_drops_caches(client):
+    """Test that a write in another process clears this process's caches on the next request."""
+    price_cache.clear()
+    client.get('/hello')
+
+    # Our own writes don't make us drop caches again
+    db.session.add(Customer(name='Alice', customer_type='friend'))
+    db.session.commit()
+    price_cache.set(('ingredient', 1), 2000)
+    data_version = get_data_version()
+    client.get('/hello')
+    assert price_cache.get(('ingredient', 1)) == 2000
+    assert get_data_version() == data_version
+
+    other_worker_writes()
+    client.get('/hello')
+    assert len(price_cache) == 0
+    assert get_data_version() > data_version
+    # The hit counted above survives the drop
+    assert price_cache.stats()['hits'] == 1
+
+    # Seen once, not dropped again
+    price_cache.set(('ingredient', 1), 2000)
+    check_cache_coherence()
+    assert len(price_cache) == 1
+
+    price_cache.clear()
+
+
+def test_uncached_endpoints_skip_check(client):
+    """Test that static files and the event stream don't query the shared version."""
+    assert count_statements(lambda: client.get('/static/css/styles.css')) == 0
+    assert count_statements(lambda: client.get('/hello')) == 1
+
+
+def test_rebuild_commands_bump_cache_version(app):
+    """Test that the commands rewriting derived tables with Core statements bump the shared version."""
+    db.session.add(Customer(name='Alice', customer_type='friend'))
+    db.session.commit()
+    runner = app.test_cli_runner()
+
+    for command in ('rebuild-prices', 'refresh-order-totals', 'rebuild-rollup', 'reconcile-stock'):
+        version = read_cache_version()
+        result = runner.invoke(args=[command])
+        assert result.exit_code == 0, result.output
+        assert read_cache_version() == version + 1, command
@@ -1,93 +1,77 @@
 import pytest
-from app import create_app
 from models import db, Ingredient, Packaging, Purchase
+from datetime import date
 from cost_helpers import (
     get_latest_unit_cost,
+    get_latest_unit_costs,
     calculate_ingredient_cost,
     calculate_packaging_cost,
-    calculate_order_cost_preview
+    calculate_order_cost_preview,
+    snapshot_order_costs
 )
 
 
-@pytest.fixture
-def app():
-    """Create and configure a Flask app for testing."""
-    app = create_app('testing')
-    
-    with app.app_context():
-        db.create_all()
-        yield app
-        db.drop_all()
-
-
-@pytest.fixture
-def client(app):
-    """A test client for the app."""
-    return app.test_client()
-
-
 @pytest.fixture
 def test_data(app):
     """Create test data for cost calculations."""
-    with app.app_context():
-        # Create ingredients
-        flour = Ingredient(
-            name='Flour',
-            default_unit='g',
-            default_price_per_unit_cents=5  # 5 cents per gram
-        )
-        sugar = Ingredient(
-            name='Sugar',
-            default_unit='g',
-            default_price_per_unit_cents=8  # 8 cents per gram
-        )
-        
-        # Create packaging
-        box = Packaging(
-            name='Small Box',
-            default_unit='pcs',
-            default_price_per_unit_cents=50  # 50 cents per piece
-        )
-        
-        db.session.add_all([flour, sugar, box])
-        db.session.commit()
-        
-        # Create purchases
-        flour_purchase = Purchase(
-            item_type='ingredient',
-            item_id=flour.id,
-            quantity=1000,  # 1kg
-            unit='g',
-            total_cost_cents=4000  # $40.00
-        )
-        flour_purchase.calculate_unit_cost()  # 4000 millicents per gram (4 cents)
-        
-        sugar_purchase = Purchase(
-            item_type='ingredient',
-            item_id=sugar.id,
-            quantity=500,  # 500g
-            unit='g',
-            total_cost_cents=3500  # $35.00
-        )
-        sugar_purchase.calculate_unit_cost()  # 7000 millicents per gram (7 cents)
-        
-        box_purchase = Purchase(
-            item_type='packaging',
-            item_id=box.id,
-            quantity=10,
-            unit='pcs',
-            total_cost_cents=400  # $4.00
-        )
-        box_purchase.calculate_unit_cost()  # 40000 millicents per piece (40 cents)
-        
-        db.session.add_all([flour_purchase, sugar_purchase, box_purchase])
-        db.session.commit()
-        
-        return {
-            'flour': flour,
-            'sugar': sugar,
-            'box': box
-        }
+    # Create ingredients
+    flour = Ingredient(
+        name='Flour',
+        default_unit='g',
+        default_price_per_unit_cents=5  # 5 cents per gram
+    )
+    sugar = Ingredient(
+        name='Sugar',
+        default_unit='g',
+        default_price_per_unit_cents=8  # 8 cents per gram
+    )
+    
+    # Create packaging
+    box = Packaging(
+        name='Small Box',
+        default_unit='pcs',
+        default_price_per_unit_cents=50  # 50 cents per piece
+    )
+    
+    db.session.add_all([flour, sugar, box])
+    db.session.commit()
+    
+    # Create purchases
+    flour_purchase = Purchase(
+        item_type='ingredient',
+        item_id=flour.id,
+        quantity=1000,  # 1kg
+        unit='g',
+        total_cost_cents=4000  # $40.00
+    )
+    flour_purchase.calculate_unit_cost()  # 4000 millicents per gram (4 cents)
+    
+    sugar_purchase = Purchase(
+        item_type='ingredient',
+        item_id=sugar.id,
+        quantity=500,  # 500g
+        unit='g',
+        total_cost_cents=3500  # $35.00
+    )
+    sugar_purchase.calculate_unit_cost()  # 7000 millicents per gram (7 cents)
+    
+    box_purchase = Purchase(
+        item_type='packaging',
+        item_id=box.id,
+        quantity=10,
+        unit='pcs',
+        total_cost_cents=400  # $4.00
+    )
+    box_purchase.calculate_unit_cost()  # 40000 millicents per piece (40 cents)
+    
+    db.session.add_all([flour_purchase, sugar_purchase, box_purchase])
+    db.session.commit()
+    
+    return {
+        'flour': flour,
+        'sugar': sugar,
+        'box': box
+    }
 
 
 def test_get_latest_unit_cost(app, test_data):
@@ -109,6 +93,42 @@ def test_get_latest_unit_cost(app, test_data):
         assert nonexistent_cost is None
 
 
+def test_get_latest_unit_costs(app, test_data):
+    """Test resolving latest unit costs for several items at once."""
+    with app.app_context():
+        flour_id = test_data['flour'].id
+        sugar_id = test_data['sugar'].id
+        
+        # A newer purchase replaces the older price, an adjustment is ignored
+        newer_flour = Purchase(
+            item_type='ingredient',
+            item_id=flour_id,
+            purchase_date=date(2100, 1, 1),
+            quantity=1000,
+            unit='g',
+            total_cost_cents=5000
+        )
+        newer_flour.calculate_unit_cost()  # 5000 millicents per gram (5 cents)
+        adjustment = Purchase(
+            item_type='ingredient',
+            item_id=sugar_id,
+            purchase_date=date(2100, 1, 1),
+            quantity=-50,
+            unit='g',
+            total_cost_cents=0,
+            unit_cost_cents=0
+        )
+        db.session.add_all([newer_flour, adjustment])
+        db.session.commit()
+        
+        costs = get_latest_unit_costs('ingredient', [flour_id, sugar_id, 999])
+        assert costs == {flour_id: 5000, sugar_id: 7000}
+        
+        # Packaging IDs are resolved independently of ingredient IDs
+        assert get_latest_unit_costs('packaging', [test_data['box'].id]) == {test_data['box'].id: 40000}
+        assert get_latest_unit_costs('ingredient', []) == {}
+
+
 def test_calculate_ingredient_cost(app, test_data):
     """Test calculating ingredient costs."""
     with app.app_context():
@@ -183,3 +203,224 @@ def test_calculate_order_cost_preview(app, test_data):
         assert preview['ingredient_cost_cents'] == 1700
         assert preview['packaging_cost_cents'] == 120
         assert preview['total_cost_cents'] == 1820
+
+
+def test_price_cache(app, test_data):
+    """Test the latest-price cache and its invalidation on purchase writes."""
+    from cost_helpers import price_cache
+    
+    app.config['PRICE_CACHE_ENABLED'] = True
+    price_cache.clear()
+    
+    with app.app_context():
+        flour_id = test_data['flour'].id
+        
+        assert get_latest_unit_cost('ingredient', flour_id) == 4000
+        assert get_latest_unit_cost('ingredient', flour_id) == 4000
+        assert get_latest_unit_cost('ingredient', 999) is None
+        assert get_latest_unit_cost('ingredient', 999) is None
+        stats = price_cache.stats()
+        assert stats['hits'] == 2
+        assert stats['misses'] == 2
+        
+        # Recording a newer purchase drops the cached price
+        purchase = Purchase(
+            item_type='ingredient',
+            item_id=flour_id,
+            purchase_date=date(2100, 1, 1),
+            quantity=100,
+            unit='g',
+            total_cost_cents=600
+        )
+        purchase.calculate_unit_cost()
+        db.session.add(purchase)
+        db.session.commit()
+        assert len(price_cache) == 0
+        assert (price_cache.stats()['hits'], price_cache.stats()['misses']) == (2, 2)
+        assert get_latest_unit_cost('ingredient', flour_id) == 6000
+        
+        # Deleting it restores the previous price
+        db.session.delete(purchase)
+        db.session.commit()
+        assert get_latest_unit_cost('ingredient', flour_id) == 4000
+    
+    price_cache.clear()
+
+
+def test_price_cache_skips_stale_sets(app, test_data, monkeypatch):
+    """Test that a price loaded while the cache was invalidated is not cached."""
+    import cost_helpers
+    from cost_helpers import price_cache
+    
+    app.config['PRICE_CACHE_ENABLED'] = True
+    price_cache.clear()
+    query = cost_helpers._query_latest_unit_costs
+    
+    def query_during_commit(item_type, item_ids):
+        # Another thread commits a price change while this read is in flight
+        costs = query(item_type, item_ids)
+        price_cache.clear()
+        return costs
+    
+    with app.app_context():
+        flour_id = test_data['flour'].id
+        
+        monkeypatch.setattr(cost_helpers, '_query_latest_unit_costs', query_during_commit)
+        assert get_latest_unit_cost('ingredient', flour_id) == 4000
+        assert len(price_cache) == 0
+        
+        monkeypatch.setattr(cost_helpers, '_query_latest_unit_costs', query)
+        assert get_latest_unit_cost('ingredient', flour_id) == 4000
+        assert len(price_cache) == 1
+    
+    price_cache.clear()
+
+
+def test_current_item_prices(app, test_data):
+    """Test that current_item_prices follows purchase writes and rebuilds."""
+    from models import CurrentItemPrice
+    from cost_helpers import rebuild_current_prices
+    
+    with app.app_context():
+        flour_id = test_data['flour'].id
+        sugar_id = test_data['sugar'].id
+        
+        current = db.session.get(CurrentItemPrice, ('ingredient', flour_id))
+        assert current.unit_cost_cents == 4000
+        
+        # Moving the flour purchase to sugar updates both rows
+        purchase = Purchase.query.get(current.purchase_id)
+        purchase.item_id = sugar_id
+        purchase.purchase_date = date(2100, 1, 1)
+        db.session.commit()
+        assert db.session.get(CurrentItemPrice, ('ingredient', flour_id)) is None
+        assert get_latest_unit_cost('ingredient', flour_id) == 5000  # default price
+        assert get_latest_unit_cost('ingredient', sugar_id) == 4000
+        
+        db.session.query(CurrentItemPrice).delete()
+        db.session.commit()
+        assert rebuild_current_prices() == 2
+        assert get_latest_unit_cost('ingredient', sugar_id) == 4000
+
+
+def test_snapshot_order_costs(app, test_data):
+    """Test that snapshots are written in the caller's transaction."""
+    from models import Order
+    from stock_helpers import get_stock_map
+    
+    with app.app_context():
+        flour_id = test_data['flour'].id
+        box_id = test_data['box'].id
+        
+        order = Order(dough_weight_g=250, quantity_ordered=10, quantity_baked=10, sale_price_total_cents=2000)
+        db.session.add(order)
+        db.session.flush()
+        
+        snapshot_order_costs(
+            order,
+            [{'id': flour_id, 'amount': 250}],
+            [{'id': box_id, 'quantity': 2}]
+        )
+        
+        assert [(oi.ingredient_id, oi.cost_at_time_of_use_cents) for oi in order.ingredients] == [(flour_id, 1000)]
+        assert [(op.packaging_id, op.cost_at_time_of_use_cents) for op in order.packaging] == [(box_id, 80)]
+        assert get_stock_map('ingredient', [flour_id]) == {flour_id: 750}
+        
+        # Nothing is committed by the helper itself
+        db.session.rollback()
+        assert Order.query.count() == 0
+        assert get_stock_map('ingredient', [flour_id]) == {flour_id: 1000}
+
+
+def test_persisted_order_totals(app, test_data):
+    """Test that order totals are stored on the order and kept up to date."""
+    from models import Order
+    
+    with app.app_context():
+        flour_id = test_data['flour'].id
+        box_id = test_data['box'].id
+        
+        order = Order(dough_weight_g=250, quantity_ordered=10, quantity_baked=10, sale_price_total_cents=2000)
+        db.session.add(order)
+        db.session.flush()
+        assert (order.total_cost_cents, order.profit_cents) == (0, 2000)
+        
+        snapshot_order_costs(
+            order,
+            [{'id': flour_id, 'amount': 250}],
+            [{'id': box_id, 'quantity': 2}]
+        )
+        db.session.commit()
+        
+        assert order.ingredient_cost_cents == 1000
+        assert order.packaging_cost_cents == 80
+        assert order.total_cost_cents == 1080
+        assert order.profit_cents == 920
+        assert order.profit_margin == 46.0
+        
+        # A sale price edit and a removed line are both reflected
+        order.sale_price_total_cents = 1500
+        db.session.delete(order.packaging[0])
+        db.session.commit()
+        assert (order.total_cost_cents, order.profit_cents) == (1000, 500)
+        
+        # Totals are plain columns, so they filter and sort in SQL
+        cheap = Order(dough_weight_g=100, quantity_ordered=1, quantity_baked=1, sale_price_total_cents=3000)
+        db.session.add(cheap)
+        db.session.commit()
+        ordered = Order.query.filter(Order.total_cost_cents >= 0).order_by(Order.profit_cents.desc()).all()
+        assert [o.id for o in ordered] == [cheap.id, order.id]
+        assert db.session.query(Order.profit_margin).order_by(Order.id).all() == [(500 * 100.0 / 1500,), (100.0,)]
+
+
+def test_unflushed_order_totals(app, test_data):
+    """Test that an order not yet flushed sums its totals from its lines."""
+    from models import Order, OrderIngredient, OrderPackaging
+    
+    with app.app_context():
+        order = Order(dough_weight_g=250, quantity_ordered=10, quantity_baked=10, sale_price_total_cents=2000)
+        order.ingredients.append(OrderIngredient(
+            ingredient_id=test_data['flour'].id, amount_used=250, cost_at_time_of_use_cents=1000
+        ))
+        order.packaging.append(OrderPackaging(
+            packaging_id=test_data['box'].id, quantity_used=2, cost_at_time_of_use_cents=80
+        ))
+        
+        assert order.ingredient_cost_cents == 1000
+        assert order.packaging_cost_cents == 80
+        assert order.total_cost_cents == 1080
+        assert order.profit_cents == 920
+        assert order.profit_margin == 46.0
+
+
+def test_as_of_unit_cost(app, test_data):
+    """Test point-in-time price resolution."""
+    from cost_helpers import PriceHistory
+    
+    with app.app_context():
+        flour_id = test_data['flour'].id
+        for purchase_date, total_cost_cents in [(date(2020, 1, 1), 1000), (date(2020, 6, 1), 2000)]:
+            purchase = Purchase(
+                item_type='ingredient',
+                item_id=flour_id,
+                purchase_date=purchase_date,
+                quantity=1000,
+                unit='g',
+                total_cost_cents=total_cost_cents
+            )
+            purchase.calculate_unit_cost()
+            db.session.add(purchase)
+        db.session.commit()
+        
+        assert get_latest_unit_cost('ingredient', flour_id, as_of=date(2019, 12, 31)) == 5000  # default price
+        assert get_latest_unit_cost('ingredient', flour_id, as_of=date(2020, 1, 1)) == 1000
+        assert get_latest_unit_cost('ingredient', flour_id, as_of=date(2020, 5, 31)) == 1000
+        assert get_latest_unit_cost('ingredient', flour_id, as_of=date(2020, 6, 1)) == 2000
+        assert get_latest_unit_cost('ingredient', flour_id) == 4000  # today's purchase
+        
+        # One preloaded history prices lines at different dates
+        history = PriceHistory.load()
+        lines = [{'id': flour_id, 'amount': 100}]
+        assert calculate_order_cost_preview(lines, [], as_of=date(2020, 3, 1), price_history=history)['total_cost_cents'] == 100
+        assert calculate_order_cost_preview(lines, [], as_of=date(2021, 3, 1), price_history=history)['total_cost_cents'] == 200
+        assert history.unit_cost('packaging', test_data['box'].id, date(1999, 1, 1)) == 50000
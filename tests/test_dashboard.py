@@ -0,0 +1,167 @@
+import json
+from datetime import datetime, timedelta
+from models import db, Order, Purchase, DashboardEvent
+from dashboard_helpers import get_dashboard_summary
+from conftest import count_statements, place_order
+
+
+def test_dashboard_summary(app, shop):
+    """Test both periods and the counts, with orders on each side of the boundaries."""
+    today = datetime.now().replace(hour=12, minute=0, second=0, microsecond=0)
+    place_order(shop, today, shop['alice'], shop['shortbread'], sale_price=4000)
+    place_order(shop, today - timedelta(days=30), shop['alice'], shop['shortbread'], sale_price=3000)
+    place_order(shop, today - timedelta(days=31), shop['alice'], shop['shortbread'], sale_price=2000)
+    place_order(shop, today - timedelta(days=60), shop['alice'], shop['shortbread'], sale_price=1000)
+    place_order(shop, today - timedelta(days=61), shop['alice'], shop['shortbread'], sale_price=500)
+
+    summary = get_dashboard_summary()
+    assert summary['counts'] == {
+        'customer_count': 2, 'recipe_count': 2, 'order_count': 5, 'ingredient_count': 1, 'packaging_count': 0
+    }
+    assert summary['current'] == {
+        'revenue': 7000, 'ingredient_cost': 1000, 'packaging_cost': 0, 'total_cost': 1000,
+        'profit': 6000, 'cookies_baked': 20, 'order_count': 2
+    }
+    assert summary['previous']['revenue'] == 3000
+    assert summary['previous']['profit'] == 2000
+    assert summary['previous']['order_count'] == 2
+
+
+def test_dashboard_query_count(client, shop):
+    """Test that the dashboard runs the same small number of statements at any size."""
+    panels = ['/dashboard/panels/kpis', '/dashboard/panels/low-stock', '/dashboard/panels/recent-orders',
+              '/dashboard/api/charts']
+
+    def load_dashboard():
+        for url in ['/'] + panels:
+            client.get(url)
+
+    client.get('/hello')
+    empty = count_statements(load_dashboard)
+
+    for days_ago in range(10):
+        place_order(shop, datetime.now() - timedelta(days=days_ago))
+    client.get('/hello')
+    full = count_statements(load_dashboard)
+
+    assert full == empty
+
+    # The page itself only checks cache coherence; the panels carry the queries
+    client.get('/hello')
+    assert count_statements(lambda: client.get('/')) == 1
+
+
+def test_dashboard_panels(client, shop):
+    """Test that the page loads its panels, each cacheable for its own TTL."""
+    place_order(shop, datetime.now(), shop['alice'], shop['shortbread'], sale_price=4000)
+
+    response = client.get('/')
+    assert b'/dashboard/panels/kpis' in response.data
+    assert b'Alice' not in response.data
+
+    response = client.get('/dashboard/panels/recent-orders')
+    assert b'Alice' in response.data
+    assert b'Shortbread' in response.data
+    assert response.cache_control.max_age == 15
+    assert response.cache_control.private
+
+    # Unchanged panels revalidate without a body
+    etag = response.headers['ETag']
+    response = client.get('/dashboard/panels/recent-orders', headers={'If-None-Match': etag})
+    assert response.status_code == 304
+
+    response = client.get('/dashboard/panels/low-stock')
+    assert b'Flour' in response.data
+    assert response.cache_control.max_age == 30
+
+    data = client.get('/dashboard/api/charts').get_json()
+    assert len(data['months']) == 6
+    assert data['revenue'][-1] == 40.0
+    assert data['profit'][-1] == 35.0
+    assert data['topCookies'] == {'labels': ['Shortbread'], 'data': [10]}
+
+    assert client.get('/dashboard/panels/nope').status_code == 404
+
+
+def read_events(client, last_id=0):
+    """Read one pass of the event stream after last_id as (id, kind, data) tuples."""
+    with client.get('/dashboard/events', headers={'Last-Event-ID': str(last_id)}) as response:
+        assert response.mimetype == 'text/event-stream'
+        body = response.get_data(as_text=True)
+
+    events = []
+    for message in body.split('\n\n'):
+        fields = dict(line.split(': ', 1) for line in message.splitlines() if not line.startswith(':'))
+        if 'event' in fields:
+            events.append((int(fields['id']), fields['event'], json.loads(fields['data'])))
+    return events
+
+
+def test_dashboard_events(app, client, shop):
+    """Test that orders, revenue changes and low stock crossings are streamed once each."""
+    app.config['DASHBOARD_EVENTS_STREAM_SECONDS'] = 0
+    day = datetime(2024, 3, 5, 12, 0)
+
+    # Restocking past the threshold is a crossing; the first order stays above it
+    db.session.add(Purchase(item_type='ingredient', item_id=shop['flour'], quantity=1000, unit='g',
+                            total_cost_cents=2000))
+    db.session.commit()
+    first = place_order(shop, day, shop['alice'], shop['shortbread'], sale_price=2000, flour_g=250)
+
+    events = read_events(client)
+    assert [kind for _, kind, _ in events] == ['low-stock', 'order', 'revenue']
+    assert events[0][2]['low'] is False
+    assert events[0][2]['current_stock'] == 1000
+    assert events[1][2]['id'] == first.id
+    assert events[1][2]['customer'] == 'Alice'
+    assert events[1][2]['recipe'] == 'Shortbread'
+    assert events[2][2] == {'date': '2024-03-05', 'revenue_cents': 2000, 'order_count': 1}
+
+    # Resuming after the last event only sends what came after it
+    last_id = events[-1][0]
+    place_order(shop, day + timedelta(days=1), shop['alice'], shop['shortbread'], sale_price=1500, flour_g=700)
+    first.sale_price_total_cents = 2500
+    db.session.commit()
+    db.session.delete(first)
+    db.session.commit()
+
+    events = read_events(client, last_id)
+    assert [kind for _, kind, _ in events] == ['order', 'revenue', 'low-stock', 'revenue', 'revenue', 'low-stock']
+    assert events[2][2]['low'] is True
+    assert events[2][2]['current_stock'] == 50
+    # Deleting the first order returns its flour to stock
+    assert events[5][2]['low'] is False
+    assert events[5][2]['current_stock'] == 300
+    assert [data for _, kind, data in events if kind == 'revenue'] == [
+        {'date': '2024-03-06', 'revenue_cents': 1500, 'order_count': 1},
+        {'date': '2024-03-05', 'revenue_cents': 500, 'order_count': 0},
+        {'date': '2024-03-05', 'revenue_cents': -2500, 'order_count': -1}
+    ]
+
+    # New streams start from now, and rolled back writes send nothing
+    assert read_events(client, last_id=events[-1][0]) == []
+    place_order(shop, day, shop['alice'], shop['shortbread'], sale_price=1000)
+    count = DashboardEvent.query.count()
+    db.session.add(Order(order_date=day, dough_weight_g=1, quantity_ordered=1, quantity_baked=1,
+                         sale_price_total_cents=100))
+    db.session.flush()
+    db.session.rollback()
+    db.session.commit()
+    assert DashboardEvent.query.count() == count
+
+
+def test_dashboard_events_cap(app, client):
+    """Test that streams past the per-process cap are refused until one closes."""
+    app.config['DASHBOARD_EVENTS_STREAM_SECONDS'] = 0
+    app.config['DASHBOARD_EVENTS_MAX_STREAMS'] = 1
+
+    first = client.get('/dashboard/events')
+    refused = client.get('/dashboard/events')
+    assert refused.status_code == 503
+    assert refused.headers['Retry-After'] == '5'
+
+    first.close()
+    second = client.get('/dashboard/events')
+    assert second.status_code == 200
+    assert second.get_data(as_text=True).startswith('retry: 5000')
+    second.close()
@@ -0,0 +1,64 @@
+from datetime import date, datetime, timedelta
+from order_helpers import get_order_page
+from conftest import count_statements, place_order
+
+
+def test_order_pages(app, shop):
+    """Test that pages follow (order_date, id) newest first, with ties on the same date."""
+    day = datetime(2024, 3, 5, 12, 0)
+    ids = [place_order(shop, day + timedelta(days=i // 2), shop['alice'], shop['shortbread']).id for i in range(5)]
+
+    seen = []
+    after = None
+    while True:
+        rows, after = get_order_page(after=after, limit=2)
+        seen.append([row.id for row in rows])
+        if after is None:
+            break
+
+    assert seen == [[ids[4], ids[3]], [ids[2], ids[1]], [ids[0]]]
+
+    row = get_order_page(limit=1)[0][0]
+    assert row.customer_name == 'Alice'
+    assert row.recipe_name == 'Shortbread'
+    assert row.total_cost_cents == 500
+    assert row.profit_cents == 1500
+
+
+def test_order_filters(app, shop):
+    """Test filtering by customer, recipe (0 for custom orders) and half-open date range."""
+    march = place_order(shop, datetime(2024, 3, 31, 18, 0), shop['alice'], shop['shortbread']).id
+    april = place_order(shop, datetime(2024, 4, 1, 9, 0), shop['store'], shop['ginger']).id
+    custom = place_order(shop, datetime(2024, 4, 2, 9, 0), shop['alice']).id
+
+    def ids(**filters):
+        return [row.id for row in get_order_page(**filters)[0]]
+
+    assert ids() == [custom, april, march]
+    assert ids(customer_id=shop['alice']) == [custom, march]
+    assert ids(recipe_id=shop['ginger']) == [april]
+    assert ids(recipe_id=0) == [custom]
+    assert ids(start_date=date(2024, 4, 1)) == [custom, april]
+    assert ids(end_date=date(2024, 4, 1)) == [march]
+    assert ids(customer_id=shop['alice'], start_date=date(2024, 4, 1), end_date=date(2024, 4, 2)) == []
+
+
+def test_orders_list(client, shop):
+    """Test the orders list page: filters, page links and a fixed number of statements."""
+    for days_ago in range(3):
+        place_order(shop, datetime(2024, 3, 10) - timedelta(days=days_ago), shop['store'], shop['ginger'])
+
+    few = count_statements(lambda: client.get('/orders/'))
+    for days_ago in range(3, 60):
+        place_order(shop, datetime(2024, 3, 10) - timedelta(days=days_ago), shop['alice'], shop['shortbread'])
+    assert count_statements(lambda: client.get('/orders/')) == few
+
+    response = client.get('/orders/')
+    assert response.data.count(b'deleteOrderModal') == 2 * 50
+    assert b'after=2024-01-' in response.data
+
+    response = client.get(f"/orders/?customer_id={shop['store']}&start=2024-03-09&end=2024-03-11")
+    assert response.data.count(b'Ginger Snap') == 2 + 1  # two rows plus the recipe filter option
+    assert b'Older' not in response.data
+
+    assert client.get('/orders/?start=2024-03-11&end=2024-03-09').status_code == 400
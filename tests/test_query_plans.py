@@ -0,0 +1,77 @@
+import re
+from datetime import date
+import pytest
+from sqlalchemy import func, select
+from models import db, Order, OrderIngredient, OrderPackaging, Purchase
+from cost_helpers import _latest_purchase_select
+from report_helpers import filter_order_dates, get_item_usage_select
+from export_helpers import orders_export_select
+from order_helpers import order_list_select
+
+# Matches a plan step that reads a whole table, e.g. "SCAN orders" or "SCAN TABLE orders"
+FULL_SCAN = re.compile(r'^SCAN (?:TABLE )?(\w+)(.*)$')
+
+
+def hot_queries():
+    """The query shapes behind price lookups, stock levels and reports."""
+    start, end = date(2024, 1, 1), date(2024, 2, 1)
+    return {
+        'latest price per item': _latest_purchase_select('ingredient', [1, 2, 3]),
+        'purchase history per item': select(
+            Purchase.purchase_date, Purchase.unit_cost_cents
+        ).where(
+            Purchase.item_type == 'ingredient', Purchase.item_id.in_([1, 2]), Purchase.unit_cost_cents > 0
+        ).order_by(Purchase.item_id, Purchase.purchase_date),
+        'purchased per item': select(
+            Purchase.item_type, Purchase.item_id, func.sum(Purchase.quantity)
+        ).group_by(Purchase.item_type, Purchase.item_id),
+        'ingredient usage per item': select(
+            OrderIngredient.ingredient_id, func.sum(OrderIngredient.amount_used)
+        ).group_by(OrderIngredient.ingredient_id),
+        'packaging usage per item': select(
+            OrderPackaging.packaging_id, func.sum(OrderPackaging.quantity_used)
+        ).group_by(OrderPackaging.packaging_id),
+        'usage of one ingredient': select(
+            func.sum(OrderIngredient.amount_used)
+        ).where(OrderIngredient.ingredient_id == 1),
+        'orders in date range': select(
+            func.sum(Order.sale_price_total_cents), func.count(Order.id)
+        ).where(Order.order_date >= start, Order.order_date < end),
+        'ingredient cost in date range': select(
+            func.sum(OrderIngredient.cost_at_time_of_use_cents)
+        ).join(Order, Order.id == OrderIngredient.order_id).where(Order.order_date >= start, Order.order_date < end),
+        'packaging cost in date range': select(
+            func.sum(OrderPackaging.cost_at_time_of_use_cents)
+        ).join(Order, Order.id == OrderPackaging.order_id).where(Order.order_date >= start, Order.order_date < end),
+        'report range': filter_order_dates(select(func.count(Order.id)), start, end),
+        'report range from start': filter_order_dates(select(func.count(Order.id)), start, None),
+        'report range until end': filter_order_dates(select(func.count(Order.id)), None, end),
+        'ingredient usage in report range': get_item_usage_select('ingredient', start, end),
+        'orders export in report range': orders_export_select(start, end),
+        'orders for customer': select(Order.id).where(Order.customer_id == 1),
+        'orders for recipe': select(func.count(Order.id)).where(Order.recipe_id == 1),
+        'orders list page': order_list_select().limit(51),
+        'orders list for customer': order_list_select(customer_id=1).limit(51),
+        'orders list for recipe in range': order_list_select(recipe_id=1, start_date=start, end_date=end).limit(51)
+    }
+
+
+def full_table_scans(statement):
+    """Run EXPLAIN QUERY PLAN and return any plan steps that scan a whole table."""
+    compiled = statement.compile(dialect=db.engine.dialect, compile_kwargs={'literal_binds': True})
+    plan = db.session.connection().exec_driver_sql(f'EXPLAIN QUERY PLAN {compiled}').all()
+
+    tables = set(db.metadata.tables)
+    scans = []
+    for row in plan:
+        detail = row[-1]
+        match = FULL_SCAN.match(detail)
+        if match and match.group(1) in tables and 'USING' not in match.group(2):
+            scans.append(detail)
+    return scans
+
+
+@pytest.mark.parametrize('name', sorted(hot_queries()))
+def test_hot_query_uses_index(app, name):
+    """Test that each hot query is answered from an index, not a full table scan."""
+    assert full_table_scans(hot_queries()[name]) == []
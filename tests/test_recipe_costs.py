@@ -0,0 +1,114 @@
+import pytest
+from models import db, Ingredient, Purchase, Recipe, RecipeIngredient
+import recipe_helpers
+from recipe_helpers import get_recipe_cost, get_recipe_costs, recipe_cost_cache
+
+
+@pytest.fixture
+def recipe(app):
+    """Create a recipe with priced ingredients."""
+    flour = Ingredient(name='Flour', default_unit='g', default_price_per_unit_cents=2)
+    butter = Ingredient(name='Butter', default_unit='g', default_price_per_unit_cents=10)
+    db.session.add_all([flour, butter])
+    db.session.commit()
+
+    recipe = Recipe(name='Shortbread', dough_weight_per_cookie_g=20, yield_cookies=20)
+    db.session.add(recipe)
+    db.session.flush()
+    db.session.add_all([
+        RecipeIngredient(recipe_id=recipe.id, ingredient_id=flour.id, quantity=300),  # 600 cents
+        RecipeIngredient(recipe_id=recipe.id, ingredient_id=butter.id, quantity=100)  # 1000 cents
+    ])
+    db.session.commit()
+    return recipe
+
+
+def test_get_recipe_cost(app, recipe):
+    """Test batch, per-gram and per-cookie recipe costs."""
+    costing = get_recipe_cost(recipe.id)
+
+    assert costing['batch_cost_cents'] == 1600
+    assert costing['batch_dough_weight_g'] == 400
+    assert costing['cost_per_gram_millicents'] == 4000
+    assert costing['cost_per_cookie_cents'] == 80
+    assert costing['unpriced_ingredient_ids'] == []
+    assert get_recipe_cost(999) is None
+
+
+def test_recipe_cost_cache_invalidation(app, recipe):
+    """Test that cached costs are dropped on ingredient and price changes."""
+    app.config['RECIPE_COST_CACHE_ENABLED'] = True
+    recipe_cost_cache.clear()
+
+    assert get_recipe_cost(recipe.id)['batch_cost_cents'] == 1600
+    assert get_recipe_cost(recipe.id)['batch_cost_cents'] == 1600
+    assert recipe_cost_cache.stats()['hits'] == 1
+
+    # A flour purchase at 3 cents per gram changes the price
+    flour = Ingredient.query.filter_by(name='Flour').one()
+    purchase = Purchase(item_type='ingredient', item_id=flour.id, quantity=1000, unit='g', total_cost_cents=3000)
+    purchase.calculate_unit_cost()
+    db.session.add(purchase)
+    db.session.commit()
+    assert get_recipe_cost(recipe.id)['batch_cost_cents'] == 1900
+
+    # Replacing the ingredient list with a bulk delete drops the costing too
+    RecipeIngredient.query.filter_by(recipe_id=recipe.id, ingredient_id=flour.id).delete()
+    db.session.commit()
+    assert get_recipe_cost(recipe.id)['batch_cost_cents'] == 1000
+
+    recipe_cost_cache.clear()
+
+
+def test_recipe_cost_cache_rollback(app, recipe):
+    """Test that a costing cached mid-transaction is dropped when the transaction rolls back."""
+    app.config['RECIPE_COST_CACHE_ENABLED'] = True
+    recipe_cost_cache.clear()
+
+    flour = Ingredient.query.filter_by(name='Flour').one()
+    purchase = Purchase(item_type='ingredient', item_id=flour.id, quantity=1000, unit='g', total_cost_cents=3000)
+    purchase.calculate_unit_cost()
+    db.session.add(purchase)
+    db.session.flush()
+    assert get_recipe_cost(recipe.id)['batch_cost_cents'] == 1900
+
+    db.session.rollback()
+    assert get_recipe_cost(recipe.id)['batch_cost_cents'] == 1600
+
+    recipe_cost_cache.clear()
+
+
+def test_recipe_cost_cache_skips_stale_sets(app, recipe, monkeypatch):
+    """Test that a costing computed across an invalidation is not cached."""
+    app.config['RECIPE_COST_CACHE_ENABLED'] = True
+    recipe_cost_cache.clear()
+    cost_recipes = recipe_helpers._cost_recipes
+
+    def cost_during_commit(recipes):
+        # Another thread commits a price change while this costing is in flight
+        costings = cost_recipes(recipes)
+        recipe_cost_cache.clear()
+        return costings
+
+    monkeypatch.setattr(recipe_helpers, '_cost_recipes', cost_during_commit)
+    assert get_recipe_cost(recipe.id)['batch_cost_cents'] == 1600
+    assert len(recipe_cost_cache) == 0
+
+    monkeypatch.setattr(recipe_helpers, '_cost_recipes', cost_recipes)
+    assert get_recipe_cost(recipe.id)['batch_cost_cents'] == 1600
+    assert len(recipe_cost_cache) == 1
+
+    recipe_cost_cache.clear()
+
+
+def test_recipe_cost_endpoints(client, recipe):
+    """Test the single and bulk recipe cost endpoints."""
+    response = client.get(f'/recipes/{recipe.id}/cost')
+    assert response.status_code == 200
+    assert response.get_json()['cost_per_cookie_cents'] == 80
+
+    assert client.get('/recipes/999/cost').status_code == 404
+
+    response = client.get('/recipes/api/costs')
+    assert [costing['name'] for costing in response.get_json()] == ['Shortbread']
+    assert list(get_recipe_costs()) == [recipe.id]
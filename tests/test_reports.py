@@ -0,0 +1,297 @@
+import csv
+import io
+import pyarrow.parquet as pq
+import pytest
+from datetime import datetime, timedelta
+from models import db, Customer, Ingredient, Packaging, Order, OrderIngredient, OrderPackaging, Purchase, Recipe
+import scheduled_jobs
+from report_helpers import get_data_version, get_report_summary, get_profit_page, get_profit_totals, get_trend_data, report_cache
+from conftest import count_statements
+
+
+@pytest.fixture
+def orders(app):
+    """Create two orders this month, each with several cost lines."""
+    flour = Ingredient(name='Flour', default_unit='g')
+    sugar = Ingredient(name='Sugar', default_unit='g')
+    box = Packaging(name='Box', default_unit='pcs')
+    bag = Packaging(name='Bag', default_unit='pcs')
+    customer = Customer(name='Alice', customer_type='friend')
+    db.session.add_all([flour, sugar, box, bag, customer])
+    db.session.flush()
+
+    today = datetime.now().replace(hour=12, minute=0, second=0, microsecond=0)
+    for customer_id, sale_price in ((customer.id, 5000), (None, 3000)):
+        order = Order(order_date=today, customer_id=customer_id, dough_weight_g=500, quantity_ordered=12,
+                      quantity_baked=12, sale_price_total_cents=sale_price)
+        db.session.add(order)
+        db.session.flush()
+        db.session.add_all([
+            OrderIngredient(order_id=order.id, ingredient_id=flour.id, amount_used=300, cost_at_time_of_use_cents=600),
+            OrderIngredient(order_id=order.id, ingredient_id=sugar.id, amount_used=200, cost_at_time_of_use_cents=400),
+            OrderPackaging(order_id=order.id, packaging_id=box.id, quantity_used=1, cost_at_time_of_use_cents=150),
+            OrderPackaging(order_id=order.id, packaging_id=bag.id, quantity_used=2, cost_at_time_of_use_cents=50)
+        ])
+    db.session.commit()
+
+
+def test_get_trend_data(app, orders):
+    """Test that every metric comes out right for a bucket with several lines per order."""
+    rows, bucket = get_trend_data('month')
+
+    assert bucket == 'day'
+    assert len(rows) == 1
+    row = rows[0]
+    assert row['revenue'] == 8000
+    assert row['ingredient_cost'] == 2000
+    assert row['packaging_cost'] == 400
+    assert row['total_cost'] == 2400
+    assert row['profit'] == 5600
+    assert row['cookies'] == 24
+    assert row['order_count'] == 2
+
+    rows, bucket = get_trend_data('month', bucket='month')
+    assert bucket == 'month'
+    assert [row['revenue'] for row in rows] == [8000]
+
+
+def test_report_cache(client, app, orders):
+    """Test that report results are reused until the data version changes."""
+    app.config['REPORT_CACHE_ENABLED'] = True
+    report_cache.clear()
+
+    assert get_trend_data('year')[0][0]['revenue'] == 8000
+    assert get_trend_data('year')[0][0]['revenue'] == 8000
+    assert report_cache.stats()['hits'] == 1
+
+    # Equivalent requests share an entry
+    client.get('/reports/profit')
+    client.get('/reports/profit?period=all')
+    stats = client.get('/reports/api/cache-stats').get_json()
+    assert (stats['hits'], stats['misses'], stats['size']) == (2, 2, 2)
+
+    # Writes bump the data version, so the next read recomputes
+    version = get_data_version()
+    order = Order.query.first()
+    order.sale_price_total_cents = 6000
+    db.session.commit()
+    assert get_data_version() > version
+    assert get_trend_data('year')[0][0]['revenue'] == 9000
+
+    version = get_data_version()
+    flour = Ingredient.query.filter_by(name='Flour').one()
+    db.session.add(Purchase(item_type='ingredient', item_id=flour.id, quantity=1000, unit='g', total_cost_cents=500))
+    db.session.commit()
+    assert get_data_version() > version
+
+    report_cache.clear()
+
+
+def test_report_summary(client, app, orders):
+    """Test the reports index summary, including custom orders among the top recipes."""
+    recipe = Recipe(name='Oatmeal', dough_weight_per_cookie_g=40)
+    db.session.add(recipe)
+    db.session.flush()
+    db.session.add(Order(order_date=datetime.now(), recipe_id=recipe.id, dough_weight_g=100,
+                         quantity_ordered=6, quantity_baked=6, sale_price_total_cents=1000))
+    db.session.commit()
+
+    summaries = []
+    assert count_statements(lambda: summaries.append(get_report_summary())) == 1
+    summary = summaries[0]
+    assert summary['orders_count'] == 3
+    assert summary['total_revenue_cents'] == 9000
+    assert summary['total_cost_cents'] == 2400
+    assert summary['total_profit_cents'] == 6600
+    assert summary['total_cookies'] == 30
+    assert [(row.name, row.order_count, row.revenue) for row in summary['top_customers']] == [('Alice', 1, 5000)]
+    assert [(row.name, row.order_count) for row in summary['top_recipes']] == [('Custom', 2), ('Oatmeal', 1)]
+
+    response = client.get('/reports/')
+    assert response.status_code == 200
+    assert b'Oatmeal' in response.data
+
+
+def test_warm_reports_after_writes_settle(client, app, orders, monkeypatch):
+    """Test that the scheduled job recomputes the standard reports once per burst of writes."""
+    app.config['REPORT_CACHE_ENABLED'] = True
+    report_cache.clear()
+    monkeypatch.setattr(scheduled_jobs, 'flask_app', app)
+    monkeypatch.setattr(scheduled_jobs, '_report_warm_state', {'seen': None, 'warmed': None})
+
+    # Startup computes every variant, and requests are then served from the cache
+    assert scheduled_jobs.warm_reports() == 16
+    client.get('/reports/profit?period=6months')
+    client.get('/reports/inventory?period=3months')
+    client.get('/reports/api/trend-data?period=year')
+    stats = report_cache.stats()
+    assert (stats['hits'], stats['misses']) == (3, 16)
+    assert not scheduled_jobs.warm_reports_if_changed()
+
+    # Writes only mark the reports stale until a check finds nothing new
+    order = Order.query.first()
+    order.sale_price_total_cents = 6000
+    db.session.commit()
+    assert not scheduled_jobs.warm_reports_if_changed()
+    order.sale_price_total_cents = 7000
+    db.session.commit()
+    assert not scheduled_jobs.warm_reports_if_changed()
+    assert scheduled_jobs.warm_reports_if_changed()
+    assert not scheduled_jobs.warm_reports_if_changed()
+
+    hits = report_cache.stats()['hits']
+    response = client.get('/reports/profit?period=month')
+    assert b'$100.0' in response.data
+    assert report_cache.stats()['hits'] == hits + 1
+
+    report_cache.clear()
+
+
+def test_warm_reports_skips_unmigrated_database(app, monkeypatch):
+    """Test that warming before migrations skips quietly instead of failing."""
+    app.config['REPORT_CACHE_ENABLED'] = True
+    monkeypatch.setattr(scheduled_jobs, 'flask_app', app)
+    monkeypatch.setattr(scheduled_jobs, '_report_warm_state', {'seen': None, 'warmed': None})
+    db.drop_all()
+
+    assert scheduled_jobs.warm_reports() == 0
+    assert not scheduled_jobs.warm_reports_if_changed()
+
+    db.create_all()
+
+
+def test_trend_endpoints_agree(client, orders):
+    """Test that the page, chart API and CSV export show the same totals."""
+    response = client.get('/reports/trends?period=month')
+    assert response.status_code == 200
+    assert b'$80.0' in response.data
+
+    data = client.get('/reports/api/trend-data?period=month').get_json()
+    revenue, costs, profits = (dataset['data'] for dataset in data['financialChart']['datasets'])
+    assert (revenue, costs, profits) == ([80.0], [24.0], [56.0])
+    assert data['cookieChart']['datasets'][0]['data'] == [24]
+
+    response = client.get('/reports/export/trends-csv?period=month')
+    rows = list(csv.reader(io.StringIO(response.get_data(as_text=True))))
+    assert len(rows) == 2
+    assert rows[1][1:] == ['80.00', '20.00', '4.00', '24.00', '56.00', '24']
+
+
+def test_exports_stream(client, orders):
+    """Test that CSV exports are streamed with joined names and correct costs."""
+    response = client.get('/reports/export/profit-csv?period=month')
+    assert response.is_streamed
+    rows = list(csv.reader(io.StringIO(response.get_data(as_text=True))))
+    assert [row[2:4] for row in rows[1:]] == [['N/A', 'Custom'], ['Alice', 'Custom']]
+    assert rows[2][5:] == ['50.00', '10.00', '2.00', '12.00', '38.00', '76.00']
+
+    response = client.get('/reports/export/inventory-csv')
+    assert response.is_streamed
+    rows = list(csv.reader(io.StringIO(response.get_data(as_text=True))))
+    assert rows[2] == ['1', 'Flour', 'g', '600.00', '12.00']
+    assert rows[rows.index(['PACKAGING']) + 2] == ['1', 'Box', 'pcs', '2.00', '3.00']
+
+
+def test_custom_report_range(client, orders):
+    """Test that start and end select a half-open range on every report and export."""
+    for order_date, sale_price in ((datetime(2024, 3, 5), 1000), (datetime(2024, 3, 5, 23, 59), 2000),
+                                   (datetime(2024, 3, 6), 4000)):
+        db.session.add(Order(order_date=order_date, dough_weight_g=100, quantity_ordered=1,
+                             quantity_baked=1, sale_price_total_cents=sale_price))
+    db.session.commit()
+    day = 'start=2024-03-05&end=2024-03-06'
+
+    # Midnight at the start is in, midnight at the end is out
+    response = client.get(f'/reports/profit?{day}')
+    assert b'$30.0' in response.data
+    assert b'$40.0' not in response.data
+
+    rows = list(csv.reader(io.StringIO(client.get(f'/reports/export/profit-csv?{day}').get_data(as_text=True))))
+    assert [row[5] for row in rows[1:]] == ['20.00', '10.00']
+
+    response = client.get(f'/reports/export/inventory-csv?{day}')
+    assert 'inventory_report_2024-03-05_2024-03-06_' in response.headers['Content-Disposition']
+
+    data = client.get(f'/reports/api/trend-data?{day}').get_json()
+    assert data['financialChart']['labels'] == ['Mar 05']
+    assert data['financialChart']['datasets'][0]['data'] == [30.0]
+
+    # An open end runs to the latest order; the range links keep it
+    rows = list(csv.reader(io.StringIO(client.get('/reports/export/profit-csv?start=2024-03-06').get_data(as_text=True))))
+    assert len(rows) == 4
+    response = client.get('/reports/trends?start=2024-03-05')
+    assert b'start=2024-03-05' in response.data
+
+    assert client.get('/reports/profit?start=2024-03-06&end=2024-03-05').status_code == 400
+    assert client.get('/reports/inventory?start=yesterday').status_code == 400
+
+
+def test_profit_pages(app, orders):
+    """Test keyset pages cover every order once, newest first, with SQL totals."""
+    now = datetime.now().replace(hour=12, minute=0, second=0, microsecond=0)
+    for days_ago in (1, 1, 2):
+        db.session.add(Order(order_date=now - timedelta(days=days_ago), dough_weight_g=100,
+                             quantity_ordered=1, quantity_baked=1, sale_price_total_cents=1000))
+    db.session.commit()
+
+    seen = []
+    after = None
+    while True:
+        rows, after = get_profit_page(after=after, limit=2)
+        seen.extend((row['date'], row['id']) for row in rows)
+        if after is None:
+            break
+
+    assert len(seen) == 5
+    assert seen == sorted(seen, reverse=True)
+
+    totals = get_profit_totals()
+    assert totals['order_count'] == 5
+    assert totals['revenue'] == 11000
+    assert totals['total_cost'] == 2400
+    assert totals['profit'] == 8600
+
+
+def test_profit_report_page(client, orders):
+    """Test the profit report page and its page links."""
+    response = client.get('/reports/profit')
+    assert response.status_code == 200
+    assert b'Alice' in response.data
+
+    first_id = Order.query.order_by(Order.id).first().id
+    key = db.session.get(Order, first_id + 1).order_date.isoformat()
+    response = client.get(f'/reports/profit?after={key}_{first_id + 1}')
+    assert response.status_code == 200
+    assert b'Alice' in response.data
+    assert b'Newest' in response.data
+
+    assert client.get('/reports/profit?after=garbage').status_code == 200
+
+
+def test_export_selects(app, orders):
+    """Test the rows behind the Parquet exports keep integer cents."""
+    from export_helpers import PARQUET_COLUMNS, cost_lines_export_select, orders_export_select
+
+    order_rows = db.session.execute(orders_export_select()).all()
+    assert len(order_rows[0]) == len(PARQUET_COLUMNS['orders'])
+    assert [(row.customer_type, row.sale_price_total_cents, row.total_cost_cents) for row in order_rows] == [
+        ('friend', 5000, 1200), (None, 3000, 1200)
+    ]
+
+    line_rows = db.session.execute(cost_lines_export_select()).all()
+    assert len(line_rows[0]) == len(PARQUET_COLUMNS['cost-lines'])
+    assert len(line_rows) == 8
+    assert sum(row[-1] for row in line_rows) == 2400
+
+
+def test_parquet_export(client, orders):
+    """Test that Parquet exports load back with typed columns."""
+    response = client.get('/reports/export/orders.parquet')
+    assert response.status_code == 200
+    table = pq.read_table(io.BytesIO(response.data))
+    assert table.column('sale_price_total_cents').to_pylist() == [5000, 3000]
+    assert str(table.schema.field('profit_cents').type) == 'int64'
+
+    response = client.get('/reports/export/cost-lines.parquet')
+    table = pq.read_table(io.BytesIO(response.data))
+    assert sum(table.column('cost_cents').to_pylist()) == 2400
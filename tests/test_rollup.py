@@ -0,0 +1,89 @@
+from datetime import datetime, timedelta
+from sqlalchemy import delete
+from models import db, Customer, Order, DailySalesRollup
+from dashboard_helpers import get_dashboard_summary
+from rollup_helpers import rebuild_sales_rollup
+from conftest import place_order
+
+
+def rollup_rows():
+    """Current rollup rows as plain tuples."""
+    return sorted(
+        (row.sale_date, row.customer_type, row.recipe_id, row.revenue_cents,
+         row.ingredient_cost_cents, row.cookies_baked, row.order_count)
+        for row in DailySalesRollup.query.all()
+    )
+
+
+def test_rollup_follows_orders(app, shop):
+    """Test that the rollup is kept up to date as orders change."""
+    day = datetime(2024, 3, 5, 15, 30)
+    first = place_order(shop, day, shop['store'])
+    place_order(shop, day, shop['store'], sale_price=3000)
+    place_order(shop, day + timedelta(hours=2))
+
+    assert rollup_rows() == [
+        (day.date(), '', 0, 2000, 500, 10, 1),
+        (day.date(), 'store', 0, 5000, 1000, 20, 2)
+    ]
+
+    # Moving an order to another day updates both days
+    first.order_date = day + timedelta(days=1)
+    db.session.commit()
+    assert rollup_rows() == [
+        (day.date(), '', 0, 2000, 500, 10, 1),
+        (day.date(), 'store', 0, 3000, 500, 10, 1),
+        (day.date() + timedelta(days=1), 'store', 0, 2000, 500, 10, 1)
+    ]
+
+    # Changing a customer's type moves their orders to the new split
+    store = db.session.get(Customer, shop['store'])
+    store.customer_type = 'friend'
+    db.session.commit()
+    assert [row[1] for row in rollup_rows()] == ['', 'friend', 'friend']
+
+    # Deleting an order removes it from its day
+    db.session.delete(first)
+    db.session.commit()
+    assert rollup_rows() == [
+        (day.date(), '', 0, 2000, 500, 10, 1),
+        (day.date(), 'friend', 0, 3000, 500, 10, 1)
+    ]
+
+    # A rebuild from scratch agrees with the incremental updates
+    incremental = rollup_rows()
+    assert rebuild_sales_rollup() == 2
+    assert rollup_rows() == incremental
+
+
+def test_rolled_back_orders_leave_rollup_alone(app, shop):
+    """Test that an order rolled back before commit never reaches the rollup."""
+    order = Order(order_date=datetime(2024, 3, 5), dough_weight_g=100, quantity_ordered=1,
+                  quantity_baked=1, sale_price_total_cents=500)
+    db.session.add(order)
+    db.session.flush()
+    db.session.rollback()
+
+    place_order(shop, datetime(2024, 3, 6))
+    assert [row[0] for row in rollup_rows()] == [datetime(2024, 3, 6).date()]
+
+
+def test_dashboard_reads_rollup(client, shop):
+    """Test the dashboard's 30-day comparison from the rollup."""
+    now = datetime.now()
+    place_order(shop, now - timedelta(days=1), sale_price=4000)
+    place_order(shop, now - timedelta(days=40), sale_price=2000)
+
+    summary = get_dashboard_summary()
+    current, previous = summary['current'], summary['previous']
+    assert (current['revenue'], current['profit'], current['order_count']) == (4000, 3500, 1)
+    assert (previous['revenue'], previous['profit'], previous['order_count']) == (2000, 1500, 1)
+
+    response = client.get('/dashboard/panels/kpis')
+    assert response.status_code == 200
+    assert b'$40.0' in response.data
+
+    # The figures come from the rollup rows, not the orders
+    db.session.execute(delete(DailySalesRollup.__table__))
+    db.session.commit()
+    assert get_dashboard_summary()['current']['revenue'] == 0
@@ -0,0 +1,85 @@
+import pytest
+from models import db, Ingredient, Packaging, Purchase, Order, OrderIngredient, OrderPackaging
+from stock_helpers import get_stock_levels, get_stock_map, get_low_stock_items, reconcile_inventory_balances
+
+
+@pytest.fixture
+def stock_data(app):
+    """Create items with purchases and order usage."""
+    flour = Ingredient(name='Flour', default_unit='g', low_stock_threshold=500)
+    sugar = Ingredient(name='Sugar', default_unit='g', low_stock_threshold=100)
+    salt = Ingredient(name='Salt', default_unit='g')  # No threshold, never low
+    box = Packaging(name='Small Box', default_unit='pcs', low_stock_threshold=5)
+    db.session.add_all([flour, sugar, salt, box])
+    db.session.commit()
+
+    db.session.add_all([
+        Purchase(item_type='ingredient', item_id=flour.id, quantity=1000, unit='g', total_cost_cents=400),
+        Purchase(item_type='ingredient', item_id=flour.id, quantity=-100, unit='g', total_cost_cents=0, unit_cost_cents=0),
+        Purchase(item_type='ingredient', item_id=sugar.id, quantity=500, unit='g', total_cost_cents=300),
+        Purchase(item_type='packaging', item_id=box.id, quantity=10, unit='pcs', total_cost_cents=400)
+    ])
+
+    order = Order(dough_weight_g=600, quantity_ordered=24, quantity_baked=24, sale_price_total_cents=2400)
+    db.session.add(order)
+    db.session.flush()
+    db.session.add_all([
+        OrderIngredient(order_id=order.id, ingredient_id=flour.id, amount_used=600, cost_at_time_of_use_cents=0),
+        OrderIngredient(order_id=order.id, ingredient_id=salt.id, amount_used=5, cost_at_time_of_use_cents=0),
+        OrderPackaging(order_id=order.id, packaging_id=box.id, quantity_used=6, cost_at_time_of_use_cents=0)
+    ])
+    db.session.commit()
+
+    return {'flour': flour, 'sugar': sugar, 'salt': salt, 'box': box}
+
+
+def test_get_stock_levels(app, stock_data):
+    """Test purchased-minus-used stock levels for every item."""
+    levels = {item.name: stock for item, stock in get_stock_levels('ingredient')}
+    assert levels == {'Flour': 300, 'Salt': -5, 'Sugar': 500}
+
+    assert get_stock_map('packaging') == {stock_data['box'].id: 4}
+    assert get_stock_map('ingredient', [stock_data['sugar'].id]) == {stock_data['sugar'].id: 500}
+
+
+def test_get_low_stock_items(app, stock_data):
+    """Test that only items at or below a set threshold are reported."""
+    low_stock_ingredients, low_stock_packaging = get_low_stock_items()
+
+    assert [entry['item'].name for entry in low_stock_ingredients] == ['Flour']
+    assert low_stock_ingredients[0]['current_stock'] == 300
+    assert low_stock_ingredients[0]['threshold'] == 500
+
+    assert [entry['item'].name for entry in low_stock_packaging] == ['Small Box']
+    assert low_stock_packaging[0]['current_stock'] == 4
+
+
+def test_balances_follow_writes(app, stock_data):
+    """Test that running balances follow purchase edits and order deletes."""
+    flour_id = stock_data['flour'].id
+
+    purchase = Purchase.query.filter_by(item_type='ingredient', item_id=flour_id, total_cost_cents=400).one()
+    purchase.quantity = 1200
+    db.session.commit()
+    assert get_stock_map('ingredient', [flour_id]) == {flour_id: 500}
+
+    # Deleting the order cascades to its lines and returns their stock
+    db.session.delete(Order.query.one())
+    db.session.commit()
+    assert get_stock_map('ingredient', [flour_id]) == {flour_id: 1100}
+    assert get_stock_map('packaging') == {stock_data['box'].id: 10}
+
+
+def test_reconcile_inventory_balances(app, stock_data):
+    """Test that reconciliation reports drift and restores ledger values."""
+    from models import InventoryBalance
+
+    assert reconcile_inventory_balances() == []
+
+    balance = db.session.get(InventoryBalance, ('ingredient', stock_data['sugar'].id))
+    balance.quantity = 42
+    db.session.commit()
+
+    drift = reconcile_inventory_balances()
+    assert drift == [{'item_type': 'ingredient', 'item_id': stock_data['sugar'].id, 'balance': 42, 'ledger': 500}]
+    assert get_stock_map('ingredient', [stock_data['sugar'].id]) == {stock_data['sugar'].id: 500}
@@ -1,137 +1,156 @@
-from flask import Blueprint, render_template
-from models import db, Customer, Recipe, Order, Ingredient, Packaging, OrderIngredient, OrderPackaging
-from cost_helpers import get_low_stock_items
-from sqlalchemy import func
-from datetime import datetime, timedelta
-from sqlalchemy.sql import desc
+import time
+from flask import Blueprint, render_template, request, jsonify, Response, current_app, abort, stream_with_context
+from models import db
+from stock_helpers import get_low_stock_items
+from dashboard_helpers import get_dashboard_summary, get_dashboard_charts, get_recent_orders
+from event_helpers import (
+    open_event_stream, close_event_stream, get_events_generation, wait_for_events,
+    get_last_event_id, get_events_after, format_sse, EVENT_BATCH_SIZE
+)
 
 dashboard_bp = Blueprint('dashboard', __name__)
 
 
 @dashboard_bp.route('/')
 def index():
-    """Render the dashboard homepage with stats."""
-    # Get counts for dashboard
-    stats = {
-        'customer_count': Customer.query.count(),
-        'recipe_count': Recipe.query.count(),
-        'order_count': Order.query.count(),
-        'ingredient_count': Ingredient.query.count(),
-        'packaging_count': Packaging.query.count()
-    }
-    
-    # Get low stock items
-    low_stock_ingredients, low_stock_packaging = get_low_stock_items()
-    
-    # Get financial stats for current period (last 30 days)
-    today = datetime.now().date()
-    thirty_days_ago = today - timedelta(days=30)
-    sixty_days_ago = today - timedelta(days=60)
-    
-    # Current period stats (last 30 days)
-    current_period_stats = db.session.query(
-        func.sum(Order.sale_price_total_cents).label('revenue'),
-        func.count(Order.id).label('order_count'),
-        func.sum(Order.quantity_baked).label('cookies_baked')
-    ).filter(
-        Order.order_date >= thirty_days_ago
-    ).first()
-    
-    # Previous period stats (30-60 days ago) for comparison
-    previous_period_stats = db.session.query(
-        func.sum(Order.sale_price_total_cents).label('revenue'),
-        func.count(Order.id).label('order_count'),
-        func.sum(Order.quantity_baked).label('cookies_baked')
-    ).filter(
-        Order.order_date >= sixty_days_ago,
-        Order.order_date < thirty_days_ago
-    ).first()
-    
-    # Calculate ingredient costs
-    ingredient_costs_query = db.session.query(
-        func.sum(OrderIngredient.cost_at_time_of_use_cents).label('ingredient_cost')
-    ).join(Order, Order.id == OrderIngredient.order_id) \
-     .filter(Order.order_date >= thirty_days_ago)
-    
-    # Calculate packaging costs
-    packaging_costs_query = db.session.query(
-        func.sum(OrderPackaging.cost_at_time_of_use_cents).label('packaging_cost')
-    ).join(Order, Order.id == OrderPackaging.order_id) \
-     .filter(Order.order_date >= thirty_days_ago)
-    
-    current_ingredient_costs = ingredient_costs_query.first()
-    current_packaging_costs = packaging_costs_query.first()
-    
-    # Calculate previous period ingredient costs
-    previous_ingredient_costs_query = db.session.query(
-        func.sum(OrderIngredient.cost_at_time_of_use_cents).label('ingredient_cost')
-    ).join(Order, Order.id == OrderIngredient.order_id) \
-     .filter(
-        Order.order_date >= sixty_days_ago,
-        Order.order_date < thirty_days_ago
-     )
-    
-    # Calculate previous period packaging costs
-    previous_packaging_costs_query = db.session.query(
-        func.sum(OrderPackaging.cost_at_time_of_use_cents).label('packaging_cost')
-    ).join(Order, Order.id == OrderPackaging.order_id) \
-     .filter(
-        Order.order_date >= sixty_days_ago,
-        Order.order_date < thirty_days_ago
-     )
-    
-    previous_ingredient_costs = previous_ingredient_costs_query.first()
-    previous_packaging_costs = previous_packaging_costs_query.first()
-    
-    # Dashboard metrics
-    revenue = current_period_stats.revenue or 0
-    order_count = current_period_stats.order_count or 0
-    cookies_baked = current_period_stats.cookies_baked or 0
-    
-    # Cost and profit calculations
-    ingredient_cost = current_ingredient_costs.ingredient_cost or 0
-    packaging_cost = current_packaging_costs.packaging_cost or 0
-    total_cost = ingredient_cost + packaging_cost
-    profit = revenue - total_cost
-    
-    # Previous period values for comparison
-    prev_revenue = previous_period_stats.revenue or 0
-    prev_order_count = previous_period_stats.order_count or 0
-    prev_cookies_baked = previous_period_stats.cookies_baked or 0
-    
-    prev_ingredient_cost = previous_ingredient_costs.ingredient_cost or 0
-    prev_packaging_cost = previous_packaging_costs.packaging_cost or 0
-    prev_total_cost = prev_ingredient_cost + prev_packaging_cost
-    prev_profit = prev_revenue - prev_total_cost
-    
-    # Calculate percentage changes
-    revenue_change = calculate_percentage_change(revenue, prev_revenue)
-    profit_change = calculate_percentage_change(profit, prev_profit)
-    order_change = calculate_percentage_change(order_count, prev_order_count)
-    cookies_change = calculate_percentage_change(cookies_baked, prev_cookies_baked)
-    
-    # Get recent orders
-    recent_orders = Order.query.order_by(Order.order_date.desc()).limit(5).all()
+    """Render the dashboard shell; each panel is fetched separately."""
+    return render_template('dashboard.html')
+
+
+def kpi_panel():
+    """Revenue, profit, orders and cookies for the last 30 days against the 30 before."""
+    # Entity counts and both periods come from one statement over the rollup
+    summary = get_dashboard_summary()
+    current = summary['current']
+    previous = summary['previous']
     
     dashboard_data = {
-        'revenue_cents': revenue,
-        'profit_cents': profit,
-        'order_count': order_count,
-        'cookies_baked': cookies_baked,
-        'revenue_change': revenue_change,
-        'profit_change': profit_change,
-        'order_change': order_change,
-        'cookies_change': cookies_change
+        'revenue_cents': current['revenue'],
+        'profit_cents': current['profit'],
+        'order_count': current['order_count'],
+        'cookies_baked': current['cookies_baked'],
+        'revenue_change': calculate_percentage_change(current['revenue'], previous['revenue']),
+        'profit_change': calculate_percentage_change(current['profit'], previous['profit']),
+        'order_change': calculate_percentage_change(current['order_count'], previous['order_count']),
+        'cookies_change': calculate_percentage_change(current['cookies_baked'], previous['cookies_baked'])
     }
     
-    return render_template(
-        'dashboard.html',
-        stats=stats,
-        dashboard=dashboard_data,
-        recent_orders=recent_orders,
-        low_stock_ingredients=low_stock_ingredients,
-        low_stock_packaging=low_stock_packaging
-    )
+    return render_template('dashboard/kpis.html', stats=summary['counts'], dashboard=dashboard_data)
+
+
+def low_stock_panel():
+    """Ingredients and packaging at or below their low stock threshold."""
+    low_stock_ingredients, low_stock_packaging = get_low_stock_items()
+    return render_template('dashboard/low_stock.html',
+                           low_stock_ingredients=low_stock_ingredients,
+                           low_stock_packaging=low_stock_packaging)
+
+
+def recent_orders_panel():
+    """The latest orders."""
+    return render_template('dashboard/recent_orders.html', recent_orders=get_recent_orders())
+
+
+# HTML fragment panels, by name
+PANELS = {
+    'kpis': kpi_panel,
+    'low-stock': low_stock_panel,
+    'recent-orders': recent_orders_panel
+}
+
+
+@dashboard_bp.route('/dashboard/panels/<name>')
+def panel(name):
+    """Render one dashboard panel as an HTML fragment."""
+    if name not in PANELS:
+        abort(404)
+    return _cacheable(PANELS[name](), name)
+
+
+@dashboard_bp.route('/dashboard/api/charts')
+def api_charts():
+    """API endpoint for the dashboard chart data."""
+    charts = get_dashboard_charts()
+    
+    # Prepare data for charts
+    revenue = [value / 100 for value in charts['revenue']]  # Convert cents to dollars
+    profit = [value / 100 for value in charts['profit']]
+    
+    return _cacheable(jsonify({
+        'months': charts['months'],
+        'revenue': revenue,
+        'profit': profit,
+        'topCookies': {
+            'labels': [row['name'] for row in charts['top_cookies']],
+            'data': [row['cookies'] for row in charts['top_cookies']]
+        }
+    }), 'charts')
+
+
+@dashboard_bp.route('/dashboard/events')
+def events():
+    """
+    Stream dashboard events to the browser as server-sent events.
+    
+    Each stream holds a worker thread, so the number open per process is
+    capped. Streams close after a while and the browser reconnects, resuming
+    after the Last-Event-ID it saw.
+    """
+    config = current_app.config
+    if not open_event_stream(config['DASHBOARD_EVENTS_MAX_STREAMS']):
+        response = jsonify({'error': 'Too many open dashboard streams, try again later.'})
+        response.status_code = 503
+        response.headers['Retry-After'] = str(config['DASHBOARD_EVENTS_POLL_SECONDS'])
+        return response
+    
+    # New streams start from now; reconnecting ones pick up where they left off
+    last_id = request.headers.get('Last-Event-ID', type=int)
+    if last_id is None:
+        last_id = get_last_event_id()
+    poll_seconds = config['DASHBOARD_EVENTS_POLL_SECONDS']
+    deadline = time.monotonic() + config['DASHBOARD_EVENTS_STREAM_SECONDS']
+    
+    def stream(last_id):
+        yield f'retry: {poll_seconds * 1000}\n\n'
+        while True:
+            # Read the generation first so a commit during the query isn't missed
+            generation = get_events_generation()
+            batch = get_events_after(last_id)
+            # End the read so the connection goes back to the pool while waiting
+            db.session.rollback()
+            
+            for event in batch:
+                last_id = event['id']
+                yield format_sse(last_id, event['kind'], event['data'])
+            if not batch:
+                yield format_sse(comment='keepalive')
+            
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            # A full batch means more are waiting
+            if len(batch) < EVENT_BATCH_SIZE:
+                wait_for_events(generation, min(poll_seconds, remaining))
+    
+    response = Response(stream_with_context(stream(last_id)), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'  # let nginx pass each event on at once
+    # Runs when the server closes the response, even if the stream never started
+    response.call_on_close(close_event_stream)
+    db.session.rollback()
+    return response
+
+
+def _cacheable(response, panel_name):
+    """
+    Let browsers reuse a panel for its configured TTL, and revalidate it by ETag after.
+    """
+    response = current_app.make_response(response)
+    ttl = current_app.config.get('DASHBOARD_PANEL_TTLS', {}).get(panel_name, 0)
+    response.cache_control.private = True
+    response.cache_control.max_age = ttl
+    response.add_etag()
+    return response.make_conditional(request)
 
 
 def calculate_percentage_change(current, previous):
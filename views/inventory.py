@@ -1,7 +1,7 @@
 from flask import Blueprint, render_template, request, redirect, url_for, flash, current_app
-from models import db, Ingredient, Packaging, Purchase, OrderIngredient, OrderPackaging
+from models import db, Ingredient, Packaging, Purchase
+from stock_helpers import get_stock_levels, get_stock_map
 from datetime import datetime
-from sqlalchemy import func
 import os
 from werkzeug.utils import secure_filename
 import uuid
@@ -242,57 +242,16 @@ def delete_packaging(packaging_id):
 @inventory_bp.route('/adjust', methods=['GET'])
 def adjust_inventory():
     """Adjust inventory levels for ingredients and packaging."""
-    # Calculate current ingredient stock levels
-    ingredients_stock = []
+    # Current stock levels for all items, one grouped query per item type
+    ingredients_stock = [{
+        'ingredient': ingredient,
+        'current_stock': current_stock
+    } for ingredient, current_stock in get_stock_levels('ingredient')]
     
-    # Get all ingredients
-    ingredients = Ingredient.query.order_by(Ingredient.name).all()
-    
-    for ingredient in ingredients:
-        # Calculate total purchased
-        total_purchased = db.session.query(func.sum(Purchase.quantity)).filter(
-            Purchase.item_type == 'ingredient',
-            Purchase.item_id == ingredient.id
-        ).scalar() or 0
-        
-        # Calculate total used in orders
-        total_used = db.session.query(func.sum(OrderIngredient.amount_used)).filter(
-            OrderIngredient.ingredient_id == ingredient.id
-        ).scalar() or 0
-        
-        # Current stock level
-        current_stock = total_purchased - total_used
-        
-        ingredients_stock.append({
-            'ingredient': ingredient,
-            'current_stock': current_stock
-        })
-    
-    # Calculate current packaging stock levels
-    packaging_stock = []
-    
-    # Get all packaging items
-    packaging_items = Packaging.query.order_by(Packaging.name).all()
-    
-    for packaging in packaging_items:
-        # Calculate total purchased
-        total_purchased = db.session.query(func.sum(Purchase.quantity)).filter(
-            Purchase.item_type == 'packaging',
-            Purchase.item_id == packaging.id
-        ).scalar() or 0
-        
-        # Calculate total used in orders
-        total_used = db.session.query(func.sum(OrderPackaging.quantity_used)).filter(
-            OrderPackaging.packaging_id == packaging.id
-        ).scalar() or 0
-        
-        # Current stock level
-        current_stock = total_purchased - total_used
-        
-        packaging_stock.append({
-            'packaging': packaging,
-            'current_stock': current_stock
-        })
+    packaging_stock = [{
+        'packaging': packaging,
+        'current_stock': current_stock
+    } for packaging, current_stock in get_stock_levels('packaging')]
     
     return render_template(
         'inventory/adjust.html',
@@ -305,6 +264,10 @@ def process_adjustment():
     """Process inventory adjustments and create adjustment records."""
     adjustment_count = 0
     
+    # Current stock levels for all items, computed once up front
+    ingredient_stock = get_stock_map('ingredient')
+    packaging_stock = get_stock_map('packaging')
+    
     # Process ingredient adjustments
     for key, value in request.form.items():
         if key.startswith('ingredient_'):
@@ -315,17 +278,7 @@ def process_adjustment():
                 # Get the ingredient
                 ingredient = Ingredient.query.get_or_404(ingredient_id)
                 
-                # Calculate current stock
-                total_purchased = db.session.query(func.sum(Purchase.quantity)).filter(
-                    Purchase.item_type == 'ingredient',
-                    Purchase.item_id == ingredient_id
-                ).scalar() or 0
-                
-                total_used = db.session.query(func.sum(OrderIngredient.amount_used)).filter(
-                    OrderIngredient.ingredient_id == ingredient_id
-                ).scalar() or 0
-                
-                current_stock = total_purchased - total_used
+                current_stock = ingredient_stock.get(ingredient_id, 0)
                 
                 # Calculate adjustment needed
                 adjustment = actual_stock - current_stock
@@ -359,17 +312,7 @@ def process_adjustment():
                 # Get the packaging
                 packaging = Packaging.query.get_or_404(packaging_id)
                 
-                # Calculate current stock
-                total_purchased = db.session.query(func.sum(Purchase.quantity)).filter(
-                    Purchase.item_type == 'packaging',
-                    Purchase.item_id == packaging_id
-                ).scalar() or 0
-                
-                total_used = db.session.query(func.sum(OrderPackaging.quantity_used)).filter(
-                    OrderPackaging.packaging_id == packaging_id
-                ).scalar() or 0
-                
-                current_stock = total_purchased - total_used
+                current_stock = packaging_stock.get(packaging_id, 0)
                 
                 # Calculate adjustment needed
                 adjustment = actual_stock - current_stock
@@ -1,15 +1,51 @@
 from flask import Blueprint, render_template, request, redirect, url_for, jsonify, flash, abort, session
-from models import db, Order, Customer, Recipe, Ingredient, Packaging, OrderIngredient, OrderPackaging
+from sqlalchemy import select
+from models import db, Order, Customer, Recipe, Ingredient, Packaging
 from cost_helpers import calculate_order_cost_preview, snapshot_order_costs
+from order_helpers import get_order_page, format_order_key, parse_order_key
+from report_helpers import parse_report_dates
 from datetime import datetime
 
 orders_bp = Blueprint('orders', __name__, url_prefix='/orders')
 
 @orders_bp.route('/')
 def list_orders():
-    """Display list of all orders."""
-    orders = Order.query.order_by(Order.order_date.desc()).all()
-    return render_template('orders/list.html', orders=orders)
+    """
+    Display one page of orders, newest first.
+    
+    Filters by customer_id, recipe_id (0 for custom orders) and a half-open
+    [start, end) date range given as YYYY-MM-DD. Pages follow the after key
+    of the last order shown.
+    """
+    customer_id = request.args.get('customer_id', type=int)
+    recipe_id = request.args.get('recipe_id', type=int)
+    try:
+        start_date, end_date = parse_report_dates(request.args.get('start'), request.args.get('end'))
+    except ValueError as e:
+        abort(400, description=f"Invalid date range: {e}")
+    
+    after = parse_order_key(request.args.get('after'))
+    orders, next_key = get_order_page(customer_id, recipe_id, start_date, end_date, after=after)
+    
+    # Filters carried over to the page links
+    filter_args = {
+        'customer_id': customer_id,
+        'recipe_id': recipe_id,
+        'start': start_date.isoformat() if start_date else None,
+        'end': end_date.isoformat() if end_date else None
+    }
+    filter_args = {key: value for key, value in filter_args.items() if value is not None}
+    
+    customers = db.session.execute(select(Customer.id, Customer.name).order_by(Customer.name)).all()
+    recipes = db.session.execute(select(Recipe.id, Recipe.name).order_by(Recipe.name)).all()
+    
+    return render_template('orders/list.html',
+                          orders=orders,
+                          customers=customers,
+                          recipes=recipes,
+                          filter_args=filter_args,
+                          is_first_page=after is None,
+                          next_page=format_order_key(next_key))
 
 @orders_bp.route('/new', methods=['GET'])
 def new_order_step1():
@@ -1,5 +1,6 @@
 from flask import Blueprint, render_template, request, redirect, url_for, flash
 from models import db, Purchase, Ingredient, Packaging
+from cost_helpers import get_latest_cost_entries
 from datetime import datetime
 
 purchases_bp = Blueprint('purchases', __name__, url_prefix='/purchases')
@@ -150,44 +151,8 @@ def delete_purchase(purchase_id):
 @purchases_bp.route('/latest-costs')
 def latest_costs():
     """View latest costs for all items."""
-    # Get latest costs for ingredients
-    ingredient_costs = []
-    ingredients = Ingredient.query.order_by(Ingredient.name).all()
-    
-    for ingredient in ingredients:
-        # Filter out zero-cost purchases (like inventory adjustments)
-        latest_purchase = Purchase.query.filter_by(
-            item_type='ingredient',
-            item_id=ingredient.id
-        ).filter(Purchase.unit_cost_cents > 0).order_by(Purchase.purchase_date.desc()).first()
-        
-        ingredient_costs.append({
-            'item': ingredient,
-            'latest_purchase': latest_purchase,
-            'unit_cost_cents': latest_purchase.unit_cost_cents if latest_purchase else ingredient.default_price_per_unit_cents,
-            'last_purchase_date': latest_purchase.purchase_date if latest_purchase else None
-        })
-    
-    # Get latest costs for packaging
-    packaging_costs = []
-    packaging_items = Packaging.query.order_by(Packaging.name).all()
-    
-    for packaging in packaging_items:
-        # Filter out zero-cost purchases (like inventory adjustments)
-        latest_purchase = Purchase.query.filter_by(
-            item_type='packaging',
-            item_id=packaging.id
-        ).filter(Purchase.unit_cost_cents > 0).order_by(Purchase.purchase_date.desc()).first()
-        
-        packaging_costs.append({
-            'item': packaging,
-            'latest_purchase': latest_purchase,
-            'unit_cost_cents': latest_purchase.unit_cost_cents if latest_purchase else packaging.default_price_per_unit_cents,
-            'last_purchase_date': latest_purchase.purchase_date if latest_purchase else None
-        })
-    
     return render_template(
         'purchases/latest_costs.html',
-        ingredient_costs=ingredient_costs,
-        packaging_costs=packaging_costs
+        ingredient_costs=get_latest_cost_entries('ingredient'),
+        packaging_costs=get_latest_cost_entries('packaging')
     )
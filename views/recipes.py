@@ -1,5 +1,6 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, current_app
+from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, current_app, abort
 from models import db, Recipe, RecipeIngredient, Ingredient
+from recipe_helpers import get_recipe_cost, get_recipe_costs
 import os
 from werkzeug.utils import secure_filename
 import uuid
@@ -39,6 +40,20 @@ def view_recipe(recipe_id):
     recipe = Recipe.query.get_or_404(recipe_id)
     return render_template('recipes/view.html', recipe=recipe)
 
+@recipes_bp.route('/<int:recipe_id>/cost')
+def recipe_cost(recipe_id):
+    """API endpoint for a recipe's batch, per-gram and per-cookie cost."""
+    costing = get_recipe_cost(recipe_id)
+    if costing is None:
+        abort(404)
+    return jsonify(costing)
+
+@recipes_bp.route('/api/costs')
+def api_recipe_costs():
+    """API endpoint for the costs of all recipes."""
+    costings = get_recipe_costs()
+    return jsonify(sorted(costings.values(), key=lambda costing: costing['name']))
+
 @recipes_bp.route('/new', methods=['GET', 'POST'])
 def add_recipe():
     """Add a new recipe."""
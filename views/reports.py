@@ -1,429 +1,141 @@
-from flask import Blueprint, render_template, request, jsonify, Response, current_app
-from models import db, Order, OrderIngredient, OrderPackaging, Customer, Recipe, Ingredient, Packaging
-from sqlalchemy import func, desc
-from datetime import datetime, timedelta
-import csv
-import io
-from collections import defaultdict
+from flask import Blueprint, render_template, request, jsonify, Response, stream_with_context, send_file, abort
+from models import db, Order, Customer, Recipe
+from sqlalchemy import select
+from datetime import datetime
+import tempfile
+from report_helpers import (
+    get_report_cache_stats, get_report_summary, get_report_window,
+    parse_report_dates, filter_order_dates, get_item_usage_select, get_profit_report,
+    get_inventory_report, get_trend_data, format_trend_period, iter_csv
+)
+from export_helpers import write_parquet
+from analytics_helpers import get_distribution
+from order_helpers import format_order_key, parse_order_key
 
 reports_bp = Blueprint('reports', __name__, url_prefix='/reports')
 
+# Rows fetched per round trip when streaming exports
+EXPORT_BATCH_SIZE = 500
+
+def _report_range(default_period):
+    """
+    Read the date filters shared by every report and export.
+    
+    Either a named period or a custom half-open [start, end) range, given as
+    YYYY-MM-DD start and end query parameters. A custom range overrides the
+    period.
+    
+    Returns:
+        tuple: (period, start_date, end_date, range_args) where period is
+            'custom' for a custom range and range_args rebuild the filters
+            in url_for
+    """
+    try:
+        start_date, end_date = parse_report_dates(request.args.get('start'), request.args.get('end'))
+    except ValueError as e:
+        abort(400, description=f"Invalid report range: {e}")
+    
+    if start_date or end_date:
+        range_args = {'start': start_date.isoformat() if start_date else None,
+                      'end': end_date.isoformat() if end_date else None}
+        return 'custom', start_date, end_date, {k: v for k, v in range_args.items() if v}
+    
+    period = request.args.get('period', default_period)
+    start_date, end_date = get_report_window(period)
+    return period, start_date, end_date, {'period': period}
+
+def _trend_range():
+    """Read the trend filters: named periods keep their own windows and buckets."""
+    period, start_date, end_date, range_args = _report_range('year')
+    if period != 'custom':
+        start_date = end_date = None
+    return period, start_date, end_date, range_args
+
+def _range_label(period, range_args):
+    """Label a report range for export file names."""
+    if period != 'custom':
+        return period
+    return f"{range_args.get('start', 'start')}_{range_args.get('end', 'end')}"
+
 @reports_bp.route('/')
 def index():
     """Reports dashboard index page."""
-    # Get summary metrics
-    orders_count = Order.query.count()
-    
-    # Profit calculations - use separate queries to avoid duplication
-    # Get total revenue
-    total_revenue_cents = db.session.query(func.sum(Order.sale_price_total_cents)).scalar() or 0
-    
-    # Get total ingredient costs
-    total_ingredient_cost_cents = db.session.query(
-        func.sum(OrderIngredient.cost_at_time_of_use_cents)
-    ).scalar() or 0
-    
-    # Get total packaging costs
-    total_packaging_cost_cents = db.session.query(
-        func.sum(OrderPackaging.cost_at_time_of_use_cents)
-    ).scalar() or 0
-    
-    # Calculate totals
-    total_cost_cents = total_ingredient_cost_cents + total_packaging_cost_cents
-    total_profit_cents = total_revenue_cents - total_cost_cents
-    
-    # Calculate profit margin percentage
-    profit_margin = 0
-    if total_revenue_cents > 0:
-        profit_margin = (total_profit_cents / total_revenue_cents) * 100
-    
-    # Total cookies baked
-    total_cookies = db.session.query(func.sum(Order.quantity_baked)).scalar() or 0
-    
-    # Top customers
-    top_customers = db.session.query(
-        Customer.name,
-        func.count(Order.id).label('order_count'),
-        func.sum(Order.sale_price_total_cents).label('revenue')
-    ).join(Order).group_by(Customer.id).order_by(desc('revenue')).limit(5).all()
-    
-    # Top recipes
-    top_recipes = db.session.query(
-        Recipe.name,
-        func.count(Order.id).label('order_count')
-    ).join(Order).group_by(Recipe.id).order_by(desc('order_count')).limit(5).all()
-    
-    return render_template('reports/index.html',
-                          orders_count=orders_count,
-                          total_revenue_cents=total_revenue_cents,
-                          total_cost_cents=total_cost_cents,
-                          total_profit_cents=total_profit_cents,
-                          profit_margin=profit_margin,
-                          total_cookies=total_cookies,
-                          top_customers=top_customers,
-                          top_recipes=top_recipes)
+    summary = get_report_summary()
+    return render_template('reports/index.html', **summary)
+
+@reports_bp.route('/api/cache-stats')
+def api_cache_stats():
+    """API endpoint for report cache statistics."""
+    return jsonify(get_report_cache_stats())
 
 @reports_bp.route('/profit')
 def profit_report():
     """Detailed profit analysis report."""
     # Get time range filters
-    period = request.args.get('period', 'all')
+    period, start_date, end_date, range_args = _report_range('all')
     
-    # Calculate date ranges
-    today = datetime.now().date()
-    start_date = None
-    end_date = today + timedelta(days=1)  # Include today
-    
-    if period == 'month':
-        start_date = today.replace(day=1)
-    elif period == '3months':
-        start_date = (today - timedelta(days=90))
-    elif period == '6months':
-        start_date = (today - timedelta(days=180))
-    elif period == 'year':
-        start_date = today.replace(month=1, day=1)
-    
-    # Get orders
-    orders_query = Order.query
-    if start_date:
-        orders_query = orders_query.filter(Order.order_date >= start_date, Order.order_date <= end_date)
-    orders = orders_query.order_by(Order.order_date.desc()).all()
-    
-    # Initialize totals
-    total_revenue = 0
-    total_ingredient_cost = 0
-    total_packaging_cost = 0
-    orders_data = []
-    
-    # Process each order
-    for order in orders:
-        # Get ingredient costs for this order
-        ingredient_cost = db.session.query(
-            func.sum(OrderIngredient.cost_at_time_of_use_cents)
-        ).filter(OrderIngredient.order_id == order.id).scalar() or 0
-        
-        # Get packaging costs for this order
-        packaging_cost = db.session.query(
-            func.sum(OrderPackaging.cost_at_time_of_use_cents)
-        ).filter(OrderPackaging.order_id == order.id).scalar() or 0
-        
-        # Calculate profit
-        total_cost = ingredient_cost + packaging_cost
-        profit = order.sale_price_total_cents - total_cost
-        profit_margin_pct = 0
-        if order.sale_price_total_cents > 0:
-            profit_margin_pct = (profit / order.sale_price_total_cents) * 100
-        
-        # Add to totals
-        total_revenue += order.sale_price_total_cents
-        total_ingredient_cost += ingredient_cost
-        total_packaging_cost += packaging_cost
-        
-        # Add to orders data
-        orders_data.append({
-            'id': order.id,
-            'date': order.order_date,
-            'customer': order.customer,
-            'recipe': order.recipe.name if order.recipe else 'Custom',
-            'quantity': order.quantity_baked,
-            'revenue_cents': order.sale_price_total_cents,
-            'ingredient_cost_cents': ingredient_cost,
-            'packaging_cost_cents': packaging_cost,
-            'total_cost_cents': total_cost,
-            'profit_cents': profit,
-            'profit_margin': profit_margin_pct
-        })
-    
-    # Calculate totals
-    total_cost = total_ingredient_cost + total_packaging_cost
-    total_profit = total_revenue - total_cost
-    
-    # Calculate profit margin
-    profit_margin = 0
-    if total_revenue > 0:
-        profit_margin = (total_profit / total_revenue) * 100
+    # Totals cover the whole period; the order table is shown a page at a time
+    after = parse_order_key(request.args.get('after'))
+    totals, orders_data, next_key = get_profit_report(start_date, end_date, after=after)
     
     return render_template('reports/profit.html',
                           orders=orders_data,
                           period=period,
-                          total_revenue=total_revenue,
-                          total_ingredient_cost=total_ingredient_cost,
-                          total_packaging_cost=total_packaging_cost,
-                          total_cost=total_cost,
-                          total_profit=total_profit,
-                          profit_margin=profit_margin)
+                          range_args=range_args,
+                          order_count=totals['order_count'],
+                          total_revenue=totals['revenue'],
+                          total_ingredient_cost=totals['ingredient_cost'],
+                          total_packaging_cost=totals['packaging_cost'],
+                          total_cost=totals['total_cost'],
+                          total_profit=totals['profit'],
+                          profit_margin=totals['profit_margin'],
+                          is_first_page=after is None,
+                          next_page=format_order_key(next_key))
 
 @reports_bp.route('/inventory')
 def inventory_report():
     """Inventory usage and cost report."""
-    period = request.args.get('period', 'all')
-    
-    # Calculate date ranges
-    today = datetime.now().date()
-    start_date = None
-    end_date = today + timedelta(days=1)  # Include today
-    
-    if period == 'month':
-        start_date = today.replace(day=1)
-    elif period == '3months':
-        start_date = (today - timedelta(days=90))
-    elif period == '6months':
-        start_date = (today - timedelta(days=180))
-    elif period == 'year':
-        start_date = today.replace(month=1, day=1)
-    
-    # Query for ingredient usage
-    ingredient_query = db.session.query(
-        Ingredient.id,
-        Ingredient.name,
-        Ingredient.default_unit,
-        func.sum(OrderIngredient.amount_used).label('amount_used'),
-        func.sum(OrderIngredient.cost_at_time_of_use_cents).label('total_cost')
-    ).join(OrderIngredient).join(Order)
+    period, start_date, end_date, range_args = _report_range('all')
     
-    # Apply date filters if specified
-    if start_date:
-        ingredient_query = ingredient_query.filter(Order.order_date >= start_date, Order.order_date <= end_date)
-    
-    # Group and order results
-    ingredients = ingredient_query.group_by(Ingredient.id).order_by(desc('total_cost')).all()
-    
-    # Query for packaging usage
-    packaging_query = db.session.query(
-        Packaging.id,
-        Packaging.name,
-        Packaging.default_unit,
-        func.sum(OrderPackaging.quantity_used).label('quantity_used'),
-        func.sum(OrderPackaging.cost_at_time_of_use_cents).label('total_cost')
-    ).join(OrderPackaging).join(Order)
-    
-    # Apply date filters if specified
-    if start_date:
-        packaging_query = packaging_query.filter(Order.order_date >= start_date, Order.order_date <= end_date)
-    
-    # Group and order results
-    packaging = packaging_query.group_by(Packaging.id).order_by(desc('total_cost')).all()
+    # Query for ingredient and packaging usage
+    ingredients, packaging = get_inventory_report(start_date, end_date)
     
     return render_template('reports/inventory.html',
                           ingredients=ingredients,
                           packaging=packaging,
-                          period=period)
+                          period=period,
+                          range_args=range_args)
 
 @reports_bp.route('/trends')
 def trend_report():
     """Trend analysis over time."""
-    period = request.args.get('period', 'year')
+    period, start_date, end_date, range_args = _trend_range()
+    trend_rows, group_by = get_trend_data(period, request.args.get('bucket'), start_date, end_date)
     
-    # Calculate date ranges
-    today = datetime.now().date()
-    if period == 'year':
-        start_date = today.replace(month=1, day=1)
-        group_by = 'month'
-    elif period == 'month':
-        start_date = today.replace(day=1)
-        group_by = 'day'
-    elif period == 'all':
-        # Use the date of the first order
-        first_order = Order.query.order_by(Order.order_date).first()
-        if first_order:
-            start_date = first_order.order_date.date()
-        else:
-            start_date = today.replace(month=1, day=1)
-        group_by = 'month'
-    else:
-        start_date = today - timedelta(days=90)
-        group_by = 'week'
-    
-    end_date = today + timedelta(days=1)  # Include today
-    
-    # Build the query based on the grouping
-    if group_by == 'month':
-        date_extract = func.strftime('%Y-%m', Order.order_date)
-    elif group_by == 'week':
-        date_extract = func.strftime('%Y-%W', Order.order_date)
-    else:  # day
-        date_extract = func.strftime('%Y-%m-%d', Order.order_date)
-    
-    # Get revenue by time period
-    revenue_data = db.session.query(
-        date_extract.label('period'),
-        func.sum(Order.sale_price_total_cents).label('revenue')
-    ).filter(Order.order_date >= start_date, Order.order_date <= end_date) \
-     .group_by('period').order_by('period').all()
-    
-    # Get ingredient costs by time period
-    ingredient_cost_data = db.session.query(
-        date_extract.label('period'),
-        func.sum(OrderIngredient.cost_at_time_of_use_cents).label('ingredient_cost')
-    ).select_from(OrderIngredient).join(Order) \
-     .filter(Order.order_date >= start_date, Order.order_date <= end_date) \
-     .group_by('period').order_by('period').all()
-    
-    # Get packaging costs by time period
-    packaging_cost_data = db.session.query(
-        date_extract.label('period'),
-        func.sum(OrderPackaging.cost_at_time_of_use_cents).label('packaging_cost')
-    ).select_from(OrderPackaging).join(Order) \
-     .filter(Order.order_date >= start_date, Order.order_date <= end_date) \
-     .group_by('period').order_by('period').all()
-    
-    # Combine data
-    trend_data = []
-    # Create dictionaries for quick lookup
-    ingredient_costs_by_period = {item.period: (item.ingredient_cost or 0) for item in ingredient_cost_data}
-    packaging_costs_by_period = {item.period: (item.packaging_cost or 0) for item in packaging_cost_data}
-    
-    for item in revenue_data:
-        period = item.period
-        revenue = item.revenue
-        ingredient_cost = ingredient_costs_by_period.get(period, 0)
-        packaging_cost = packaging_costs_by_period.get(period, 0)
-        total_cost = ingredient_cost + packaging_cost
-        profit = revenue - total_cost
-        
-        # Format display label based on grouping
-        if group_by == 'month':
-            # Convert YYYY-MM to Month YYYY
-            display_period = datetime.strptime(period, '%Y-%m').strftime('%b %Y')
-        elif group_by == 'week':
-            # Convert YYYY-WW to Week WW, YYYY
-            year, week = period.split('-')
-            display_period = f"Week {week}, {year}"
-        else:
-            # Convert YYYY-MM-DD to Mon DD, YYYY
-            display_period = datetime.strptime(period, '%Y-%m-%d').strftime('%b %d, %Y')
-        
-        trend_data.append({
-            'period': period,
-            'display_period': display_period,
-            'revenue': revenue,
-            'ingredient_cost': ingredient_cost,
-            'packaging_cost': packaging_cost,
-            'total_cost': total_cost,
-            'profit': profit
-        })
-    
-    # Get cookie count data
-    cookie_data = db.session.query(
-        date_extract.label('period'),
-        func.sum(Order.quantity_baked).label('cookies')
-    ).filter(Order.order_date >= start_date, Order.order_date <= end_date) \
-     .group_by('period').order_by('period').all()
-    
-    cookies_by_period = {item.period: item.cookies for item in cookie_data}
-    
-    # Add cookie data to trend data
-    for item in trend_data:
-        item['cookies'] = cookies_by_period.get(item['period'], 0)
+    # Add display labels based on grouping
+    trend_data = [
+        dict(row, display_period=format_trend_period(row['period'], group_by))
+        for row in trend_rows
+    ]
     
     return render_template('reports/trends.html',
                           trend_data=trend_data,
                           period=period,
+                          range_args=range_args,
                           group_by=group_by)
 
 @reports_bp.route('/api/trend-data')
 def api_trend_data():
     """API endpoint for trend chart data."""
-    period = request.args.get('period', 'year')
-    
-    # Calculate date ranges
-    today = datetime.now().date()
-    if period == 'year':
-        start_date = today.replace(month=1, day=1)
-        group_by = 'month'
-    elif period == 'month':
-        start_date = today.replace(day=1)
-        group_by = 'day'
-    elif period == 'all':
-        # Use the date of the first order
-        first_order = Order.query.order_by(Order.order_date).first()
-        if first_order:
-            start_date = first_order.order_date.date()
-        else:
-            start_date = today.replace(month=1, day=1)
-        group_by = 'month'
-    else:
-        start_date = today - timedelta(days=90)
-        group_by = 'week'
-    
-    end_date = today + timedelta(days=1)  # Include today
-    
-    # Build the query based on the grouping
-    if group_by == 'month':
-        date_extract = func.strftime('%Y-%m', Order.order_date)
-    elif group_by == 'week':
-        date_extract = func.strftime('%Y-%W', Order.order_date)
-    else:  # day
-        date_extract = func.strftime('%Y-%m-%d', Order.order_date)
-    
-    # Get revenue by time period
-    revenue_data = db.session.query(
-        date_extract.label('period'),
-        func.sum(Order.sale_price_total_cents).label('revenue')
-    ).filter(Order.order_date >= start_date, Order.order_date <= end_date) \
-     .group_by('period').order_by('period').all()
-    
-    # Get ingredient costs by time period
-    ingredient_cost_data = db.session.query(
-        date_extract.label('period'),
-        func.sum(OrderIngredient.cost_at_time_of_use_cents).label('ingredient_cost')
-    ).select_from(OrderIngredient).join(Order) \
-     .filter(Order.order_date >= start_date, Order.order_date <= end_date) \
-     .group_by('period').order_by('period').all()
-    
-    # Get packaging costs by time period
-    packaging_cost_data = db.session.query(
-        date_extract.label('period'),
-        func.sum(OrderPackaging.cost_at_time_of_use_cents).label('packaging_cost')
-    ).select_from(OrderPackaging).join(Order) \
-     .filter(Order.order_date >= start_date, Order.order_date <= end_date) \
-     .group_by('period').order_by('period').all()
-    
-    # Get cookie count data
-    cookie_data = db.session.query(
-        date_extract.label('period'),
-        func.sum(Order.quantity_baked).label('cookies')
-    ).filter(Order.order_date >= start_date, Order.order_date <= end_date) \
-     .group_by('period').order_by('period').all()
+    period, start_date, end_date, range_args = _trend_range()
+    trend_rows, group_by = get_trend_data(period, request.args.get('bucket'), start_date, end_date)
     
     # Prepare data for charts
-    periods = []
-    revenue = []
-    costs = []
-    profits = []
-    cookies = []
-    
-    # Create dictionaries for quick lookup
-    ingredient_costs_by_period = {item.period: (item.ingredient_cost or 0) for item in ingredient_cost_data}
-    packaging_costs_by_period = {item.period: (item.packaging_cost or 0) for item in packaging_cost_data}
-    cookies_by_period = {item.period: item.cookies for item in cookie_data}
-    
-    for item in revenue_data:
-        period = item.period
-        rev = item.revenue or 0
-        ingredient_cost = ingredient_costs_by_period.get(period, 0)
-        packaging_cost = packaging_costs_by_period.get(period, 0)
-        total_cost = ingredient_cost + packaging_cost
-        profit = rev - total_cost
-        cookie_count = cookies_by_period.get(period, 0)
-        
-        # Format display label based on grouping
-        if group_by == 'month':
-            # Convert YYYY-MM to Month YYYY
-            display_period = datetime.strptime(period, '%Y-%m').strftime('%b %Y')
-        elif group_by == 'week':
-            # Convert YYYY-WW to Week WW, YYYY
-            year, week = period.split('-')
-            display_period = f"Week {week}, {year}"
-        else:
-            # Convert YYYY-MM-DD to Mon DD, YYYY
-            display_period = datetime.strptime(period, '%Y-%m-%d').strftime('%b %d')
-        
-        periods.append(display_period)
-        revenue.append(rev / 100)  # Convert cents to dollars
-        costs.append(total_cost / 100)
-        profits.append(profit / 100)
-        cookies.append(cookie_count)
+    periods = [format_trend_period(row['period'], group_by, short=True) for row in trend_rows]
+    revenue = [row['revenue'] / 100 for row in trend_rows]  # Convert cents to dollars
+    costs = [row['total_cost'] / 100 for row in trend_rows]
+    profits = [row['profit'] / 100 for row in trend_rows]
+    cookies = [row['cookies'] for row in trend_rows]
     
     # Format data for Chart.js
     chart_data = {
@@ -478,283 +190,165 @@ def api_trend_data():
 @reports_bp.route('/export/profit-csv')
 def export_profit_csv():
     """Export profit data as CSV."""
-    period = request.args.get('period', 'all')
-    
-    # Calculate date ranges
+    period, start_date, end_date, range_args = _report_range('all')
     today = datetime.now().date()
-    start_date = None
-    end_date = today + timedelta(days=1)  # Include today
     
-    if period == 'month':
-        start_date = today.replace(day=1)
-    elif period == '3months':
-        start_date = (today - timedelta(days=90))
-    elif period == '6months':
-        start_date = (today - timedelta(days=180))
-    elif period == 'year':
-        start_date = today.replace(month=1, day=1)
-    
-    # Base query
-    query = db.session.query(
-        Order,
-        func.sum(OrderIngredient.cost_at_time_of_use_cents).label('ingredient_cost'),
-        func.sum(OrderPackaging.cost_at_time_of_use_cents).label('packaging_cost')
-    ).join(OrderIngredient, Order.id == OrderIngredient.order_id, isouter=True) \
-     .join(OrderPackaging, Order.id == OrderPackaging.order_id, isouter=True) \
-     .group_by(Order.id)
+    # Plain columns with customer and recipe names joined in, so rows can be
+    # streamed without loading Order objects or their relationships
+    query = select(
+        Order.id,
+        Order.order_date,
+        Customer.name.label('customer_name'),
+        Recipe.name.label('recipe_name'),
+        Order.quantity_baked,
+        Order.sale_price_total_cents,
+        Order.ingredient_cost_cents,
+        Order.packaging_cost_cents,
+        Order.total_cost_cents,
+        Order.profit_cents
+    ).outerjoin(Customer, Customer.id == Order.customer_id) \
+     .outerjoin(Recipe, Recipe.id == Order.recipe_id)
     
     # Apply date filters if specified
-    if start_date:
-        query = query.filter(Order.order_date >= start_date, Order.order_date <= end_date)
-    
-    # Execute query
-    orders = query.order_by(Order.order_date.desc()).all()
+    query = filter_order_dates(query, start_date, end_date)
     
-    # Create CSV file in memory
-    output = io.StringIO()
-    writer = csv.writer(output)
+    query = query.order_by(Order.order_date.desc(), Order.id.desc()) \
+                 .execution_options(yield_per=EXPORT_BATCH_SIZE)
     
-    # Write header
-    writer.writerow([
-        'Order ID', 'Date', 'Customer', 'Recipe', 'Quantity',
-        'Revenue ($)', 'Ingredient Cost ($)', 'Packaging Cost ($)', 
-        'Total Cost ($)', 'Profit ($)', 'Profit Margin (%)'
-    ])
-    
-    # Write data rows
-    for item in orders:
-        order = item.Order
-        ingredient_cost = item.ingredient_cost or 0
-        packaging_cost = item.packaging_cost or 0
-        total_cost = ingredient_cost + packaging_cost
-        profit = order.sale_price_total_cents - total_cost
-        profit_margin_pct = 0
-        if order.sale_price_total_cents > 0:
-            profit_margin_pct = (profit / order.sale_price_total_cents) * 100
+    def generate_rows():
+        yield [
+            'Order ID', 'Date', 'Customer', 'Recipe', 'Quantity',
+            'Revenue ($)', 'Ingredient Cost ($)', 'Packaging Cost ($)', 
+            'Total Cost ($)', 'Profit ($)', 'Profit Margin (%)'
+        ]
         
-        writer.writerow([
-            order.id,
-            order.order_date.strftime('%Y-%m-%d'),
-            order.customer.name if order.customer else 'N/A',
-            order.recipe.name if order.recipe else 'Custom',
-            order.quantity_baked,
-            "{:.2f}".format(order.sale_price_total_cents / 100),
-            "{:.2f}".format(ingredient_cost / 100),
-            "{:.2f}".format(packaging_cost / 100),
-            "{:.2f}".format(total_cost / 100),
-            "{:.2f}".format(profit / 100),
-            "{:.2f}".format(profit_margin_pct)
-        ])
-    
-    # Prepare response
-    output.seek(0)
-    return Response(
-        output.getvalue(),
-        mimetype="text/csv",
-        headers={"Content-Disposition": f"attachment;filename=profit_report_{period}_{today.strftime('%Y%m%d')}.csv"}
-    )
+        for row in db.session.execute(query):
+            profit_margin_pct = 0
+            if row.sale_price_total_cents > 0:
+                profit_margin_pct = (row.profit_cents / row.sale_price_total_cents) * 100
+            
+            yield [
+                row.id,
+                row.order_date.strftime('%Y-%m-%d'),
+                row.customer_name or 'N/A',
+                row.recipe_name or 'Custom',
+                row.quantity_baked,
+                "{:.2f}".format(row.sale_price_total_cents / 100),
+                "{:.2f}".format(row.ingredient_cost_cents / 100),
+                "{:.2f}".format(row.packaging_cost_cents / 100),
+                "{:.2f}".format(row.total_cost_cents / 100),
+                "{:.2f}".format(row.profit_cents / 100),
+                "{:.2f}".format(profit_margin_pct)
+            ]
+    
+    return _csv_response(generate_rows(), f"profit_report_{_range_label(period, range_args)}_{today.strftime('%Y%m%d')}.csv")
 
 @reports_bp.route('/export/inventory-csv')
 def export_inventory_csv():
     """Export inventory usage data as CSV."""
-    period = request.args.get('period', 'all')
-    
-    # Calculate date ranges
+    period, start_date, end_date, range_args = _report_range('all')
     today = datetime.now().date()
-    start_date = None
-    end_date = today + timedelta(days=1)  # Include today
-    
-    if period == 'month':
-        start_date = today.replace(day=1)
-    elif period == '3months':
-        start_date = (today - timedelta(days=90))
-    elif period == '6months':
-        start_date = (today - timedelta(days=180))
-    elif period == 'year':
-        start_date = today.replace(month=1, day=1)
-    
-    # Query for ingredient usage
-    ingredient_query = db.session.query(
-        Ingredient.id,
-        Ingredient.name,
-        Ingredient.default_unit,
-        func.sum(OrderIngredient.amount_used).label('amount_used'),
-        func.sum(OrderIngredient.cost_at_time_of_use_cents).label('total_cost')
-    ).join(OrderIngredient).join(Order)
-    
-    # Apply date filters if specified
-    if start_date:
-        ingredient_query = ingredient_query.filter(Order.order_date >= start_date, Order.order_date <= end_date)
-    
-    # Group and order results
-    ingredients = ingredient_query.group_by(Ingredient.id).order_by(desc('total_cost')).all()
-    
-    # Query for packaging usage
-    packaging_query = db.session.query(
-        Packaging.id,
-        Packaging.name,
-        Packaging.default_unit,
-        func.sum(OrderPackaging.quantity_used).label('quantity_used'),
-        func.sum(OrderPackaging.cost_at_time_of_use_cents).label('total_cost')
-    ).join(OrderPackaging).join(Order)
-    
-    # Apply date filters if specified
-    if start_date:
-        packaging_query = packaging_query.filter(Order.order_date >= start_date, Order.order_date <= end_date)
-    
-    # Group and order results
-    packaging = packaging_query.group_by(Packaging.id).order_by(desc('total_cost')).all()
-    
-    # Create CSV file in memory
-    output = io.StringIO()
-    writer = csv.writer(output)
-    
-    # Write ingredients section
-    writer.writerow(['INGREDIENTS'])
-    writer.writerow(['ID', 'Name', 'Unit', 'Amount Used', 'Total Cost ($)'])
-    
-    for ingredient in ingredients:
-        writer.writerow([
-            ingredient.id,
-            ingredient.name,
-            ingredient.default_unit,
-            "{:.2f}".format(ingredient.amount_used),
-            "{:.2f}".format(ingredient.total_cost / 100)
-        ])
-    
-    # Add a blank row between sections
-    writer.writerow([])
-    
-    # Write packaging section
-    writer.writerow(['PACKAGING'])
-    writer.writerow(['ID', 'Name', 'Unit', 'Quantity Used', 'Total Cost ($)'])
-    
-    for item in packaging:
-        writer.writerow([
-            item.id,
-            item.name,
-            item.default_unit,
-            "{:.2f}".format(item.quantity_used),
-            "{:.2f}".format(item.total_cost / 100)
-        ])
     
-    # Prepare response
-    output.seek(0)
-    return Response(
-        output.getvalue(),
-        mimetype="text/csv",
-        headers={"Content-Disposition": f"attachment;filename=inventory_report_{period}_{today.strftime('%Y%m%d')}.csv"}
-    )
+    def generate_rows():
+        # Write ingredients section
+        yield ['INGREDIENTS']
+        yield ['ID', 'Name', 'Unit', 'Amount Used', 'Total Cost ($)']
+        
+        ingredient_query = get_item_usage_select('ingredient', start_date, end_date)
+        for ingredient in db.session.execute(ingredient_query.execution_options(yield_per=EXPORT_BATCH_SIZE)):
+            yield [
+                ingredient.id,
+                ingredient.name,
+                ingredient.default_unit,
+                "{:.2f}".format(ingredient.amount_used),
+                "{:.2f}".format(ingredient.total_cost / 100)
+            ]
+        
+        # Add a blank row between sections
+        yield []
+        
+        # Write packaging section
+        yield ['PACKAGING']
+        yield ['ID', 'Name', 'Unit', 'Quantity Used', 'Total Cost ($)']
+        
+        packaging_query = get_item_usage_select('packaging', start_date, end_date)
+        for item in db.session.execute(packaging_query.execution_options(yield_per=EXPORT_BATCH_SIZE)):
+            yield [
+                item.id,
+                item.name,
+                item.default_unit,
+                "{:.2f}".format(item.quantity_used),
+                "{:.2f}".format(item.total_cost / 100)
+            ]
+    
+    return _csv_response(generate_rows(), f"inventory_report_{_range_label(period, range_args)}_{today.strftime('%Y%m%d')}.csv")
 
 @reports_bp.route('/export/trends-csv')
 def export_trends_csv():
     """Export trend data as CSV."""
-    period = request.args.get('period', 'year')
-    
-    # Calculate date ranges
+    period, start_date, end_date, range_args = _trend_range()
     today = datetime.now().date()
-    if period == 'year':
-        start_date = today.replace(month=1, day=1)
-        group_by = 'month'
-    elif period == 'month':
-        start_date = today.replace(day=1)
-        group_by = 'day'
-    elif period == 'all':
-        # Use the date of the first order
-        first_order = Order.query.order_by(Order.order_date).first()
-        if first_order:
-            start_date = first_order.order_date.date()
-        else:
-            start_date = today.replace(month=1, day=1)
-        group_by = 'month'
-    else:
-        start_date = today - timedelta(days=90)
-        group_by = 'week'
-    
-    end_date = today + timedelta(days=1)  # Include today
-    
-    # Build the query based on the grouping
-    if group_by == 'month':
-        date_extract = func.strftime('%Y-%m', Order.order_date)
-    elif group_by == 'week':
-        date_extract = func.strftime('%Y-%W', Order.order_date)
-    else:  # day
-        date_extract = func.strftime('%Y-%m-%d', Order.order_date)
-    
-    # Get revenue by time period
-    revenue_data = db.session.query(
-        date_extract.label('period'),
-        func.sum(Order.sale_price_total_cents).label('revenue')
-    ).filter(Order.order_date >= start_date, Order.order_date <= end_date) \
-     .group_by('period').order_by('period').all()
-    
-    # Get costs by time period
-    cost_data = db.session.query(
-        date_extract.label('period'),
-        func.sum(OrderIngredient.cost_at_time_of_use_cents).label('ingredient_cost'),
-        func.sum(OrderPackaging.cost_at_time_of_use_cents).label('packaging_cost')
-    ).join(OrderIngredient, Order.id == OrderIngredient.order_id, isouter=True) \
-     .join(OrderPackaging, Order.id == OrderPackaging.order_id, isouter=True) \
-     .filter(Order.order_date >= start_date, Order.order_date <= end_date) \
-     .group_by('period').order_by('period').all()
-    
-    # Get cookie count data
-    cookie_data = db.session.query(
-        date_extract.label('period'),
-        func.sum(Order.quantity_baked).label('cookies')
-    ).filter(Order.order_date >= start_date, Order.order_date <= end_date) \
-     .group_by('period').order_by('period').all()
+    trend_rows, group_by = get_trend_data(period, request.args.get('bucket'), start_date, end_date)
     
-    # Create dictionaries for quick lookup
-    cost_by_period = {item.period: (item.ingredient_cost or 0, item.packaging_cost or 0) for item in cost_data}
-    cookies_by_period = {item.period: item.cookies for item in cookie_data}
-    
-    # Create CSV file in memory
-    output = io.StringIO()
-    writer = csv.writer(output)
-    
-    # Write header
-    writer.writerow([
-        'Period', 'Revenue ($)', 'Ingredient Cost ($)', 
-        'Packaging Cost ($)', 'Total Cost ($)', 'Profit ($)', 
-        'Cookies Baked'
-    ])
-    
-    # Write data rows
-    for item in revenue_data:
-        period = item.period
-        revenue = item.revenue or 0
-        ingredient_cost, packaging_cost = cost_by_period.get(period, (0, 0))
-        total_cost = ingredient_cost + packaging_cost
-        profit = revenue - total_cost
-        cookie_count = cookies_by_period.get(period, 0)
-        
-        # Format display label based on grouping
-        if group_by == 'month':
-            # Convert YYYY-MM to Month YYYY
-            display_period = datetime.strptime(period, '%Y-%m').strftime('%b %Y')
-        elif group_by == 'week':
-            # Convert YYYY-WW to Week WW, YYYY
-            year, week = period.split('-')
-            display_period = f"Week {week}, {year}"
-        else:
-            # Convert YYYY-MM-DD to Mon DD, YYYY
-            display_period = datetime.strptime(period, '%Y-%m-%d').strftime('%b %d, %Y')
+    def generate_rows():
+        yield [
+            'Period', 'Revenue ($)', 'Ingredient Cost ($)', 
+            'Packaging Cost ($)', 'Total Cost ($)', 'Profit ($)', 
+            'Cookies Baked'
+        ]
         
-        writer.writerow([
-            display_period,
-            "{:.2f}".format(revenue / 100),
-            "{:.2f}".format(ingredient_cost / 100),
-            "{:.2f}".format(packaging_cost / 100),
-            "{:.2f}".format(total_cost / 100),
-            "{:.2f}".format(profit / 100),
-            cookie_count
-        ])
+        for row in trend_rows:
+            yield [
+                format_trend_period(row['period'], group_by),
+                "{:.2f}".format(row['revenue'] / 100),
+                "{:.2f}".format(row['ingredient_cost'] / 100),
+                "{:.2f}".format(row['packaging_cost'] / 100),
+                "{:.2f}".format(row['total_cost'] / 100),
+                "{:.2f}".format(row['profit'] / 100),
+                row['cookies']
+            ]
+    
+    return _csv_response(generate_rows(), f"trends_report_{_range_label(period, range_args)}_{today.strftime('%Y%m%d')}.csv")
+
+@reports_bp.route('/export/orders.parquet', defaults={'dataset': 'orders'})
+@reports_bp.route('/export/cost-lines.parquet', defaults={'dataset': 'cost-lines'})
+def export_parquet(dataset):
+    """Export orders or cost lines as a typed Parquet file with amounts in cents."""
+    period, start_date, end_date, range_args = _report_range('all')
+    today = datetime.now().date()
     
-    # Prepare response
+    # Written to a temporary file, which is then streamed from disk
+    output = tempfile.TemporaryFile()
+    write_parquet(dataset, output, start_date, end_date)
     output.seek(0)
+    
+    return send_file(
+        output,
+        mimetype="application/vnd.apache.parquet",
+        as_attachment=True,
+        download_name=f"{dataset.replace('-', '_')}_{_range_label(period, range_args)}_{today.strftime('%Y%m%d')}.parquet"
+    )
+
+@reports_bp.route('/distribution')
+def distribution_report():
+    """Distribution of order margins and per-cookie costs."""
+    period, start_date, end_date, range_args = _report_range('year')
+    
+    return render_template('reports/distribution.html',
+                          stats=get_distribution(start_date, end_date),
+                          period=period,
+                          range_args=range_args)
+
+@reports_bp.route('/api/distribution')
+def api_distribution():
+    """API endpoint for order distribution statistics."""
+    period, start_date, end_date, range_args = _report_range('year')
+    return jsonify(dict(get_distribution(start_date, end_date), **range_args))
+
+def _csv_response(rows, filename):
+    """Stream CSV rows to the client as a file download."""
     return Response(
-        output.getvalue(),
+        stream_with_context(iter_csv(rows)),
         mimetype="text/csv",
-        headers={"Content-Disposition": f"attachment;filename=trends_report_{period}_{today.strftime('%Y%m%d')}.csv"}
+        headers={"Content-Disposition": f"attachment;filename={filename}"}
     )